@@ -1,7 +1,10 @@
+import asyncio
+import sys
+
 import uvicorn
 
 from aichat_common.gunicorn_runner import GunicornApplication
-from aichat_common.settings import settings
+from aichat_common.settings import ServerKind, settings
 
 
 def main() -> None:
@@ -14,8 +17,17 @@ def main() -> None:
             port=settings.port,
             reload=settings.reload,
             log_level=settings.log_level.value.lower(),
+            timeout_keep_alive=settings.keep_alive_timeout,
+            backlog=settings.backlog,
+            limit_concurrency=settings.limit_concurrency,
+            ssl_certfile=settings.ssl_certfile,
+            ssl_keyfile=settings.ssl_keyfile,
             factory=True,
         )
+    elif settings.server == ServerKind.HYPERCORN:
+        from aichat_common.hypercorn_runner import run_hypercorn
+
+        sys.exit(run_hypercorn("aichat_common.web.application:get_app()"))
     else:
         # We choose gunicorn only if reload
         # option is not used, because reload
@@ -25,6 +37,13 @@ def main() -> None:
             host=settings.host,
             port=settings.port,
             workers=settings.workers_count,
+            preload_app=settings.preload_app,
+            keepalive=settings.keep_alive_timeout,
+            backlog=settings.backlog,
+            max_requests=settings.max_requests,
+            max_requests_jitter=settings.max_requests_jitter,
+            certfile=settings.ssl_certfile,
+            keyfile=settings.ssl_keyfile,
             factory=True,
             accesslog="-",
             loglevel=settings.log_level.value.lower(),
@@ -32,5 +51,50 @@ def main() -> None:
         ).run()
 
 
+def worker() -> None:
+    """Entrypoint of a standalone background job worker."""
+    from aichat_common.log import configure_logging
+    from aichat_common.services.jobs.worker import run_worker
+
+    configure_logging()
+    asyncio.run(run_worker())
+
+
+def migrate() -> None:
+    """Entrypoint of the one-time database migration (index creation)."""
+    from aichat_common.db.migrate import run_migrations
+    from aichat_common.log import configure_logging
+
+    configure_logging()
+    asyncio.run(run_migrations())
+
+
+def snapshot() -> None:
+    """Entrypoint of the export of bots into a snapshot for edge nodes."""
+    from aichat_common.db.snapshot import run_snapshot_export
+    from aichat_common.log import configure_logging
+
+    configure_logging()
+    asyncio.run(run_snapshot_export())
+
+
+def submit() -> None:
+    """Entrypoint submitting a job, e.g. bots.purge_deleted from cron."""
+    from aichat_common.log import configure_logging
+    from aichat_common.services.jobs.queue import run_job_submit
+
+    configure_logging()
+    if len(sys.argv) < 3:
+        sys.exit("Usage: python -m aichat_common submit <job type>")
+    asyncio.run(run_job_submit(sys.argv[2]))
+
+
+COMMANDS = {
+    "worker": worker,
+    "migrate": migrate,
+    "snapshot": snapshot,
+    "submit": submit,
+}
+
 if __name__ == "__main__":
-    main()
+    COMMANDS.get(sys.argv[1] if len(sys.argv) > 1 else "", main)()
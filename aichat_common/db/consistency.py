@@ -0,0 +1,92 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, NamedTuple, Optional
+
+from bson import Timestamp
+from motor.motor_asyncio import AsyncIOMotorClientSession
+
+from aichat_common.db.models.bot_model import BotModel
+from aichat_common.settings import BotBackend, settings
+
+# Session of the causally consistent operations running in this context.
+_session: ContextVar[Optional[AsyncIOMotorClientSession]] = ContextVar(
+    "causal_session",
+    default=None,
+)
+
+
+class SessionToken(NamedTuple):
+    """
+    What a client has to see after its write of a bot.
+
+    Returned to the client after a write and presented back on reads:
+    a read must return at least `revision` of the bot, and mongo
+    reads happen after `operation_time` of the write.
+    """
+
+    revision: int
+    operation_time: Optional[Timestamp] = None
+
+    def encode(self) -> str:
+        """
+        Serialize the token for a header.
+
+        :return: "<revision>" or "<revision>:<time>:<inc>".
+        """
+        if self.operation_time is None:
+            return str(self.revision)
+        return f"{self.revision}:{self.operation_time.time}:{self.operation_time.inc}"
+
+    @classmethod
+    def decode(cls, value: str) -> "SessionToken":
+        """
+        Parse a token sent by a client.
+
+        :param value: value returned by `encode`.
+        :return: token.
+        :raises ValueError: if the value is not a token.
+        """
+        parts = [int(part) for part in value.strip().split(":")]
+        if len(parts) == 1 and parts[0] >= 0:
+            return cls(parts[0])
+        if len(parts) == 3 and min(parts) >= 0:
+            return cls(parts[0], Timestamp(parts[1], parts[2]))
+        raise ValueError(f"Invalid session token: {value}")
+
+
+def current_session() -> Optional[AsyncIOMotorClientSession]:
+    """
+    Get the causally consistent session DAO operations should use.
+
+    :return: session or None outside of `causal_session`.
+    """
+    return _session.get()
+
+
+@asynccontextmanager
+async def causal_session(
+    after: Optional[Timestamp] = None,
+) -> AsyncIterator[Optional[AsyncIOMotorClientSession]]:
+    """
+    Run DAO operations of this context in a causally consistent session.
+
+    Reads in the session see all writes made before `after`
+    and earlier operations of the session, even on secondaries.
+    `operation_time` of the session is the time of its last operation.
+
+    :param after: operation time of a write that reads must see.
+    :yield: session or None when bots are not stored in mongo.
+    """
+    if settings.bot_backend != BotBackend.MONGO:
+        # Other backends read their own writes.
+        yield None
+        return
+    client = BotModel.get_motor_collection().database.client
+    async with await client.start_session(causal_consistency=True) as session:
+        if after is not None:
+            session.advance_operation_time(after)
+        token = _session.set(session)
+        try:
+            yield session
+        finally:
+            _session.reset(token)
@@ -1,35 +1,237 @@
-from typing import List, Optional
+import copy
+import re
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Iterable, List, Optional, Tuple, Union
 
-from aichat_common.db.models.bot_model import BotModel
+import pymongo
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from aichat_common.db.consistency import current_session
+from aichat_common.db.dao.bot_revision_dao import BotRevisionDAO
+from aichat_common.db.models.bot_model import (
+    DEFAULT_TENANT,
+    BotActiveCloth,
+    BotCloth,
+    BotModel,
+    BotSummary,
+    BotTextSearchSummary,
+)
+from aichat_common.db.query_plan import check_query_plan
+from aichat_common.resilience import mongo_operation
+
+# Listing order, backed by the "tenant_deleted_at_bot_name_bot_id" index.
+BOT_LIST_SORT = [
+    ("bot_name", pymongo.ASCENDING),
+    ("bot_id", pymongo.ASCENDING),
+]
+
+
+# Fields changed by the wardrobe operations.
+CLOTHES_FIELDS = ("bot_clothes", "active_cloth_id")
+
+
+class RevisionConflictError(Exception):
+    """Raised when a bot was changed since the revision the client has seen."""
+
+    def __init__(self, bot_id: str, revision: int) -> None:
+        super().__init__(f"Bot {bot_id} is at revision {revision}")
+        self.bot_id = bot_id
+        self.revision = revision
+
+
+class BotAlreadyExistsError(Exception):
+    """Raised when a bot with the same bot_id exists and is not deleted."""
+
+    def __init__(self, bot_id: str) -> None:
+        super().__init__(f"Bot {bot_id} already exists")
+        self.bot_id = bot_id
+
+
+def get_active_cloth_id(clothes: List[BotCloth]) -> Optional[str]:
+    """
+    Get id of the cloth in use.
+
+    :param clothes: clothes of a bot.
+    :return: cloth id or None if no cloth is in use.
+    """
+    return next((cloth.cloth_id for cloth in clothes if cloth.cloth_in_use), None)
+
+
+def _now() -> datetime:
+    # Mongo keeps milliseconds, truncate so the stored value compares equal.
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
 
 
 class BotDAO:
-    """Class for accessing bot table."""
+    """
+    Class for accessing bot table.
+
+    Every query is limited to bots of a single tenant.
+    Deleted bots are kept as tombstones (with `deleted_at` set)
+    and are left out of queries unless asked for explicitly.
+    Every change is recorded in the history of the bot.
+    Operations serving requests run in the mongo bulkhead
+    with a deadline, see `mongo_operation`. Reads and writes of single
+    bots join the session of `causal_session`, if there is one.
+    """
+
+    def __init__(self, tenant: str = DEFAULT_TENANT) -> None:
+        self.tenant = tenant
+        self.revisions = BotRevisionDAO(tenant)
+
+    def with_tenant(self, tenant: str) -> "BotDAO":
+        """
+        Get a DAO for bots of another tenant.
+
+        :param tenant: tenant name.
+        :return: new DAO.
+        """
+        dao = copy.copy(self)
+        dao.tenant = tenant
+        dao.revisions = BotRevisionDAO(tenant)
+        return dao
+
+    def _query(
+        self,
+        bot_id: Optional[str] = None,
+        include_deleted: bool = False,
+        **conditions: Any,
+    ) -> dict:
+        query = {"tenant": self.tenant, **conditions}
+        if not include_deleted:
+            query["deleted_at"] = None
+        if bot_id is not None:
+            query["bot_id"] = bot_id
+        return query
+
+    async def _find_by_bot_id(
+        self,
+        bot_id: str,
+        include_deleted: bool = False,
+    ) -> Optional[BotModel]:
+        query = self._query(bot_id, include_deleted=include_deleted)
+        await check_query_plan(BotModel.find(query))
+        return await BotModel.find_one(query, session=current_session())
+
+    async def _find_one_and_update(
+        self,
+        query: dict,
+        update: Union[dict, list],
+        changed: Iterable[str],
+    ) -> Optional[BotModel]:
+        """
+        Atomically update a single bot and record the new revision.
 
+        :param query: filter of the bot.
+        :param update: update document or pipeline.
+        :param changed: names of the fields changed by the update.
+        :return: updated bot or None if nothing matched.
+        """
+        await check_query_plan(BotModel.find(query))
+        document = await BotModel.get_motor_collection().find_one_and_update(
+            query,
+            update,
+            return_document=ReturnDocument.AFTER,
+            session=current_session(),
+        )
+        if document is None:
+            return None
+        bot = BotModel.model_validate(document)
+        await self.revisions.record([bot], changed)
+        return bot
+
+    @mongo_operation
     async def get_bots_count(self) -> int:
         """
         Get the total count of bots in the database.
         :return: Total number of bots.
         """
-        return await BotModel.count()
+        return await BotModel.find(self._query()).count()
 
-    async def get_bot_by_id(self, bot_id: str) -> Optional[BotModel]:
+    @mongo_operation
+    async def get_bot_by_id(
+        self,
+        bot_id: str,
+        include_deleted: bool = False,
+    ) -> Optional[BotModel]:
         """
         Get a single bot model by bot_id.
 
         :param bot_id: bot id.
+        :param include_deleted: return the tombstone of a deleted bot.
         :return: BotModel instance or None if not found.
         """
-        return await BotModel.find_one(BotModel.bot_id == bot_id)
+        return await self._find_by_bot_id(bot_id, include_deleted=include_deleted)
 
-    async def create_bot_model(self, **kwargs) -> Optional[BotModel]:
+    @mongo_operation
+    async def get_bot_at_revision(
+        self,
+        bot_id: str,
+        revision: int,
+    ) -> Optional[BotModel]:
+        """
+        Rebuild a bot as it was at a revision.
+
+        :param bot_id: bot id.
+        :param revision: revision of the bot.
+        :return: bot or None if the bot or the revision is unknown.
+        """
+        current = await self._find_by_bot_id(bot_id, include_deleted=True)
+        if current is None or not 0 <= revision <= current.revision:
+            return None
+        if revision == current.revision:
+            return current
+        values = await self.revisions.materialize(bot_id, revision)
+        if values is None:
+            return None
+        return BotModel.model_validate(
+            {**values, "id": current.id, "tenant": self.tenant, "revision": revision},
+        )
+
+    @mongo_operation
+    async def create_bot_model(self, **kwargs: Any) -> BotModel:
         """
         Add a single bot to the database.
 
+        A tombstone of a deleted bot with the same bot_id is replaced
+        in the same update, the new bot continues its revisions and history.
+
         :param kwargs: fields for BotModel.
+        :raises BotAlreadyExistsError: if a live bot has the same bot_id.
+        :return: created bot.
         """
-        return await BotModel.insert_one(BotModel(**kwargs))
+        bot = BotModel(**kwargs)
+        fields = bot.model_dump(exclude={"id", "revision_id", "revision"})
+        fields["tenant"] = self.tenant
+        fields["active_cloth_id"] = get_active_cloth_id(bot.bot_clothes)
+        fields["deleted_at"] = None
+        values = {name: {"$literal": value} for name, value in fields.items()}
+        # Without a tombstone the bot is inserted, a live bot with the same
+        # bot_id makes the insert fail on the unique index.
+        try:
+            document = await BotModel.get_motor_collection().find_one_and_update(
+                self._query(bot.bot_id, deleted_at={"$ne": None}, include_deleted=True),
+                [
+                    {
+                        "$set": {
+                            **values,
+                            "revision": {"$add": [{"$ifNull": ["$revision", -1]}, 1]},
+                        },
+                    },
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+                session=current_session(),
+            )
+        except DuplicateKeyError as e:
+            raise BotAlreadyExistsError(bot.bot_id) from e
+        created_bot = BotModel.model_validate(document)
+        await self.revisions.record([created_bot])
+        return created_bot
 
+    @mongo_operation
     async def get_all_bots(self, limit: int, offset: int) -> List[BotModel]:
         """
         Get all bot models with limit/offset pagination.
@@ -38,8 +240,47 @@ class BotDAO:
         :param offset: offset of bots.
         :return: list of bots.
         """
-        return await BotModel.find_all(skip=offset, limit=limit).to_list()
+        query = BotModel.find(
+            self._query(),
+            skip=offset,
+            limit=limit,
+            sort=BOT_LIST_SORT,
+        )
+        await check_query_plan(query)
+        return await query.to_list()
 
+    async def iter_all_bots(
+        self,
+        limit: int = 0,
+        offset: int = 0,
+    ) -> AsyncIterator[BotModel]:
+        """
+        Iterate over bot models without loading them all at once.
+
+        :param limit: limit of bots, 0 for all.
+        :param offset: offset of bots.
+        :yield: bots in listing order.
+        """
+        query = BotModel.find(
+            self._query(),
+            skip=offset,
+            limit=limit,
+            sort=BOT_LIST_SORT,
+        )
+        await check_query_plan(query)
+        async for bot in query:
+            yield bot
+
+    async def ensure_indexes(self) -> List[str]:
+        """
+        Create indexes declared on the bot model.
+
+        :return: names of the indexes.
+        """
+        indexes = [field.index for field in BotModel.get_settings().indexes]
+        return await BotModel.get_motor_collection().create_indexes(indexes)
+
+    @mongo_operation
     async def filter(
         self, bot_id: Optional[str] = None, bot_name: Optional[str] = None
     ) -> List[BotModel]:
@@ -50,65 +291,349 @@ class BotDAO:
         :param bot_name: bot name.
         :return: list of bots.
         """
-        query = {}
-        if bot_id is not None:
-            query["bot_id"] = bot_id
+        if bot_id is None and bot_name is None:
+            return []
+        query = self._query(bot_id)
         if bot_name is not None:
             query["bot_name"] = bot_name
-        if not query:
-            return []
-        return await BotModel.find(query).to_list()
+        find_query = BotModel.find(query)
+        await check_query_plan(find_query)
+        return await find_query.to_list()
+
+    @mongo_operation
+    async def search(
+        self,
+        text: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[List[BotSummary], int]:
+        """
+        Search bots by persona words and/or bot_name prefix.
 
+        Full-text matches are ordered by relevance, prefix-only matches
+        by bot_name.
+
+        :param text: words to look up in the persona text index.
+        :param name_prefix: case-sensitive prefix of bot_name.
+        :param limit: limit of results.
+        :param offset: offset of results.
+        :return: page of bot summaries and the total number of matches.
+        """
+        if not text and not name_prefix:
+            return [], 0
+        query = self._query()
+        if text:
+            query["$text"] = {"$search": text}
+        if name_prefix:
+            query["bot_name"] = {"$regex": f"^{re.escape(name_prefix)}"}
+        if text:
+            find_query = (
+                BotModel.find(query)
+                .project(BotTextSearchSummary)
+                .sort(("score", {"$meta": "textScore"}))  # type: ignore
+            )
+        else:
+            find_query = BotModel.find(query).project(BotSummary).sort(BOT_LIST_SORT)
+        find_query = find_query.skip(offset).limit(limit)
+        await check_query_plan(find_query)
+        return await find_query.to_list(), await BotModel.find(query).count()
+
+    @mongo_operation
     async def delete_bot_by_id(self, bot_id: str) -> Optional[BotModel]:
         """
         Delete a bot model by bot_id.
 
+        The bot is only marked as deleted, it can be restored
+        until the purge job removes it.
+
         :param bot_id: bot id.
-        :return: option of a bot model.
+        :return: tombstone of the bot or None if there was no such bot.
         """
-        res = await BotModel.find_one(BotModel.bot_id == bot_id)
-        if res is None:
-            return res
-        await res.delete()
-        return res
+        return await self._find_one_and_update(
+            self._query(bot_id),
+            {"$set": {"deleted_at": _now()}, "$inc": {"revision": 1}},
+            changed={"deleted_at"},
+        )
+
+    @mongo_operation
+    async def delete_bots(
+        self,
+        bot_ids: Optional[List[str]] = None,
+        bot_name: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+    ) -> List[BotModel]:
+        """
+        Delete all bots matching a filter with a single update.
+
+        All conditions must match, at least one has to be given.
 
+        :param bot_ids: ids of the bots.
+        :param bot_name: exact bot name.
+        :param name_prefix: case-sensitive prefix of bot_name.
+        :return: tombstones of the deleted bots.
+        """
+        if bot_ids is None and bot_name is None and not name_prefix:
+            return []
+        query = self._query()
+        if bot_ids is not None:
+            query["bot_id"] = {"$in": bot_ids}
+        name_conditions = {}
+        if bot_name is not None:
+            name_conditions["$eq"] = bot_name
+        if name_prefix:
+            name_conditions["$regex"] = f"^{re.escape(name_prefix)}"
+        if name_conditions:
+            query["bot_name"] = name_conditions
+        await check_query_plan(BotModel.find(query))
+        deleted_at = _now()
+        await BotModel.get_motor_collection().update_many(
+            query,
+            {"$set": {"deleted_at": deleted_at}, "$inc": {"revision": 1}},
+            session=current_session(),
+        )
+        # Concurrent deletes can't have the same timestamp and the same bots.
+        query["deleted_at"] = deleted_at
+        deleted_bots = await BotModel.find(query, session=current_session()).to_list()
+        await self.revisions.record(deleted_bots, {"deleted_at"})
+        return deleted_bots
+
+    @mongo_operation
+    async def restore_bot_by_id(self, bot_id: str) -> Optional[BotModel]:
+        """
+        Restore a deleted bot that was not purged yet.
+
+        :param bot_id: bot id.
+        :return: restored bot or None if there is no tombstone of it.
+        """
+        return await self._find_one_and_update(
+            self._query(bot_id, deleted_at={"$ne": None}, include_deleted=True),
+            {"$set": {"deleted_at": None}, "$inc": {"revision": 1}},
+            changed={"deleted_at"},
+        )
+
+    async def count_deleted(self, deleted_before: datetime) -> int:
+        """
+        Count tombstones of bots of all tenants deleted before a moment.
+
+        :param deleted_before: count bots deleted before this moment.
+        :return: number of tombstones.
+        """
+        return await BotModel.get_motor_collection().count_documents(
+            {"deleted_at": {"$type": "date", "$lt": deleted_before}},
+        )
+
+    async def purge_deleted(
+        self,
+        deleted_before: datetime,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[int]:
+        """
+        Remove tombstones of bots of all tenants deleted before a moment.
+
+        Tombstones are removed in batches, so a large purge doesn't
+        hold a single long operation. The history of removed bots
+        is removed too.
+
+        :param deleted_before: remove bots deleted before this moment.
+        :param batch_size: max number of bots removed at once.
+        :yield: number of bots removed by every batch.
+        """
+        query = {"deleted_at": {"$type": "date", "$lt": deleted_before}}
+        collection = BotModel.get_motor_collection()
+        while True:
+            cursor = collection.find(
+                query,
+                {"_id": 1, "tenant": 1, "bot_id": 1},
+            ).limit(batch_size)
+            documents = [document async for document in cursor]
+            if not documents:
+                return
+            ids = [document["_id"] for document in documents]
+            result = await collection.delete_many(
+                {"_id": {"$in": ids}, "deleted_at": query["deleted_at"]},
+            )
+            # Bots restored meanwhile keep their history.
+            kept = {
+                document["_id"]
+                async for document in collection.find({"_id": {"$in": ids}}, {"_id": 1})
+            }
+            await self.revisions.delete_history(
+                [
+                    (document["tenant"], document["bot_id"])
+                    for document in documents
+                    if document["_id"] not in kept
+                ],
+            )
+            yield result.deleted_count
+
+    @mongo_operation
     async def update_bot_by_id(
-        self, bot_id: str, update_fields: dict
+        self,
+        bot_id: str,
+        update_fields: dict,
+        expected_revision: Optional[int] = None,
     ) -> Optional[BotModel]:
         """
         Update a bot model by bot_id.
 
+        Only the given fields are written, in a single atomic update,
+        so concurrent updates of other fields are not lost.
+
         :param bot_id: bot id.
         :param update_fields: fields to update.
+        :param expected_revision: update only if the bot is still
+            at this revision (compare-and-swap).
+        :raises RevisionConflictError: if the bot is at another revision.
         :return: updated bot model or None.
         """
-        bot = await BotModel.find_one(BotModel.bot_id == bot_id)
-        if bot is None:
-            return None
-        for k, v in update_fields.items():
-            setattr(bot, k, v)
-        await bot.save()
+        update = dict(update_fields)
+        if "bot_clothes" in update:
+            clothes = [BotCloth.model_validate(c) for c in update["bot_clothes"]]
+            update["bot_clothes"] = [cloth.model_dump() for cloth in clothes]
+            update["active_cloth_id"] = get_active_cloth_id(clothes)
+        query = self._query(bot_id)
+        if expected_revision is not None:
+            query["revision"] = expected_revision
+        bot = await self._find_one_and_update(
+            query,
+            {"$set": update, "$inc": {"revision": 1}},
+            changed=update,
+        )
+        if bot is None and expected_revision is not None:
+            current = await self._find_by_bot_id(bot_id)
+            if current is not None:
+                raise RevisionConflictError(bot_id, current.revision)
         return bot
 
+    @mongo_operation
     async def set_cloth_in_use(self, bot_id: str, cloth_id: str) -> Optional[BotModel]:
         """
         Set a specific cloth as in use for a bot.
 
+        The wardrobe is updated in place by the database,
+        without loading and re-saving the bot.
+
         :param bot_id: bot id.
         :param cloth_id: cloth id to set as in use.
-        :return: updated bot model or None.
+        :return: updated bot model or None if the bot or the cloth is missing.
         """
-        bot = await BotModel.find_one(BotModel.bot_id == bot_id)
-        if bot is None:
-            return None
-        found = False
-        for cloth in bot.bot_clothes:
-            if cloth.cloth_id == cloth_id:
-                cloth.cloth_in_use = True
-                found = True
-            else:
-                cloth.cloth_in_use = False
-        if not found:
-            return None
-        await bot.save()
-        return bot
+        cloth_id_value = {"$literal": cloth_id}
+        cloth = {field: f"$$this.{field}" for field in BotCloth.model_fields}
+        cloth["cloth_in_use"] = {"$eq": ["$$this.cloth_id", cloth_id_value]}
+        return await self._find_one_and_update(
+            self._query(bot_id, **{"bot_clothes.cloth_id": cloth_id}),
+            [
+                {
+                    "$set": {
+                        "bot_clothes": {"$map": {"input": "$bot_clothes", "in": cloth}},
+                        "active_cloth_id": cloth_id_value,
+                        "revision": {"$add": ["$revision", 1]},
+                    },
+                },
+            ],
+            changed=CLOTHES_FIELDS,
+        )
+
+    @mongo_operation
+    async def add_cloth(self, bot_id: str, cloth: BotCloth) -> Optional[BotModel]:
+        """
+        Add a cloth to the wardrobe of a bot.
+
+        The cloth is added as not in use.
+
+        :param bot_id: bot id.
+        :param cloth: cloth to add.
+        :return: updated bot model or None if the bot is missing
+            or already has a cloth with the same id.
+        """
+        cloth = cloth.model_copy(update={"cloth_in_use": False})
+        return await self._find_one_and_update(
+            self._query(bot_id, **{"bot_clothes.cloth_id": {"$ne": cloth.cloth_id}}),
+            {"$push": {"bot_clothes": cloth.model_dump()}, "$inc": {"revision": 1}},
+            changed=CLOTHES_FIELDS,
+        )
+
+    @mongo_operation
+    async def remove_cloth(self, bot_id: str, cloth_id: str) -> Optional[BotModel]:
+        """
+        Remove a cloth from the wardrobe of a bot.
+
+        If the cloth was in use, the bot is left without a cloth in use.
+
+        :param bot_id: bot id.
+        :param cloth_id: cloth id to remove.
+        :return: updated bot model or None if the bot or the cloth is missing.
+        """
+        cloth_id_value = {"$literal": cloth_id}
+        return await self._find_one_and_update(
+            self._query(bot_id, **{"bot_clothes.cloth_id": cloth_id}),
+            [
+                {
+                    "$set": {
+                        "bot_clothes": {
+                            "$filter": {
+                                "input": "$bot_clothes",
+                                "cond": {"$ne": ["$$this.cloth_id", cloth_id_value]},
+                            },
+                        },
+                        "active_cloth_id": {
+                            "$cond": [
+                                {"$eq": ["$active_cloth_id", cloth_id_value]},
+                                None,
+                                "$active_cloth_id",
+                            ],
+                        },
+                        "revision": {"$add": ["$revision", 1]},
+                    },
+                },
+            ],
+            changed=CLOTHES_FIELDS,
+        )
+
+    @mongo_operation
+    async def get_active_cloth(self, bot_id: str) -> Optional[BotActiveCloth]:
+        """
+        Get the cloth in use without loading the rest of the bot.
+
+        :param bot_id: bot id.
+        :return: projection with the cloth in use or None if the bot is missing.
+        """
+        query = BotModel.find(self._query(bot_id)).project(BotActiveCloth)
+        await check_query_plan(query)
+        return await query.first_or_none()
+
+    async def backfill_tenant(self) -> int:
+        """
+        Assign bots stored before tenants were introduced to the default tenant.
+
+        :return: number of updated bots.
+        """
+        result = await BotModel.get_motor_collection().update_many(
+            {"tenant": {"$exists": False}},
+            {"$set": {"tenant": DEFAULT_TENANT}},
+        )
+        return result.modified_count
+
+    async def backfill_active_cloth(self) -> int:
+        """
+        Fill active_cloth_id of bots stored before it was introduced.
+
+        :return: number of updated bots.
+        """
+        active_ids = {
+            "$map": {
+                "input": {
+                    "$filter": {
+                        "input": "$bot_clothes",
+                        "cond": "$$this.cloth_in_use",
+                    },
+                },
+                "in": "$$this.cloth_id",
+            },
+        }
+        result = await BotModel.get_motor_collection().update_many(
+            {"active_cloth_id": {"$exists": False}, "bot_clothes.cloth_in_use": True},
+            [{"$set": {"active_cloth_id": {"$arrayElemAt": [active_ids, 0]}}}],
+        )
+        return result.modified_count
@@ -0,0 +1,140 @@
+from typing import Any, AsyncIterator, List, Optional, Protocol, Tuple
+
+from aichat_common.db.models.bot_model import (
+    Bot,
+    BotActiveCloth,
+    BotCloth,
+    BotSummary,
+)
+from aichat_common.db.models.bot_revision_model import BotRevision
+
+
+class BotHistoryRepository(Protocol):
+    """History of bots of a tenant, see BotRevisionDAO."""
+
+    async def get_revisions(
+        self,
+        bot_id: str,
+        limit: int,
+        offset: int,
+    ) -> Tuple[List[BotRevision], int]:
+        """Get the history of a bot, newest revisions first."""
+        ...
+
+
+class BotRepository(Protocol):
+    """
+    Storage of bots of a tenant, what BotService needs from a backend.
+
+    BotDAO (mongo) defines the semantics of every operation, other
+    backends must give the same results, which is verified by
+    tests/test_bot_repository.py. Backends that can't serve an
+    operation raise SnapshotUnsupportedError.
+    """
+
+    tenant: str
+
+    @property
+    def revisions(self) -> BotHistoryRepository:
+        """History of the bots."""
+        ...
+
+    def with_tenant(self, tenant: str) -> "BotRepository":
+        """Get a repository of bots of another tenant."""
+        ...
+
+    async def get_bots_count(self) -> int:
+        """Count live bots."""
+        ...
+
+    async def get_bot_by_id(
+        self,
+        bot_id: str,
+        include_deleted: bool = False,
+    ) -> Optional[Bot]:
+        """Get a bot, a tombstone too with `include_deleted`."""
+        ...
+
+    async def get_bot_at_revision(
+        self,
+        bot_id: str,
+        revision: int,
+    ) -> Optional[Bot]:
+        """Rebuild a bot as it was at a revision."""
+        ...
+
+    async def create_bot_model(self, **kwargs: Any) -> Bot:
+        """Add a bot in place of its tombstone, BotAlreadyExistsError if live."""
+        ...
+
+    async def get_all_bots(self, limit: int, offset: int) -> List[Bot]:
+        """Get a page of live bots ordered by (bot_name, bot_id)."""
+        ...
+
+    def iter_all_bots(
+        self,
+        limit: int = 0,
+        offset: int = 0,
+    ) -> AsyncIterator[Bot]:
+        """Iterate over live bots ordered by (bot_name, bot_id)."""
+        ...
+
+    async def filter(
+        self,
+        bot_id: Optional[str] = None,
+        bot_name: Optional[str] = None,
+    ) -> List[Bot]:
+        """Get live bots by bot_id and/or exact bot_name."""
+        ...
+
+    async def search(
+        self,
+        text: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[List[BotSummary], int]:
+        """Search live bots by persona words and/or bot_name prefix."""
+        ...
+
+    async def delete_bot_by_id(self, bot_id: str) -> Optional[Bot]:
+        """Turn a bot into a tombstone."""
+        ...
+
+    async def delete_bots(
+        self,
+        bot_ids: Optional[List[str]] = None,
+        bot_name: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+    ) -> List[Bot]:
+        """Turn all bots matching a filter into tombstones."""
+        ...
+
+    async def restore_bot_by_id(self, bot_id: str) -> Optional[Bot]:
+        """Bring a tombstone back to life."""
+        ...
+
+    async def update_bot_by_id(
+        self,
+        bot_id: str,
+        update_fields: dict,
+        expected_revision: Optional[int] = None,
+    ) -> Optional[Bot]:
+        """Set fields of a bot, optionally only at an expected revision."""
+        ...
+
+    async def set_cloth_in_use(self, bot_id: str, cloth_id: str) -> Optional[Bot]:
+        """Make a cloth of the wardrobe the one in use."""
+        ...
+
+    async def add_cloth(self, bot_id: str, cloth: BotCloth) -> Optional[Bot]:
+        """Add a cloth, not in use, to the wardrobe."""
+        ...
+
+    async def remove_cloth(self, bot_id: str, cloth_id: str) -> Optional[Bot]:
+        """Remove a cloth from the wardrobe."""
+        ...
+
+    async def get_active_cloth(self, bot_id: str) -> Optional[BotActiveCloth]:
+        """Get the cloth in use of a bot."""
+        ...
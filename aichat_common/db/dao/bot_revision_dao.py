@@ -0,0 +1,268 @@
+import asyncio
+import json
+import logging
+import zlib
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Set, Tuple
+
+import pymongo
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from aichat_common.db.consistency import current_session
+from aichat_common.db.models.bot_model import DEFAULT_TENANT, Bot, BotModel
+from aichat_common.db.models.bot_revision_model import BotRevision, BotRevisionModel
+from aichat_common.db.query_plan import check_query_plan
+from aichat_common.resilience import mongo_operation
+from aichat_common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Fields that are not part of the history of a bot.
+UNTRACKED_FIELDS = {"id", "revision_id", "tenant", "revision"}
+BACKFILL_BATCH_SIZE = 1000
+
+
+def pack_fields(values: dict) -> bytes:
+    """
+    Compress field values of a revision.
+
+    :param values: json serializable field values.
+    :return: compressed json.
+    """
+    return zlib.compress(json.dumps(values, ensure_ascii=False).encode())
+
+
+def unpack_fields(data: bytes) -> dict:
+    """
+    Decompress field values of a revision.
+
+    :param data: value returned by `pack_fields`.
+    :return: field values.
+    """
+    return json.loads(zlib.decompress(data))
+
+
+def revision_document(
+    bot: Bot,
+    changed: Optional[Iterable[str]] = None,
+) -> BotRevision:
+    """
+    Build the history entry of a bot right after a change.
+
+    :param bot: changed bot.
+    :param changed: names of the changed fields, None for a checkpoint.
+    :return: revision document.
+    """
+    checkpoint = (
+        changed is None or bot.revision % settings.bot_history_checkpoint_every == 0
+    )
+    if checkpoint:
+        values = bot.model_dump(mode="json", exclude=UNTRACKED_FIELDS)
+    else:
+        values = bot.model_dump(mode="json", include=set(changed or ()))
+    return BotRevision(
+        tenant=bot.tenant,
+        bot_id=bot.bot_id,
+        revision=bot.revision,
+        checkpoint=checkpoint,
+        fields=sorted(values),
+        data=pack_fields(values),
+        created_at=datetime.now(timezone.utc),
+    )
+
+
+def _dump(document: BotRevision) -> dict:
+    return document.model_dump(exclude={"id", "revision_id"})
+
+
+class BotRevisionDAO:
+    """
+    Class for accessing the history of bots.
+
+    Every revision of a bot is stored as a diff of the changed fields.
+    Every `bot_history_checkpoint_every` revisions all fields are stored,
+    so rebuilding any revision takes at most that many diffs.
+
+    Revisions are saved after the change of the bot. A revision that is
+    lost in between is a gap in the history: the change right after it
+    is saved as a checkpoint, so only the lost revision can't be rebuilt.
+    """
+
+    def __init__(self, tenant: str = DEFAULT_TENANT) -> None:
+        self.tenant = tenant
+
+    async def record(
+        self,
+        bots: List[BotModel],
+        changed: Optional[Iterable[str]] = None,
+    ) -> None:
+        """
+        Save new revisions of bots.
+
+        :param bots: bots right after the change.
+        :param changed: names of the changed fields,
+            None to save all fields as a checkpoint.
+        """
+        if not bots:
+            return
+        # The bots are already changed, a cancelled request must not
+        # leave their revisions unsaved.
+        await asyncio.shield(self._record(bots, changed))
+
+    async def _record(
+        self,
+        bots: List[BotModel],
+        changed: Optional[Iterable[str]],
+    ) -> None:
+        changed = None if changed is None else set(changed)
+        documents = [revision_document(bot, changed) for bot in bots]
+        try:
+            gaps = await self._missing_previous(documents)
+            documents = [
+                revision_document(bot) if (bot.tenant, bot.bot_id) in gaps else doc
+                for bot, doc in zip(bots, documents)
+            ]
+            await BotRevisionModel.get_motor_collection().insert_many(
+                [_dump(document) for document in documents],
+                ordered=False,
+                session=current_session(),
+            )
+        except BulkWriteError as e:
+            # Already recorded revisions are reported as duplicates.
+            errors = e.details.get("writeErrors")
+            logger.warning(f"Bot history write error: {errors}")
+        except PyMongoError as e:
+            # The next change of the bots is saved as a checkpoint.
+            logger.warning(f"Bot history write error: {e}")
+
+    async def _missing_previous(
+        self,
+        documents: List[BotRevision],
+    ) -> Set[Tuple[str, str]]:
+        """
+        Find diffs whose previous revision is not in the history.
+
+        :param documents: revisions about to be saved.
+        :return: pairs of tenant and bot id.
+        """
+        diffs = [document for document in documents if not document.checkpoint]
+        if not diffs:
+            return set()
+        cursor = BotRevisionModel.get_motor_collection().find(
+            {
+                "$or": [
+                    {
+                        "tenant": diff.tenant,
+                        "bot_id": diff.bot_id,
+                        "revision": diff.revision - 1,
+                    }
+                    for diff in diffs
+                ],
+            },
+            projection={"tenant": 1, "bot_id": 1},
+            session=current_session(),
+        )
+        found = {(document["tenant"], document["bot_id"]) async for document in cursor}
+        return {(diff.tenant, diff.bot_id) for diff in diffs} - found
+
+    @mongo_operation
+    async def get_revisions(
+        self,
+        bot_id: str,
+        limit: int,
+        offset: int,
+    ) -> Tuple[List[BotRevisionModel], int]:
+        """
+        Get the history of a bot, newest revisions first.
+
+        :param bot_id: bot id.
+        :param limit: limit of revisions.
+        :param offset: offset of revisions.
+        :return: page of revisions and the total number of revisions.
+        """
+        query = {"tenant": self.tenant, "bot_id": bot_id}
+        find_query = BotRevisionModel.find(
+            query,
+            skip=offset,
+            limit=limit,
+            sort=[("revision", pymongo.DESCENDING)],
+        )
+        await check_query_plan(find_query)
+        return await find_query.to_list(), await BotRevisionModel.find(query).count()
+
+    @mongo_operation
+    async def materialize(self, bot_id: str, revision: int) -> Optional[dict]:
+        """
+        Rebuild fields of a bot at a revision.
+
+        :param bot_id: bot id.
+        :param revision: revision to rebuild.
+        :return: field values or None if the history doesn't cover the revision.
+        """
+        query = {"tenant": self.tenant, "bot_id": bot_id}
+        checkpoint_query = BotRevisionModel.find(
+            {**query, "revision": {"$lte": revision}, "checkpoint": True},
+            sort=[("revision", pymongo.DESCENDING)],
+            limit=1,
+        )
+        await check_query_plan(checkpoint_query)
+        checkpoint = await checkpoint_query.first_or_none()
+        if checkpoint is None:
+            return None
+        diffs_query = BotRevisionModel.find(
+            {**query, "revision": {"$gt": checkpoint.revision, "$lte": revision}},
+            sort=[("revision", pymongo.ASCENDING)],
+        )
+        await check_query_plan(diffs_query)
+        diffs = await diffs_query.to_list()
+        if len(diffs) != revision - checkpoint.revision:
+            return None
+        values = unpack_fields(checkpoint.data)
+        for diff in diffs:
+            values.update(unpack_fields(diff.data))
+        return values
+
+    async def delete_history(self, bots: List[Tuple[str, str]]) -> None:
+        """
+        Delete the history of bots of any tenants.
+
+        :param bots: pairs of tenant and bot id.
+        """
+        if not bots:
+            return
+        await BotRevisionModel.get_motor_collection().delete_many(
+            {"$or": [{"tenant": tenant, "bot_id": bot_id} for tenant, bot_id in bots]},
+        )
+
+    async def backfill_checkpoints(self) -> int:
+        """
+        Save a checkpoint of the current revision of bots of all tenants.
+
+        Bots stored before the history was introduced can then be
+        rebuilt at any later revision.
+
+        :return: number of saved checkpoints.
+        """
+        collection = BotRevisionModel.get_motor_collection()
+        saved = 0
+        batch: List[UpdateOne] = []
+        async for document in BotModel.get_motor_collection().find():
+            revision = revision_document(BotModel.model_validate(document))
+            batch.append(
+                UpdateOne(
+                    {
+                        "tenant": revision.tenant,
+                        "bot_id": revision.bot_id,
+                        "revision": revision.revision,
+                    },
+                    {"$setOnInsert": _dump(revision)},
+                    upsert=True,
+                ),
+            )
+            if len(batch) == BACKFILL_BATCH_SIZE:
+                saved += (await collection.bulk_write(batch)).upserted_count
+                batch = []
+        if batch:
+            saved += (await collection.bulk_write(batch)).upserted_count
+        return saved
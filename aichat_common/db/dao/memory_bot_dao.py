@@ -0,0 +1,553 @@
+import bisect
+import copy
+import re
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from beanie import PydanticObjectId
+
+from aichat_common.db.dao.bot_dao import (
+    CLOTHES_FIELDS,
+    BotAlreadyExistsError,
+    RevisionConflictError,
+    get_active_cloth_id,
+)
+from aichat_common.db.dao.bot_revision_dao import revision_document, unpack_fields
+from aichat_common.db.models.bot_model import (
+    DEFAULT_TENANT,
+    Bot,
+    BotActiveCloth,
+    BotCloth,
+    BotModel,
+    BotSummary,
+)
+from aichat_common.db.models.bot_revision_model import BotRevision
+
+# Sorts after any character, bounds all names starting with a prefix.
+PREFIX_END = "\U0010ffff"
+# Weights of the persona text index of mongo.
+TEXT_WEIGHTS: Dict[str, int] = next(
+    index.document["weights"]
+    for index in BotModel.Settings.indexes
+    if "weights" in index.document
+)
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+class MemoryBotStore:
+    """
+    Bots and their history in process memory, shared by DAOs of all tenants.
+
+    Bots, tombstones included, are indexed by tenant and bot_id, live
+    bots are also kept in a sorted (bot_name, bot_id) list per tenant,
+    which serves listing, filtering by name and name prefix search.
+    """
+
+    def __init__(self) -> None:
+        self.bots: Dict[str, Dict[str, Bot]] = {}
+        self.names: Dict[str, List[Tuple[str, str]]] = {}
+        # tenant, bot_id -> revision -> history entry
+        self.history: Dict[Tuple[str, str], Dict[int, BotRevision]] = {}
+
+    def save(self, bot: Bot) -> None:
+        """
+        Put a new version of a bot into the store.
+
+        :param bot: bot.
+        """
+        bots = self.bots.setdefault(bot.tenant, {})
+        names = self.names.setdefault(bot.tenant, [])
+        previous = bots.get(bot.bot_id)
+        if previous is not None and previous.deleted_at is None:
+            names.remove((previous.bot_name, previous.bot_id))
+        if bot.deleted_at is None:
+            bisect.insort(names, (bot.bot_name, bot.bot_id))
+        bots[bot.bot_id] = bot
+
+    def name_range(self, tenant: str, start: str, end: str) -> List[Tuple[str, str]]:
+        """
+        Get (bot_name, bot_id) of live bots with names in a range.
+
+        :param tenant: tenant name.
+        :param start: first name of the range.
+        :param end: name after the range.
+        :return: names and ids in listing order.
+        """
+        names = self.names.get(tenant, [])
+        first = bisect.bisect_left(names, (start,))
+        return names[first : bisect.bisect_left(names, (end,), first)]
+
+
+class MemoryBotRevisionDAO:
+    """History of bots kept in a MemoryBotStore, see BotRevisionDAO."""
+
+    def __init__(self, store: MemoryBotStore, tenant: str = DEFAULT_TENANT) -> None:
+        self.store = store
+        self.tenant = tenant
+
+    def _history(self, bot_id: str) -> Dict[int, BotRevision]:
+        return self.store.history.setdefault((self.tenant, bot_id), {})
+
+    def record(
+        self,
+        bots: List[Bot],
+        changed: Optional[Iterable[str]] = None,
+    ) -> None:
+        """
+        Save new revisions of bots.
+
+        :param bots: bots right after the change.
+        :param changed: names of the changed fields,
+            None to save all fields as a checkpoint.
+        """
+        changed = None if changed is None else set(changed)
+        for bot in bots:
+            self._history(bot.bot_id).setdefault(
+                bot.revision,
+                revision_document(bot, changed),
+            )
+
+    async def get_revisions(
+        self,
+        bot_id: str,
+        limit: int,
+        offset: int,
+    ) -> Tuple[List[BotRevision], int]:
+        """
+        Get the history of a bot, newest revisions first.
+
+        :param bot_id: bot id.
+        :param limit: limit of revisions.
+        :param offset: offset of revisions.
+        :return: page of revisions and the total number of revisions.
+        """
+        history = self._history(bot_id)
+        revisions = [history[revision] for revision in sorted(history, reverse=True)]
+        return [
+            revision.model_copy(deep=True)
+            for revision in revisions[offset : offset + limit]
+        ], len(revisions)
+
+    async def materialize(self, bot_id: str, revision: int) -> Optional[dict]:
+        """
+        Rebuild fields of a bot at a revision.
+
+        :param bot_id: bot id.
+        :param revision: revision to rebuild.
+        :return: field values or None if the history doesn't cover the revision.
+        """
+        history = self._history(bot_id)
+        checkpoint = next(
+            (
+                history[number]
+                for number in range(revision, -1, -1)
+                if number in history and history[number].checkpoint
+            ),
+            None,
+        )
+        if checkpoint is None:
+            return None
+        values = unpack_fields(checkpoint.data)
+        for number in range(checkpoint.revision + 1, revision + 1):
+            if number not in history:
+                return None
+            values.update(unpack_fields(history[number].data))
+        return values
+
+
+class MemoryBotDAO:
+    """
+    Bots kept in process memory, for tests and benchmarks.
+
+    Gives the same results as BotDAO, except for full-text search,
+    which only approximates the mongo text index: bots having any of
+    the words, scored by the weights of the fields they are in.
+    Every worker process has its own store, so it's not meant for
+    deployments with more than one worker.
+    """
+
+    def __init__(
+        self,
+        store: Optional[MemoryBotStore] = None,
+        tenant: str = DEFAULT_TENANT,
+    ) -> None:
+        self.store = store or MemoryBotStore()
+        self.tenant = tenant
+        self.revisions = MemoryBotRevisionDAO(self.store, tenant)
+
+    def with_tenant(self, tenant: str) -> "MemoryBotDAO":
+        """
+        Get a DAO for bots of another tenant, sharing the store.
+
+        :param tenant: tenant name.
+        :return: new DAO.
+        """
+        dao = copy.copy(self)
+        dao.tenant = tenant
+        dao.revisions = MemoryBotRevisionDAO(self.store, tenant)
+        return dao
+
+    def _find(self, bot_id: str, include_deleted: bool = False) -> Optional[Bot]:
+        bot = self.store.bots.get(self.tenant, {}).get(bot_id)
+        if bot is None or (bot.deleted_at is not None and not include_deleted):
+            return None
+        return bot
+
+    def _live(self, names: List[Tuple[str, str]]) -> List[Bot]:
+        bots = self.store.bots.get(self.tenant, {})
+        return [bots[bot_id].model_copy(deep=True) for _, bot_id in names]
+
+    def _change(
+        self,
+        bot: Bot,
+        values: dict,
+        changed: Iterable[str],
+    ) -> Bot:
+        updated = Bot.model_validate(
+            {**dict(bot), **values, "revision": bot.revision + 1},
+        )
+        self.store.save(updated)
+        self.revisions.record([updated], changed)
+        return updated.model_copy(deep=True)
+
+    async def get_bots_count(self) -> int:
+        """
+        Get the total count of live bots.
+
+        :return: Total number of bots.
+        """
+        return len(self.store.names.get(self.tenant, []))
+
+    async def get_bot_by_id(
+        self,
+        bot_id: str,
+        include_deleted: bool = False,
+    ) -> Optional[Bot]:
+        """
+        Get a single bot model by bot_id.
+
+        :param bot_id: bot id.
+        :param include_deleted: return the tombstone of a deleted bot.
+        :return: Bot instance or None if not found.
+        """
+        bot = self._find(bot_id, include_deleted=include_deleted)
+        return None if bot is None else bot.model_copy(deep=True)
+
+    async def get_bot_at_revision(
+        self,
+        bot_id: str,
+        revision: int,
+    ) -> Optional[Bot]:
+        """
+        Rebuild a bot as it was at a revision.
+
+        :param bot_id: bot id.
+        :param revision: revision of the bot.
+        :return: bot or None if the bot or the revision is unknown.
+        """
+        current = self._find(bot_id, include_deleted=True)
+        if current is None or not 0 <= revision <= current.revision:
+            return None
+        if revision == current.revision:
+            return current.model_copy(deep=True)
+        values = await self.revisions.materialize(bot_id, revision)
+        if values is None:
+            return None
+        return Bot.model_validate(
+            {**values, "id": current.id, "tenant": self.tenant, "revision": revision},
+        )
+
+    async def create_bot_model(self, **kwargs: Any) -> Bot:
+        """
+        Add a single bot.
+
+        A tombstone of a deleted bot with the same bot_id is replaced,
+        the new bot continues its revisions and history.
+
+        :param kwargs: fields for Bot.
+        :raises BotAlreadyExistsError: if a live bot has the same bot_id.
+        :return: created bot.
+        """
+        bot = Bot(**kwargs)
+        bot.id = PydanticObjectId()
+        bot.tenant = self.tenant
+        bot.active_cloth_id = get_active_cloth_id(bot.bot_clothes)
+        bot.deleted_at = None
+        bot.revision = 0
+        existing = self._find(bot.bot_id, include_deleted=True)
+        if existing is not None:
+            if existing.deleted_at is None:
+                raise BotAlreadyExistsError(bot.bot_id)
+            bot.revision = existing.revision + 1
+        self.store.save(bot)
+        self.revisions.record([bot])
+        return bot.model_copy(deep=True)
+
+    async def get_all_bots(self, limit: int, offset: int) -> List[Bot]:
+        """
+        Get all bot models with limit/offset pagination.
+
+        :param limit: limit of bots.
+        :param offset: offset of bots.
+        :return: list of bots.
+        """
+        names = self.store.names.get(self.tenant, [])
+        return self._live(names[offset : offset + limit if limit else None])
+
+    async def iter_all_bots(
+        self,
+        limit: int = 0,
+        offset: int = 0,
+    ) -> AsyncIterator[Bot]:
+        """
+        Iterate over bot models in listing order.
+
+        :param limit: limit of bots, 0 for all.
+        :param offset: offset of bots.
+        :yield: bots.
+        """
+        for bot in await self.get_all_bots(limit, offset):
+            yield bot
+
+    async def filter(
+        self,
+        bot_id: Optional[str] = None,
+        bot_name: Optional[str] = None,
+    ) -> List[Bot]:
+        """
+        Get specific bot models by bot_id or bot_name.
+
+        :param bot_id: bot id.
+        :param bot_name: bot name.
+        :return: list of bots.
+        """
+        if bot_id is None and bot_name is None:
+            return []
+        if bot_name is None:
+            bot = await self.get_bot_by_id(bot_id)  # type: ignore
+            return [bot] if bot is not None else []
+        names = self.store.name_range(self.tenant, bot_name, bot_name + "\x00")
+        return [
+            bot
+            for bot in self._live(names)
+            if bot_id is None or bot.bot_id == bot_id
+        ]
+
+    async def search(
+        self,
+        text: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[List[BotSummary], int]:
+        """
+        Search bots by persona words and/or bot_name prefix.
+
+        :param text: words to look up in the persona fields.
+        :param name_prefix: case-sensitive prefix of bot_name.
+        :param limit: limit of results.
+        :param offset: offset of results.
+        :return: page of bot summaries and the total number of matches.
+        """
+        if not text and not name_prefix:
+            return [], 0
+        if name_prefix:
+            names = self.store.name_range(
+                self.tenant,
+                name_prefix,
+                name_prefix + PREFIX_END,
+            )
+        else:
+            names = self.store.names.get(self.tenant, [])
+        bots = self._live(names)
+        summaries = [BotSummary.model_validate(dict(bot)) for bot in bots]
+        if text:
+            words = set(_words(text))
+            for summary, bot in zip(summaries, bots):
+                summary.score = sum(
+                    weight * count
+                    for field, weight in TEXT_WEIGHTS.items()
+                    for word, count in Counter(_words(getattr(bot, field))).items()
+                    if word in words
+                )
+            summaries = sorted(
+                (summary for summary in summaries if summary.score),
+                key=lambda summary: -summary.score,
+            )
+        return summaries[offset : offset + limit], len(summaries)
+
+    async def delete_bot_by_id(self, bot_id: str) -> Optional[Bot]:
+        """
+        Delete a bot model by bot_id, keeping a tombstone.
+
+        :param bot_id: bot id.
+        :return: tombstone of the bot or None if there was no such bot.
+        """
+        bot = self._find(bot_id)
+        if bot is None:
+            return None
+        return self._change(
+            bot,
+            {"deleted_at": datetime.now(timezone.utc)},
+            {"deleted_at"},
+        )
+
+    async def delete_bots(
+        self,
+        bot_ids: Optional[List[str]] = None,
+        bot_name: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+    ) -> List[Bot]:
+        """
+        Delete all bots matching a filter.
+
+        All conditions must match, at least one has to be given.
+
+        :param bot_ids: ids of the bots.
+        :param bot_name: exact bot name.
+        :param name_prefix: case-sensitive prefix of bot_name.
+        :return: tombstones of the deleted bots.
+        """
+        if bot_ids is None and bot_name is None and not name_prefix:
+            return []
+        deleted_at = datetime.now(timezone.utc)
+        names = list(self.store.names.get(self.tenant, []))
+        deleted = []
+        for name, bot_id in names:
+            if bot_ids is not None and bot_id not in bot_ids:
+                continue
+            if bot_name is not None and name != bot_name:
+                continue
+            if name_prefix and not name.startswith(name_prefix):
+                continue
+            bot = self.store.bots[self.tenant][bot_id]
+            deleted.append(
+                self._change(bot, {"deleted_at": deleted_at}, {"deleted_at"}),
+            )
+        return deleted
+
+    async def restore_bot_by_id(self, bot_id: str) -> Optional[Bot]:
+        """
+        Restore a deleted bot.
+
+        :param bot_id: bot id.
+        :return: restored bot or None if there is no tombstone of it.
+        """
+        bot = self._find(bot_id, include_deleted=True)
+        if bot is None or bot.deleted_at is None:
+            return None
+        return self._change(bot, {"deleted_at": None}, {"deleted_at"})
+
+    async def update_bot_by_id(
+        self,
+        bot_id: str,
+        update_fields: dict,
+        expected_revision: Optional[int] = None,
+    ) -> Optional[Bot]:
+        """
+        Update a bot model by bot_id.
+
+        :param bot_id: bot id.
+        :param update_fields: fields to update.
+        :param expected_revision: update only if the bot is still
+            at this revision (compare-and-swap).
+        :raises RevisionConflictError: if the bot is at another revision.
+        :return: updated bot model or None.
+        """
+        bot = self._find(bot_id)
+        if bot is None:
+            return None
+        if expected_revision is not None and bot.revision != expected_revision:
+            raise RevisionConflictError(bot_id, bot.revision)
+        update = dict(update_fields)
+        if "bot_clothes" in update:
+            clothes = [BotCloth.model_validate(c) for c in update["bot_clothes"]]
+            update["bot_clothes"] = clothes
+            update["active_cloth_id"] = get_active_cloth_id(clothes)
+        return self._change(bot, update, update)
+
+    async def set_cloth_in_use(self, bot_id: str, cloth_id: str) -> Optional[Bot]:
+        """
+        Set a specific cloth as in use for a bot.
+
+        :param bot_id: bot id.
+        :param cloth_id: cloth id to set as in use.
+        :return: updated bot model or None if the bot or the cloth is missing.
+        """
+        bot = self._find(bot_id)
+        if bot is None or all(c.cloth_id != cloth_id for c in bot.bot_clothes):
+            return None
+        clothes = [
+            cloth.model_copy(update={"cloth_in_use": cloth.cloth_id == cloth_id})
+            for cloth in bot.bot_clothes
+        ]
+        return self._change(
+            bot,
+            {"bot_clothes": clothes, "active_cloth_id": cloth_id},
+            CLOTHES_FIELDS,
+        )
+
+    async def add_cloth(self, bot_id: str, cloth: BotCloth) -> Optional[Bot]:
+        """
+        Add a cloth to the wardrobe of a bot, as not in use.
+
+        :param bot_id: bot id.
+        :param cloth: cloth to add.
+        :return: updated bot model or None if the bot is missing
+            or already has a cloth with the same id.
+        """
+        bot = self._find(bot_id)
+        if bot is None or any(c.cloth_id == cloth.cloth_id for c in bot.bot_clothes):
+            return None
+        cloth = cloth.model_copy(update={"cloth_in_use": False})
+        return self._change(
+            bot,
+            {"bot_clothes": [*bot.bot_clothes, cloth]},
+            CLOTHES_FIELDS,
+        )
+
+    async def remove_cloth(self, bot_id: str, cloth_id: str) -> Optional[Bot]:
+        """
+        Remove a cloth from the wardrobe of a bot.
+
+        :param bot_id: bot id.
+        :param cloth_id: cloth id to remove.
+        :return: updated bot model or None if the bot or the cloth is missing.
+        """
+        bot = self._find(bot_id)
+        if bot is None or all(c.cloth_id != cloth_id for c in bot.bot_clothes):
+            return None
+        active_cloth_id = bot.active_cloth_id
+        if active_cloth_id == cloth_id:
+            active_cloth_id = None
+        return self._change(
+            bot,
+            {
+                "bot_clothes": [c for c in bot.bot_clothes if c.cloth_id != cloth_id],
+                "active_cloth_id": active_cloth_id,
+            },
+            CLOTHES_FIELDS,
+        )
+
+    async def get_active_cloth(self, bot_id: str) -> Optional[BotActiveCloth]:
+        """
+        Get the cloth in use of a bot.
+
+        :param bot_id: bot id.
+        :return: active cloth or None if the bot is missing.
+        """
+        bot = self._find(bot_id)
+        if bot is None:
+            return None
+        return BotActiveCloth(
+            tenant=bot.tenant,
+            bot_id=bot.bot_id,
+            active_cloth_id=bot.active_cloth_id,
+            bot_clothes=[
+                cloth.model_copy() for cloth in bot.bot_clothes if cloth.cloth_in_use
+            ][:1],
+        )
@@ -0,0 +1,206 @@
+import copy
+from itertools import islice
+from typing import Any, AsyncIterator, List, NoReturn, Optional, Tuple
+
+from aichat_common.db.models.bot_model import (
+    DEFAULT_TENANT,
+    Bot,
+    BotActiveCloth,
+    BotSummary,
+)
+from aichat_common.db.snapshot import SnapshotCatalog
+
+
+class SnapshotUnsupportedError(Exception):
+    """Raised for operations a bot snapshot can't serve, e.g. writes."""
+
+    def __init__(self, operation: str) -> None:
+        super().__init__(f"{operation} is not available on a bot snapshot")
+        self.operation = operation
+
+
+class SnapshotBotDAO:
+    """
+    Read-only access to bots of a snapshot file, see `write_snapshot`.
+
+    A drop-in for the read operations of BotDAO on nodes without mongo.
+    Snapshots hold live bots only, writes, history and full-text search
+    raise SnapshotUnsupportedError. All DAOs created by `with_tenant`
+    share the catalog and see a new snapshot at the same time.
+    """
+
+    def __init__(self, catalog: SnapshotCatalog, tenant: str = DEFAULT_TENANT) -> None:
+        self.catalog = catalog
+        self.tenant = tenant
+
+    def with_tenant(self, tenant: str) -> "SnapshotBotDAO":
+        """
+        Get a DAO for bots of another tenant.
+
+        :param tenant: tenant name.
+        :return: new DAO.
+        """
+        dao = copy.copy(self)
+        dao.tenant = tenant
+        return dao
+
+    @property
+    def revisions(self) -> NoReturn:
+        """History of bots, which snapshots don't keep."""
+        raise SnapshotUnsupportedError("Bot history")
+
+    def _page(self, limit: int, offset: int) -> List[bytes]:
+        records = self.catalog.current().iter_by_name(self.tenant)
+        return list(islice(records, offset, offset + limit if limit else None))
+
+    async def get_bots_count(self) -> int:
+        """
+        Get the total count of bots in the snapshot.
+
+        :return: Total number of bots.
+        """
+        return self.catalog.current().count_bots(self.tenant)
+
+    async def get_bot_by_id(
+        self,
+        bot_id: str,
+        include_deleted: bool = False,
+    ) -> Optional[Bot]:
+        """
+        Get a single bot model by bot_id.
+
+        :param bot_id: bot id.
+        :param include_deleted: ignored, snapshots have no tombstones.
+        :return: Bot instance or None if not found.
+        """
+        record = self.catalog.current().get(self.tenant, bot_id)
+        if record is None:
+            return None
+        return Bot.model_validate_json(record)
+
+    async def get_bot_at_revision(
+        self,
+        bot_id: str,
+        revision: int,
+    ) -> Optional[Bot]:
+        """
+        Get a bot at a revision, only the revision in the snapshot is known.
+
+        :param bot_id: bot id.
+        :param revision: revision of the bot.
+        :return: bot or None if the bot or the revision is unknown.
+        """
+        bot = await self.get_bot_by_id(bot_id)
+        if bot is None or bot.revision != revision:
+            return None
+        return bot
+
+    async def get_all_bots(self, limit: int, offset: int) -> List[Bot]:
+        """
+        Get all bot models with limit/offset pagination.
+
+        :param limit: limit of bots.
+        :param offset: offset of bots.
+        :return: list of bots.
+        """
+        return [
+            Bot.model_validate_json(record)
+            for record in self._page(limit, offset)
+        ]
+
+    async def iter_all_bots(
+        self,
+        limit: int = 0,
+        offset: int = 0,
+    ) -> AsyncIterator[Bot]:
+        """
+        Iterate over bot models in listing order.
+
+        :param limit: limit of bots, 0 for all.
+        :param offset: offset of bots.
+        :yield: bots.
+        """
+        for record in self._page(limit, offset):
+            yield Bot.model_validate_json(record)
+
+    async def filter(
+        self,
+        bot_id: Optional[str] = None,
+        bot_name: Optional[str] = None,
+    ) -> List[Bot]:
+        """
+        Get specific bot models by bot_id or bot_name.
+
+        :param bot_id: bot id.
+        :param bot_name: bot name.
+        :return: list of bots.
+        """
+        if bot_id is None and bot_name is None:
+            return []
+        if bot_name is None:
+            bot = await self.get_bot_by_id(bot_id)  # type: ignore
+            return [bot] if bot is not None else []
+        bots = [
+            Bot.model_validate_json(record)
+            for record in self.catalog.current().iter_by_name(
+                self.tenant,
+                bot_name,
+                exact=True,
+            )
+        ]
+        return [bot for bot in bots if bot_id is None or bot.bot_id == bot_id]
+
+    async def search(
+        self,
+        text: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[List[BotSummary], int]:
+        """
+        Search bots by bot_name prefix, full-text search isn't supported.
+
+        :param text: words to look up, must be empty.
+        :param name_prefix: case-sensitive prefix of bot_name.
+        :param limit: limit of results.
+        :param offset: offset of results.
+        :return: page of bot summaries and the total number of matches.
+        """
+        if text:
+            raise SnapshotUnsupportedError("Full-text search")
+        if not name_prefix:
+            return [], 0
+        records = list(self.catalog.current().iter_by_name(self.tenant, name_prefix))
+        return [
+            BotSummary.model_validate_json(record)
+            for record in records[offset : offset + limit]
+        ], len(records)
+
+    async def get_active_cloth(self, bot_id: str) -> Optional[BotActiveCloth]:
+        """
+        Get the cloth a bot is wearing.
+
+        :param bot_id: bot id.
+        :return: active cloth or None if the bot is not found.
+        """
+        bot = await self.get_bot_by_id(bot_id)
+        if bot is None:
+            return None
+        return BotActiveCloth(
+            tenant=bot.tenant,
+            bot_id=bot.bot_id,
+            active_cloth_id=bot.active_cloth_id,
+            bot_clothes=[c for c in bot.bot_clothes if c.cloth_in_use][:1],
+        )
+
+    async def _read_only(self, *args: Any, **kwargs: Any) -> NoReturn:
+        raise SnapshotUnsupportedError("Changing bots")
+
+    create_bot_model = _read_only
+    update_bot_by_id = _read_only
+    delete_bot_by_id = _read_only
+    delete_bots = _read_only
+    restore_bot_by_id = _read_only
+    set_cloth_in_use = _read_only
+    add_cloth = _read_only
+    remove_cloth = _read_only
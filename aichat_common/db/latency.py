@@ -0,0 +1,37 @@
+from pymongo import monitoring
+
+from aichat_common.metrics import metrics
+
+
+class DbLatencyTracker(monitoring.CommandListener):
+    """
+    Tracks latency of mongo commands.
+
+    Keeps an exponentially weighted moving average
+    of command durations, used for adaptive admission control.
+    """
+
+    def __init__(self, alpha: float = 0.1) -> None:
+        self.alpha = alpha
+        self.ewma_ms = 0.0
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        """Ignore started commands."""
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        """Account duration of a finished command."""
+        self._observe(event.duration_micros / 1000)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        """Account duration of a failed command."""
+        self._observe(event.duration_micros / 1000)
+
+    def _observe(self, duration_ms: float) -> None:
+        if self.ewma_ms == 0:
+            self.ewma_ms = duration_ms
+        else:
+            self.ewma_ms += self.alpha * (duration_ms - self.ewma_ms)
+        metrics.set_gauge("db_latency_ewma_ms", self.ewma_ms)
+
+
+db_latency = DbLatencyTracker()
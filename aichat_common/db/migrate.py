@@ -0,0 +1,44 @@
+import logging
+import time
+
+import beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from aichat_common.db.dao.bot_dao import BotDAO
+from aichat_common.db.models import load_all_models
+from aichat_common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+async def run_migrations() -> None:
+    """
+    Backfill new fields and bring indexes in line with the models.
+
+    Indexes that are no longer declared on models (e.g. replaced by
+    tenant-prefixed ones) are dropped. Run once per deployment,
+    so workers can start with `db_create_indexes` disabled.
+    """
+    started = time.perf_counter()
+    client = AsyncIOMotorClient(str(settings.db_url))  # type: ignore
+    try:
+        await beanie.init_beanie(
+            database=client[settings.db_base],
+            document_models=load_all_models(),  # type: ignore
+            skip_indexes=True,
+        )
+        bot_dao = BotDAO()
+        backfilled = await bot_dao.backfill_tenant()
+        logger.info(f"Backfilled tenant of {backfilled} bots")
+        backfilled = await bot_dao.backfill_active_cloth()
+        logger.info(f"Backfilled active_cloth_id of {backfilled} bots")
+        backfilled = await bot_dao.revisions.backfill_checkpoints()
+        logger.info(f"Backfilled history checkpoints of {backfilled} bots")
+        await beanie.init_beanie(
+            database=client[settings.db_base],
+            document_models=load_all_models(),  # type: ignore
+            allow_index_dropping=True,
+        )
+    finally:
+        client.close()
+    logger.info(f"Migrations finished in {time.perf_counter() - started:.2f}s")
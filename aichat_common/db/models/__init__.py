@@ -5,10 +5,12 @@ from typing import Sequence, Type
 from beanie import Document
 
 from aichat_common.db.models.bot_model import BotModel
+from aichat_common.db.models.bot_revision_model import BotRevisionModel
 
 
 def load_all_models() -> Sequence[Type[Document]]:
     """Load all models from this folder."""
     return [
         BotModel,
+        BotRevisionModel,
     ]
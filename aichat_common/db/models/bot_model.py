@@ -1,7 +1,11 @@
 import pymongo
-from typing import List
+from datetime import datetime
+from typing import Any, ClassVar, Dict, List, Optional
 from pydantic import Field, BaseModel
-from beanie import Document
+from beanie import Document, PydanticObjectId
+
+# Tenant of bots created without one and of data stored before tenants.
+DEFAULT_TENANT = "default"
 
 
 class BotCloth(BaseModel):
@@ -10,7 +14,17 @@ class BotCloth(BaseModel):
     cloth_in_use: bool = Field(default=False, description="服装是否正在使用")
 
 
-class BotModel(Document):
+class Bot(BaseModel):
+    """
+    A bot as it is stored, without the database bindings of BotModel.
+
+    Backends without mongo (memory, snapshot) and the redis cache build
+    bots as this model, beanie documents can't be created before
+    `init_beanie` connected to the database.
+    """
+
+    id: Optional[PydanticObjectId] = None
+    tenant: str = Field(default=DEFAULT_TENANT, description="租户")
     bot_id: str = Field(..., description="Client ID")
     bot_name: str = Field(...)
     bot_prop: str = Field(..., description="人物属性")
@@ -27,15 +41,113 @@ class BotModel(Document):
     bot_character_background: str = Field(..., description="人物背景")
     bot_work_info: str = Field(..., description="工作信息")
     bot_clothes: List[BotCloth] = Field(default=[], description="衣物列表")
+    # Denormalized id of the cloth in use, kept in sync by BotDAO.
+    active_cloth_id: Optional[str] = Field(default=None, description="当前服装ID")
+    revision: int = Field(default=0, description="修订号, 每次修改递增")
+    # Deleted bots are kept as tombstones until they are purged.
+    deleted_at: Optional[datetime] = Field(default=None, description="删除时间")
+
+    def __repr__(self) -> str:
+        return f"<Bot({self.bot_name}) {self.bot_id}>"
+
+    def __str__(self) -> str:
+        return f"Bot: {self.bot_name} ({self.bot_id})"
+
+
+class BotModel(Document, Bot):
+    """Bot stored in mongo."""
 
     class Settings:
         name = "bots"
+        # Every index starts with tenant, so tenants never scan each other's bots.
         indexes = [
-            pymongo.IndexModel([("bot_id", pymongo.ASCENDING)], unique=True),
+            pymongo.IndexModel(
+                [("tenant", pymongo.ASCENDING), ("bot_id", pymongo.ASCENDING)],
+                name="tenant_bot_id",
+                unique=True,
+            ),
+            # Serves filtering by bot_name and the sorted listing of live bots.
+            pymongo.IndexModel(
+                [
+                    ("tenant", pymongo.ASCENDING),
+                    ("deleted_at", pymongo.ASCENDING),
+                    ("bot_name", pymongo.ASCENDING),
+                    ("bot_id", pymongo.ASCENDING),
+                ],
+                name="tenant_deleted_at_bot_name_bot_id",
+            ),
+            # Only tombstones are indexed here, for the purge job.
+            pymongo.IndexModel(
+                [("deleted_at", pymongo.ASCENDING)],
+                name="bot_tombstones",
+                partialFilterExpression={"deleted_at": {"$type": "date"}},
+            ),
+            # Only bots that currently wear a cloth are indexed here.
+            pymongo.IndexModel(
+                [
+                    ("tenant", pymongo.ASCENDING),
+                    ("bot_id", pymongo.ASCENDING),
+                    ("bot_clothes.cloth_id", pymongo.ASCENDING),
+                ],
+                name="tenant_bot_active_cloth",
+                partialFilterExpression={"bot_clothes.cloth_in_use": True},
+            ),
+            # Full-text search over persona fields. Stemming is disabled
+            # ("none") because most persona texts are Chinese.
+            # Text queries must match tenant exactly to use it.
+            pymongo.IndexModel(
+                [
+                    ("tenant", pymongo.ASCENDING),
+                    ("bot_name", pymongo.TEXT),
+                    ("bot_personality", pymongo.TEXT),
+                    ("bot_hobbies", pymongo.TEXT),
+                    ("bot_character_background", pymongo.TEXT),
+                ],
+                name="tenant_bot_persona_text",
+                weights={
+                    "bot_name": 10,
+                    "bot_personality": 5,
+                    "bot_hobbies": 3,
+                    "bot_character_background": 1,
+                },
+                default_language="none",
+            ),
         ]
 
-    def __repr__(self) -> str:
-        return f"<Bot({self.bot_name}) {self.bot_id}>"
 
-    def __str__(self) -> str:
-        return f"Bot: {self.bot_name} ({self.bot_id})"
+class BotSummary(BaseModel):
+    """Projection of a bot used by search results."""
+
+    bot_id: str
+    bot_name: str
+    bot_prop: str
+    score: float = 0.0
+
+
+class BotTextSearchSummary(BotSummary):
+    """Projection of a bot with its full-text relevance score."""
+
+    class Settings:
+        projection: ClassVar[Dict[str, Any]] = {
+            "bot_id": 1,
+            "bot_name": 1,
+            "bot_prop": 1,
+            "score": {"$meta": "textScore"},
+        }
+
+
+class BotActiveCloth(BaseModel):
+    """Projection of a bot with only the cloth in use."""
+
+    tenant: str = DEFAULT_TENANT
+    bot_id: str
+    active_cloth_id: Optional[str] = None
+    bot_clothes: List[BotCloth] = []
+
+    class Settings:
+        projection: ClassVar[Dict[str, Any]] = {
+            "tenant": 1,
+            "bot_id": 1,
+            "active_cloth_id": 1,
+            "bot_clothes": {"$elemMatch": {"cloth_in_use": True}},
+        }
@@ -0,0 +1,48 @@
+from datetime import datetime
+from typing import ClassVar, List
+
+import pymongo
+from beanie import Document
+from pydantic import BaseModel, Field
+
+from aichat_common.db.models.bot_model import DEFAULT_TENANT
+
+
+class BotRevision(BaseModel):
+    """
+    A single revision in the history of a bot.
+
+    Only the fields changed by the revision are stored, as zlib compressed
+    json. Checkpoints store all fields, so a revision is rebuilt from
+    the closest checkpoint before it and the diffs after that checkpoint.
+    """
+
+    tenant: str = Field(default=DEFAULT_TENANT, description="租户")
+    bot_id: str = Field(..., description="Client ID")
+    revision: int = Field(..., description="修订号")
+    checkpoint: bool = Field(default=False, description="是否为完整快照")
+    fields: List[str] = Field(default=[], description="修改的字段")
+    data: bytes = Field(..., description="压缩的字段值")
+    created_at: datetime = Field(..., description="修改时间")
+
+    def __repr__(self) -> str:
+        return f"<BotRevision({self.bot_id}) {self.revision}>"
+
+
+class BotRevisionModel(Document, BotRevision):
+    """Revision of a bot stored in mongo."""
+
+    class Settings:
+        name = "bot_revisions"
+        indexes: ClassVar[List[pymongo.IndexModel]] = [
+            # Serves the history listing and checkpoint lookups.
+            pymongo.IndexModel(
+                [
+                    ("tenant", pymongo.ASCENDING),
+                    ("bot_id", pymongo.ASCENDING),
+                    ("revision", pymongo.DESCENDING),
+                ],
+                name="tenant_bot_id_revision",
+                unique=True,
+            ),
+        ]
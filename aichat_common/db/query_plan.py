@@ -0,0 +1,57 @@
+import logging
+from typing import Any, List
+
+from beanie.odm.queries.find import FindMany
+
+from aichat_common.settings import QueryPlanCheck, settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryPlanError(Exception):
+    """Raised when a guarded query is planned as a collection scan."""
+
+
+def find_collscans(plan: Any) -> List[dict]:
+    """
+    Collect every COLLSCAN stage of an explained query plan.
+
+    :param plan: plan (or any part of it) returned by explain().
+    :return: list of stages that scan the whole collection.
+    """
+    stages: List[dict] = []
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            stages.append(plan)
+        for value in plan.values():
+            stages.extend(find_collscans(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(find_collscans(value))
+    return stages
+
+
+async def check_query_plan(query: FindMany) -> None:
+    """
+    Run explain() on a query and report collection scans.
+
+    The check is controlled by `settings.db_query_plan_check` and
+    does nothing when it is turned off.
+
+    :param query: beanie query to check.
+    :raises QueryPlanError: if a collection scan is found in "raise" mode.
+    """
+    mode = settings.db_query_plan_check
+    if mode == QueryPlanCheck.OFF:
+        return
+    explain = await query.motor_cursor.explain()
+    winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+    if not find_collscans(winning_plan):
+        return
+    message = (
+        f"COLLSCAN on {query.document_model.get_collection_name()} "
+        f"for filter={query.get_filter_query()} sort={query.sort_expressions}"
+    )
+    if mode == QueryPlanCheck.RAISE:
+        raise QueryPlanError(message)
+    logger.warning(message)
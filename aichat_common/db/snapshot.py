@@ -0,0 +1,291 @@
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Iterator, List, Optional, Tuple
+
+import aiofiles
+import beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from aichat_common.db.models import load_all_models
+from aichat_common.db.models.bot_model import Bot, BotModel
+from aichat_common.metrics import metrics
+from aichat_common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AICBOTS\x00"
+VERSION = 1
+# magic, version, bots, offset of the id index, offset of the name index
+HEADER = struct.Struct("<8sIIQQ")
+# offset and length of the key, offset and length of the record
+ENTRY = struct.Struct("<QIQI")
+# Separates parts of index keys, sorts below any other character,
+# so keys of a tenant are ordered as (bot_id) or (bot_name, bot_id).
+SEPARATOR = b"\x00"
+# Never appears in utf-8, bounds all keys starting with a prefix.
+PREFIX_END = b"\xff"
+
+FileIdentity = Tuple[int, int, int]
+
+
+class SnapshotError(Exception):
+    """A bot snapshot is missing or is not a snapshot."""
+
+
+def _id_key(tenant: str, bot_id: str) -> bytes:
+    return SEPARATOR.join([tenant.encode(), bot_id.encode()])
+
+
+def _name_key(tenant: str, bot_name: str, bot_id: str) -> bytes:
+    return SEPARATOR.join([tenant.encode(), bot_name.encode(), bot_id.encode()])
+
+
+def _identity(stat: os.stat_result) -> FileIdentity:
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+async def write_snapshot(bots: AsyncIterable[Bot], path: Path) -> int:
+    """
+    Write bots into a snapshot file.
+
+    The file is: a header, json records of the bots, index keys and two
+    sorted arrays of fixed size entries pointing at keys and records -
+    by (tenant, bot_id) and by (tenant, bot_name, bot_id). Records are
+    streamed to disk, only keys are kept in memory. The file is written
+    next to `path` and renamed over it, so readers never see a partial
+    snapshot.
+
+    :param bots: bots to put into the snapshot.
+    :param path: path of the snapshot.
+    :return: number of bots written.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    # (id key, name key, record offset, record length)
+    entries: List[Tuple[bytes, bytes, int, int]] = []
+    try:
+        async with aiofiles.open(tmp_path, "wb") as snapshot_file:
+            offset = await snapshot_file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+            async for bot in bots:
+                record = bot.model_dump_json().encode()
+                entries.append(
+                    (
+                        _id_key(bot.tenant, bot.bot_id),
+                        _name_key(bot.tenant, bot.bot_name, bot.bot_id),
+                        offset,
+                        len(record),
+                    ),
+                )
+                offset += await snapshot_file.write(record)
+            key_offsets = []
+            for id_key, name_key, _, _ in entries:
+                key_offsets.append((offset, offset + len(id_key)))
+                offset += await snapshot_file.write(id_key + name_key)
+            indexes = []
+            for key in (0, 1):
+                order = sorted(range(len(entries)), key=lambda i: entries[i][key])
+                indexes.append(offset)
+                offset += await snapshot_file.write(
+                    b"".join(
+                        ENTRY.pack(
+                            key_offsets[i][key],
+                            len(entries[i][key]),
+                            entries[i][2],
+                            entries[i][3],
+                        )
+                        for i in order
+                    ),
+                )
+            await snapshot_file.seek(0)
+            await snapshot_file.write(
+                HEADER.pack(MAGIC, VERSION, len(entries), indexes[0], indexes[1]),
+            )
+            await snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        tmp_path.replace(path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return len(entries)
+
+
+class BotSnapshot:
+    """
+    Bots of a snapshot file mapped into memory.
+
+    Lookups binary search the index entries right in the map, nothing
+    is parsed upfront and the pages are shared by all workers of
+    the node through the page cache. Only records of found bots
+    are copied out of the map to be decoded.
+    """
+
+    def __init__(self, path: Path) -> None:
+        with path.open("rb") as snapshot_file:
+            self.identity = _identity(os.fstat(snapshot_file.fileno()))
+            try:
+                self._map = mmap.mmap(
+                    snapshot_file.fileno(), 0, access=mmap.ACCESS_READ,
+                )
+            except ValueError as e:
+                raise SnapshotError(f"{path} is empty") from e
+        if len(self._map) < HEADER.size:
+            raise SnapshotError(f"{path} is not a bot snapshot")
+        magic, version, self.count, self._by_id, self._by_name = HEADER.unpack_from(
+            self._map,
+        )
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError(f"{path} is not a bot snapshot of version {VERSION}")
+
+    def _entry(self, index: int, position: int) -> Tuple[int, int, int, int]:
+        return ENTRY.unpack_from(self._map, index + position * ENTRY.size)
+
+    def _key(self, index: int, position: int) -> bytes:
+        key_offset, key_length, _, _ = self._entry(index, position)
+        return self._map[key_offset : key_offset + key_length]
+
+    def _bisect(self, index: int, key: bytes) -> int:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(index, middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _range(self, index: int, prefix: bytes) -> Tuple[int, int]:
+        return self._bisect(index, prefix), self._bisect(index, prefix + PREFIX_END)
+
+    def _record(self, index: int, position: int) -> bytes:
+        _, _, record_offset, record_length = self._entry(index, position)
+        return self._map[record_offset : record_offset + record_length]
+
+    def get(self, tenant: str, bot_id: str) -> Optional[bytes]:
+        """
+        Find a bot.
+
+        :param tenant: tenant of the bot.
+        :param bot_id: bot id.
+        :return: json of the bot or None if it is not in the snapshot.
+        """
+        key = _id_key(tenant, bot_id)
+        position = self._bisect(self._by_id, key)
+        if position == self.count or self._key(self._by_id, position) != key:
+            return None
+        return self._record(self._by_id, position)
+
+    def count_bots(self, tenant: str) -> int:
+        """
+        Count bots of a tenant.
+
+        :param tenant: tenant name.
+        :return: number of bots.
+        """
+        start, end = self._range(self._by_id, tenant.encode() + SEPARATOR)
+        return end - start
+
+    def iter_by_name(
+        self, tenant: str, name_prefix: str = "", exact: bool = False,
+    ) -> Iterator[bytes]:
+        """
+        Iterate over bots of a tenant ordered by (bot_name, bot_id).
+
+        :param tenant: tenant name.
+        :param name_prefix: only bots with names starting with it.
+        :param exact: only bots named `name_prefix`.
+        :yield: json of bots.
+        """
+        prefix = tenant.encode() + SEPARATOR + name_prefix.encode()
+        if exact:
+            prefix += SEPARATOR
+        start, end = self._range(self._by_name, prefix)
+        for position in range(start, end):
+            yield self._record(self._by_name, position)
+
+
+class SnapshotCatalog:
+    """
+    The current bot snapshot of a path, swapped when a new one lands.
+
+    The path is checked at most every `check_interval` seconds, a
+    replaced file is mapped and used by the following lookups, the
+    previous map is unmapped once nothing refers to it. A file that
+    can't be read is reported and the previous snapshot is kept.
+    New snapshots must be moved over the path, like `write_snapshot`
+    does, a mapped file rewritten in place breaks the reads.
+    """
+
+    def __init__(self, path: Path, check_interval: float = 1) -> None:
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot: Optional[BotSnapshot] = None
+        self._checked_at = 0.0
+
+    def current(self) -> BotSnapshot:
+        """
+        Get the snapshot to serve a lookup from.
+
+        :return: snapshot.
+        :raises SnapshotError: if there was never a readable snapshot.
+        """
+        now = time.monotonic()
+        if self._snapshot is None or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._reload()
+        if self._snapshot is None:
+            raise SnapshotError(f"No bot snapshot at {self.path}")
+        return self._snapshot
+
+    def _reload(self) -> None:
+        try:
+            current = self._snapshot
+            if current is not None and _identity(self.path.stat()) == current.identity:
+                return
+            snapshot = BotSnapshot(self.path)
+        except (OSError, SnapshotError) as e:
+            if self._snapshot is not None:
+                logger.warning(f"Keeping the previous bot snapshot: {e}")
+            return
+        self._snapshot = snapshot
+        logger.info(f"Loaded bot snapshot {self.path} with {snapshot.count} bots")
+        metrics.inc("bot_snapshot_loads_total")
+        metrics.set_gauge("bot_snapshot_bots", snapshot.count)
+
+
+async def iter_live_bots() -> AsyncIterator[BotModel]:
+    """
+    Iterate over bots of all tenants, except deleted ones.
+
+    :yield: bots.
+    """
+    async for bot in BotModel.find({"deleted_at": None}):
+        yield bot
+
+
+async def run_snapshot_export(path: Optional[Path] = None) -> int:
+    """
+    Write live bots of all tenants into a snapshot for edge nodes.
+
+    :param path: path of the snapshot, `bot_snapshot_path` by default.
+    :return: number of bots written.
+    """
+    path = path or settings.bot_snapshot_path
+    started = time.perf_counter()
+    client = AsyncIOMotorClient(str(settings.db_url))  # type: ignore
+    try:
+        await beanie.init_beanie(
+            database=client[settings.db_base],
+            document_models=load_all_models(),  # type: ignore
+            skip_indexes=True,
+        )
+        written = await write_snapshot(iter_live_bots(), path)
+    finally:
+        client.close()
+    logger.info(
+        f"Wrote {written} bots to {path} in {time.perf_counter() - started:.2f}s",
+    )
+    return written
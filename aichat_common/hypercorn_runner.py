@@ -0,0 +1,41 @@
+from aichat_common.settings import settings
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None  # type: ignore
+
+
+def run_hypercorn(app: str) -> int:
+    """
+    Run the application with hypercorn.
+
+    Unlike uvicorn, hypercorn serves HTTP/2: over TLS (negotiated with ALPN)
+    if `ssl_certfile` and `ssl_keyfile` are set, otherwise h2c.
+
+    :param app: python path to the app factory call, e.g. `module:get_app()`.
+    :return: exit code.
+    """
+    try:
+        from hypercorn.config import Config
+        from hypercorn.run import run
+    except ImportError as e:
+        raise RuntimeError(
+            "hypercorn is not installed, install it to use "
+            "AICHAT_COMMON_SERVER=hypercorn",
+        ) from e
+
+    config = Config()
+    config.application_path = app
+    config.bind = [f"{settings.host}:{settings.port}"]
+    config.workers = settings.workers_count
+    config.worker_class = "uvloop" if uvloop is not None else "asyncio"
+    config.keep_alive_timeout = settings.keep_alive_timeout
+    config.backlog = settings.backlog
+    config.max_requests = settings.max_requests or None
+    config.max_requests_jitter = settings.max_requests_jitter
+    config.certfile = settings.ssl_certfile
+    config.keyfile = settings.ssl_keyfile
+    config.accesslog = "-"
+    config.loglevel = settings.log_level.value
+    return run(config)
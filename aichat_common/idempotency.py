@@ -0,0 +1,126 @@
+import hashlib
+import time
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from aichat_common.response_cache import CachedResponse, dump_headers, load_headers
+
+IDEMPOTENCY_PREFIX = "idem:"
+
+# Claim a key for a request or get what is stored under it.
+# KEYS[1] - key. ARGV[1] - request fingerprint, ARGV[2] - seconds of the claim.
+# Returns {} if claimed, otherwise {fingerprint, status, headers, body, stored_at}
+# with status false while the request that claimed the key is running.
+CLAIM_SCRIPT = """
+if redis.call('HSETNX', KEYS[1], 'fingerprint', ARGV[1]) == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return {}
+end
+return redis.call(
+    'HMGET', KEYS[1], 'fingerprint', 'status', 'headers', 'body', 'stored_at'
+)
+"""
+
+
+class IdempotencyKeyInUseError(Exception):
+    """Another request with the same idempotency key is still running."""
+
+
+class IdempotencyKeyReusedError(Exception):
+    """The idempotency key was used with a different request."""
+
+
+class IdempotencyStore:
+    """
+    Responses of requests with idempotency keys in redis.
+
+    The first request with a key claims it for `lock_ttl` seconds and
+    its response is kept for `window` seconds, retries get that response
+    instead of running the request again. A request that failed releases
+    the key, so it can be retried.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        window: int,
+        lock_ttl: int,
+        prefix: str = IDEMPOTENCY_PREFIX,
+    ) -> None:
+        self.redis = redis
+        self.window = window
+        self.lock_ttl = lock_ttl
+        self.prefix = prefix
+        self._claim = redis.register_script(CLAIM_SCRIPT)
+
+    def key(self, *parts: str) -> str:
+        """
+        Build a key.
+
+        :param parts: idempotency key and everything its scope depends on.
+        :return: redis key.
+        """
+        digest = hashlib.sha256("\n".join(parts).encode()).hexdigest()
+        return f"{self.prefix}{digest}"
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[CachedResponse]:
+        """
+        Claim a key for a request.
+
+        :param key: key built by `key`.
+        :param fingerprint: digest of the request.
+        :return: response of the earlier request with the key
+            or None if the key was claimed for this one.
+        :raises IdempotencyKeyInUseError: if the earlier request is running.
+        :raises IdempotencyKeyReusedError: if the earlier request was different.
+        """
+        result = await self._claim(keys=[key], args=[fingerprint, self.lock_ttl])
+        if not result:
+            return None
+        stored_fingerprint, status, headers, body, stored_at = result
+        if stored_fingerprint.decode() != fingerprint:
+            raise IdempotencyKeyReusedError(key)
+        if status is None:
+            raise IdempotencyKeyInUseError(key)
+        return CachedResponse(
+            status=int(status),
+            headers=load_headers(headers),
+            body=body,
+            stored_at=float(stored_at),
+        )
+
+    async def complete(
+        self,
+        key: str,
+        fingerprint: str,
+        response: CachedResponse,
+    ) -> None:
+        """
+        Keep the response of the request that claimed a key.
+
+        :param key: claimed key.
+        :param fingerprint: digest of the request.
+        :param response: response of the request.
+        """
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(
+                key,
+                mapping={
+                    "fingerprint": fingerprint,
+                    "status": response.status,
+                    "headers": dump_headers(response.headers),
+                    "body": response.body,
+                    "stored_at": time.time(),
+                },
+            )
+            pipe.expire(key, self.window)
+            await pipe.execute()
+
+    async def release(self, key: str) -> None:
+        """
+        Let a key be claimed again, after its request failed.
+
+        :param key: claimed key.
+        """
+        await self.redis.delete(key)
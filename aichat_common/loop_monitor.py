@@ -0,0 +1,94 @@
+import asyncio
+import contextlib
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from aichat_common.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """
+    Event loop health monitor of a worker.
+
+    A probe coroutine sleeps for `interval` and measures how late
+    it wakes up, the delay is exported as `event_loop_lag_ms`.
+
+    A watchdog thread notices when the loop doesn't run the probe
+    for longer than `slow_callback_ms`, which means a single callback
+    blocks the loop. It logs the stack of the blocking code and
+    counts it in `event_loop_slow_callbacks_total`. Unlike asyncio
+    debug mode this works with uvloop and costs nothing while the
+    loop is healthy.
+    """
+
+    def __init__(self, interval: float = 0.5, slow_callback_ms: float = 100) -> None:
+        self.interval = interval
+        self.slow_callback = slow_callback_ms / 1000
+        self.max_lag_ms = 0.0
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start the probe and the watchdog thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(
+            target=self._watch,
+            name="loop-watchdog",
+            daemon=True,
+        )
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        """Stop monitoring."""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _probe(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._last_beat = time.monotonic()
+            lag_ms = max(0.0, (self._last_beat - started - self.interval) * 1000)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            metrics.set_gauge("event_loop_lag_ms", lag_ms)
+            metrics.set_gauge("event_loop_lag_max_ms", self.max_lag_ms)
+            metrics.inc("event_loop_lag_ms_total", lag_ms)
+            metrics.inc("event_loop_probes_total")
+
+    def _watch(self) -> None:
+        reported_beat = None
+        # The probe itself is expected to be away for `interval`.
+        threshold = self.interval + self.slow_callback
+        while not self._stopped.wait(self.slow_callback / 2):
+            last_beat = self._last_beat
+            stalled = time.monotonic() - last_beat
+            if stalled < threshold or reported_beat == last_beat:
+                continue
+            # Report every stall once.
+            reported_beat = last_beat
+            metrics.inc("event_loop_slow_callbacks_total")
+            frame = sys._current_frames().get(self._loop_thread_id)  # noqa: SLF001
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            logger.warning(
+                f"Event loop is blocked for {stalled * 1000:.0f}ms, "
+                f"blocking code:\n{stack}",
+            )
@@ -0,0 +1,84 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+LabelsKey = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry.
+
+    Every worker process has its own registry, values
+    are exposed through the monitoring API.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelsKey, float]] = defaultdict(dict)
+        self._gauges: Dict[str, Dict[LabelsKey, float]] = defaultdict(dict)
+
+    @staticmethod
+    def _labels_key(labels: Dict[str, str]) -> LabelsKey:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        Increase a counter.
+
+        :param name: counter name.
+        :param value: increment.
+        :param labels: labels of the counter.
+        """
+        key = self._labels_key(labels)
+        with self._lock:
+            self._counters[name][key] = self._counters[name].get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        """
+        Set current value of a gauge.
+
+        :param name: gauge name.
+        :param value: new value.
+        :param labels: labels of the gauge.
+        """
+        with self._lock:
+            self._gauges[name][self._labels_key(labels)] = value
+
+    def get(self, name: str, **labels: str) -> float:
+        """
+        Get current value of a counter or a gauge.
+
+        :param name: metric name.
+        :param labels: labels of the metric.
+        :return: metric value, 0 if it was never set.
+        """
+        key = self._labels_key(labels)
+        with self._lock:
+            if key in self._gauges.get(name, {}):
+                return self._gauges[name][key]
+            return self._counters.get(name, {}).get(key, 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get all metrics.
+
+        :return: counters and gauges keyed by `name{label=value,...}`.
+        """
+
+        def render(metrics: Dict[str, Dict[LabelsKey, float]]) -> Dict[str, float]:
+            rendered = {}
+            for name, values in metrics.items():
+                for labels, value in values.items():
+                    label_str = ",".join(f"{key}={val}" for key, val in labels)
+                    rendered[f"{name}{{{label_str}}}" if label_str else name] = value
+            return rendered
+
+        with self._lock:
+            return {
+                "counters": render(self._counters),
+                "gauges": render(self._gauges),
+            }
+
+
+metrics = Metrics()
@@ -0,0 +1,314 @@
+import asyncio
+import functools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import RedisError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from aichat_common.metrics import metrics
+from aichat_common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+# Values of the `circuit_breaker_state` gauge.
+BREAKER_STATES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+# Set while an operation holds a bulkhead slot, nested operations reuse it.
+_in_bulkhead: ContextVar[bool] = ContextVar("in_bulkhead", default=False)
+
+
+class CircuitOpenError(RedisError):
+    """Redis was skipped because its circuit breaker is open."""
+
+
+class BulkheadFullError(Exception):
+    """No slot of a bulkhead was freed in time."""
+
+
+class DeadlineExceededError(Exception):
+    """An operation didn't finish in time."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of a dependency of this worker.
+
+    After `failure_threshold` failures in a row the breaker opens and
+    calls are rejected without touching the dependency. After
+    `reset_timeout` seconds a single call is let through as a probe,
+    its success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        metrics.set_gauge("circuit_breaker_state", BREAKER_STATES[CLOSED], breaker=name)
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may go to the dependency.
+
+        :return: whether the call is allowed.
+        """
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                metrics.inc("circuit_breaker_rejected_total", breaker=self.name)
+                return False
+            self._set_state(HALF_OPEN)
+        if self._probing:
+            metrics.inc("circuit_breaker_rejected_total", breaker=self.name)
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        """Account a call that reached the dependency."""
+        self.failures = 0
+        self._probing = False
+        if self.state != CLOSED:
+            logger.info(f"Circuit breaker {self.name} closed")
+            self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        """Account a call that failed to reach the dependency."""
+        self.failures += 1
+        self._probing = False
+        if self.state == OPEN:
+            return
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            logger.warning(
+                f"Circuit breaker {self.name} opened for {self.reset_timeout}s",
+            )
+            metrics.inc("circuit_breaker_trips_total", breaker=self.name)
+            self._opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def release(self) -> None:
+        """Account a call that ended without telling anything, e.g. cancelled."""
+        self._probing = False
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        metrics.set_gauge(
+            "circuit_breaker_state",
+            BREAKER_STATES[state],
+            breaker=self.name,
+        )
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """
+    Get the circuit breaker of a dependency, shared by the whole worker.
+
+    :param name: dependency name, e.g. "redis".
+    :return: circuit breaker.
+    """
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(
+            name,
+            failure_threshold=settings.breaker_failure_threshold,
+            reset_timeout=settings.breaker_reset_timeout,
+        )
+    return _breakers[name]
+
+
+async def _call_redis(
+    breaker: CircuitBreaker,
+    timeout: Optional[float],
+    operation: Callable[[], Awaitable[T]],
+) -> T:
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit breaker {breaker.name} is open")
+    try:
+        result = await asyncio.wait_for(operation(), timeout)
+    except asyncio.TimeoutError as e:
+        breaker.record_failure()
+        raise RedisTimeoutError(f"Redis didn't answer in {timeout}s") from e
+    except (RedisConnectionError, RedisTimeoutError, OSError):
+        breaker.record_failure()
+        raise
+    except RedisError:
+        # Redis answered, e.g. with an error of a script.
+        breaker.record_success()
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    breaker.record_success()
+    return result
+
+
+class ResilientPipeline(Pipeline):
+    """Pipeline executed under the deadline and breaker of its client."""
+
+    breaker: CircuitBreaker
+    timeout: Optional[float]
+
+    async def execute(self, raise_on_error: bool = True) -> Any:
+        """Execute queued commands, unless redis is known to be down."""
+        if not self.command_stack:
+            return []
+        return await _call_redis(
+            self.breaker,
+            self.timeout,
+            lambda: Pipeline.execute(self, raise_on_error),
+        )
+
+
+class ResilientRedis(Redis):
+    """
+    Redis client with a deadline per command and a circuit breaker.
+
+    While the breaker is open commands fail with CircuitOpenError right
+    away, so a redis outage doesn't add a connection timeout to every
+    request.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        breaker: Optional[CircuitBreaker] = None,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker or get_breaker("redis")
+        self.timeout = timeout or settings.redis_operation_timeout or None
+
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        """Execute a command, unless redis is known to be down."""
+        return await _call_redis(
+            self.breaker,
+            self.timeout,
+            lambda: Redis.execute_command(self, *args, **options),
+        )
+
+    def pipeline(
+        self,
+        transaction: bool = True,
+        shard_hint: Optional[str] = None,
+    ) -> ResilientPipeline:
+        """Get a pipeline guarded like the client."""
+        pipe = ResilientPipeline(
+            self.connection_pool,
+            self.response_callbacks,
+            transaction,
+            shard_hint,
+        )
+        pipe.breaker = self.breaker
+        pipe.timeout = self.timeout
+        return pipe
+
+
+class Bulkhead:
+    """
+    Limit of concurrent operations of a kind in this worker.
+
+    An operation waits for a free slot at most until its deadline,
+    so a slow dependency can't take all connections and tasks of
+    the worker. Operations started by an operation holding a slot
+    run in that slot.
+    """
+
+    def __init__(self, name: str, limit: int = 0) -> None:
+        self.name = name
+        self.limit = limit
+        self.in_use = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def run(
+        self,
+        operation: Callable[[], Awaitable[T]],
+        timeout: Optional[float],
+    ) -> T:
+        """
+        Run an operation in a slot of the bulkhead.
+
+        :param operation: function starting the operation.
+        :param timeout: seconds for waiting for a slot and the operation.
+        :return: result of the operation.
+        :raises BulkheadFullError: if no slot was freed in time.
+        :raises DeadlineExceededError: if the operation didn't finish in time.
+        """
+        if self.limit <= 0 or _in_bulkhead.get():
+            return await self._with_deadline(operation, timeout)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError as e:
+            metrics.inc("bulkhead_rejected_total", bulkhead=self.name)
+            raise BulkheadFullError(f"Bulkhead {self.name} is full") from e
+        self.in_use += 1
+        metrics.set_gauge("bulkhead_in_use", self.in_use, bulkhead=self.name)
+        token = _in_bulkhead.set(True)
+        try:
+            if timeout is not None:
+                timeout = max(timeout - (time.monotonic() - started), 0)
+            return await self._with_deadline(operation, timeout)
+        finally:
+            _in_bulkhead.reset(token)
+            self._semaphore.release()
+            self.in_use -= 1
+            metrics.set_gauge("bulkhead_in_use", self.in_use, bulkhead=self.name)
+
+    async def _with_deadline(
+        self,
+        operation: Callable[[], Awaitable[T]],
+        timeout: Optional[float],
+    ) -> T:
+        try:
+            return await asyncio.wait_for(operation(), timeout)
+        except asyncio.TimeoutError as e:
+            metrics.inc("deadline_exceeded_total", bulkhead=self.name)
+            raise DeadlineExceededError(
+                f"Operation of {self.name} didn't finish in {timeout}s",
+            ) from e
+
+
+mongo_bulkhead = Bulkhead("mongo", settings.db_max_concurrency)
+
+
+def mongo_operation(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """
+    Run a DAO method in the mongo bulkhead with `db_operation_timeout`.
+
+    :param func: async DAO method.
+    :return: wrapped method.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        return await mongo_bulkhead.run(
+            lambda: func(*args, **kwargs),
+            settings.db_operation_timeout or None,
+        )
+
+    return wrapper
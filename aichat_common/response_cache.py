@@ -0,0 +1,185 @@
+import hashlib
+import json
+import time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from redis.asyncio import Redis
+
+RESPONSE_CACHE_PREFIX = "respcache:"
+
+# Every script touches only the keys of a single tag, which share a hash tag,
+# so the cache runs on redis cluster. Entries are written and deleted with
+# single-key commands.
+
+# Remember a stored response in the set of its tag, which lives as long
+# as its longest lived entry.
+# KEYS[1] - tag set, ARGV[1] - entry key, ARGV[2] - ttl.
+TAG_SCRIPT = """
+redis.call('SADD', KEYS[1], ARGV[1])
+if redis.call('TTL', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+"""
+# Start a new version of a tag and forget its responses.
+# KEYS[1] - tag version key, KEYS[2] - tag set.
+# Returns keys of the responses stored with the tag, the caller deletes them.
+INVALIDATE_SCRIPT = """
+redis.call('INCR', KEYS[1])
+local entries = redis.call('SMEMBERS', KEYS[2])
+redis.call('DEL', KEYS[2])
+return entries
+"""
+
+
+def _join_versions(versions: Iterable[bytes]) -> bytes:
+    return b",".join(versions)
+
+
+class CachedResponse(NamedTuple):
+    """Response stored in the cache."""
+
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    stored_at: float
+
+
+def dump_headers(headers: List[Tuple[bytes, bytes]]) -> str:
+    """
+    Serialize raw response headers for redis.
+
+    :param headers: raw ASGI headers.
+    :return: json.
+    """
+    return json.dumps(
+        [(name.decode("latin-1"), value.decode("latin-1")) for name, value in headers],
+    )
+
+
+def load_headers(data: bytes) -> List[Tuple[bytes, bytes]]:
+    """
+    Deserialize raw response headers.
+
+    :param data: value returned by `dump_headers`.
+    :return: raw ASGI headers.
+    """
+    return [
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in json.loads(data)
+    ]
+
+
+class ResponseCache:
+    """
+    Serialized HTTP responses in redis, invalidated by tags.
+
+    Every entry is stored with tags (e.g. "bots:list:default"), a write
+    drops all entries of a tag. Each tag has a version and entries keep
+    the versions of their tags seen before the response was computed,
+    so a response computed while its tag was invalidated is never served.
+    """
+
+    def __init__(self, redis: Redis, prefix: str = RESPONSE_CACHE_PREFIX) -> None:
+        self.redis = redis
+        self.prefix = prefix
+        self._tag = redis.register_script(TAG_SCRIPT)
+        self._invalidate = redis.register_script(INVALIDATE_SCRIPT)
+
+    def key(self, *parts: str) -> str:
+        """
+        Build an entry key.
+
+        :param parts: everything the response depends on.
+        :return: redis key.
+        """
+        digest = hashlib.sha256("\n".join(parts).encode()).hexdigest()
+        return f"{self.prefix}entry:{digest}"
+
+    def _version_key(self, tag: str) -> str:
+        return f"{self.prefix}tagver:{{{tag}}}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{{{tag}}}"
+
+    async def lookup(
+        self,
+        key: str,
+        tags: List[str],
+    ) -> Tuple[Optional[CachedResponse], List[bytes]]:
+        """
+        Get a cached response.
+
+        :param key: entry key.
+        :param tags: tags of the entry.
+        :return: the response or None and versions of the tags
+            to pass to `store`.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(key, ["status", "headers", "body", "stored_at", "versions"])
+            for tag in tags:
+                pipe.get(self._version_key(tag))
+            entry, *found_versions = await pipe.execute()
+        versions = [version or b"0" for version in found_versions]
+        status, headers, body, stored_at, entry_versions = entry
+        if status is None or entry_versions != _join_versions(versions):
+            return None, versions
+        cached = CachedResponse(
+            status=int(status),
+            headers=load_headers(headers),
+            body=body,
+            stored_at=float(stored_at),
+        )
+        return cached, versions
+
+    async def store(
+        self,
+        key: str,
+        tags: List[str],
+        versions: List[bytes],
+        response: CachedResponse,
+        ttl: int,
+    ) -> None:
+        """
+        Store a response.
+
+        :param key: entry key.
+        :param tags: tags of the entry.
+        :param versions: tag versions returned by `lookup`.
+        :param response: response to store.
+        :param ttl: seconds to keep the response.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(
+                key,
+                mapping={
+                    "status": response.status,
+                    "headers": dump_headers(response.headers),
+                    "body": response.body,
+                    "stored_at": time.time(),
+                    "versions": _join_versions(versions),
+                },
+            )
+            pipe.expire(key, ttl)
+            await pipe.execute()
+        for tag in tags:
+            await self._tag(keys=[self._tag_key(tag)], args=[key, ttl])
+
+    async def invalidate(self, tags: List[str]) -> int:
+        """
+        Drop all responses stored with any of the tags.
+
+        :param tags: tags to invalidate.
+        :return: number of dropped responses.
+        """
+        dropped = 0
+        for tag in tags:
+            entries = await self._invalidate(
+                keys=[self._version_key(tag), self._tag_key(tag)],
+            )
+            if not entries:
+                continue
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for entry in entries:
+                    pipe.delete(entry)
+                dropped += sum(await pipe.execute())
+        return dropped
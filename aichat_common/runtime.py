@@ -0,0 +1,70 @@
+import math
+import os
+from pathlib import Path
+from typing import Optional
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_quota(cgroup_root: Path = CGROUP_ROOT) -> Optional[float]:
+    """
+    Get CPU limit of the container from cgroups.
+
+    Both cgroup v2 (`cpu.max`) and v1 (`cpu.cfs_quota_us`) are supported.
+
+    :param cgroup_root: mount point of the cgroup filesystem.
+    :return: number of CPUs the container may use or None if it's unlimited.
+    """
+    cpu_max = _read(cgroup_root / "cpu.max")
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(" ")
+        if quota == "max" or not period:
+            return None
+        return int(quota) / int(period)
+    quota_us = _read(cgroup_root / "cpu" / "cpu.cfs_quota_us")
+    period_us = _read(cgroup_root / "cpu" / "cpu.cfs_period_us")
+    if quota_us is None or period_us is None or int(quota_us) <= 0:
+        return None
+    return int(quota_us) / int(period_us)
+
+
+def available_cpus(cgroup_root: Path = CGROUP_ROOT) -> float:
+    """
+    Get number of CPUs this process can actually use.
+
+    Takes into account CPU affinity and the cgroup quota,
+    `multiprocessing.cpu_count()` reports all CPUs of the host.
+
+    :param cgroup_root: mount point of the cgroup filesystem.
+    :return: number of CPUs, may be fractional.
+    """
+    try:
+        cpus: float = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota(cgroup_root)
+    if quota is not None:
+        cpus = min(cpus, quota)
+    return cpus
+
+
+def recommended_workers(cpus: float, workers_per_cpu: float = 1) -> int:
+    """
+    Get number of async workers for the given CPUs.
+
+    Async workers don't block on I/O, so unlike sync workers they
+    don't need `2 * cpu + 1` processes to keep CPUs busy. More workers
+    than CPUs only add context switches and connection pools.
+
+    :param cpus: available CPUs.
+    :param workers_per_cpu: workers to run per CPU.
+    :return: number of workers, at least 1.
+    """
+    return max(1, math.ceil(cpus * workers_per_cpu))
@@ -1,12 +1,80 @@
-from fastapi import Request
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, Request
+
+from aichat_common.db.consistency import SessionToken
+from aichat_common.db.models.bot_model import DEFAULT_TENANT
+from aichat_common.services.bot.events import BotEventHub
 from aichat_common.services.bot.service import BotService
 
+TENANT_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
+
+async def get_tenant(
+    x_tenant_id: str = Header(
+        DEFAULT_TENANT,
+        alias="X-Tenant-ID",
+        pattern=TENANT_PATTERN,
+        description="Tenant the bots belong to",
+    ),
+) -> str:
+    """
+    FastAPI dependency to get the tenant of the request.
+
+    :param x_tenant_id: value of X-Tenant-ID header.
+    :return: tenant name.
+    """
+    return x_tenant_id
+
+
+async def get_session_token(
+    x_session_token: Optional[str] = Header(
+        None,
+        alias="X-Session-Token",
+        description="Token returned by a write the read must see",
+    ),
+) -> Optional[SessionToken]:
+    """
+    FastAPI dependency to get the session token of a read-your-writes request.
 
-async def get_bot_service(request: Request) -> BotService:
+    :param x_session_token: value of X-Session-Token header.
+    :raises HTTPException: if the token is malformed.
+    :return: token or None if the request doesn't need read-your-writes.
+    """
+    if x_session_token is None:
+        return None
+    try:
+        return SessionToken.decode(x_session_token)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid X-Session-Token header",
+        ) from e
+
+
+async def get_bot_service(
+    request: Request,
+    tenant: str = Depends(get_tenant),
+) -> BotService:
     """
     FastAPI dependency to get the bot service instance.
 
     :param request: FastAPI request object.
-    :return: BotService singleton instance.
+    :param tenant: tenant of the request.
+    :return: BotService working with bots of the tenant.
+    """
+    return request.app.state.bot_service.with_tenant(tenant)
+
+
+async def get_bot_event_hub(request: Request) -> BotEventHub:
+    """
+    FastAPI dependency to get the bot event hub of this worker.
+
+    :param request: FastAPI request object.
+    :raises HTTPException: if bot events are unavailable (no redis).
+    :return: BotEventHub instance.
     """
-    return request.app.state.bot_service
+    bot_event_hub = getattr(request.app.state, "bot_event_hub", None)
+    if bot_event_hub is None:
+        raise HTTPException(status_code=503, detail="Bot events are unavailable")
+    return bot_event_hub
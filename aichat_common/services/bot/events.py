@@ -0,0 +1,191 @@
+import asyncio
+import contextlib
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from aichat_common.db.models.bot_model import DEFAULT_TENANT
+from aichat_common.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BOT_EVENTS_CHANNEL_PREFIX = "bot:events:"
+RETRY_DELAY = 1
+
+
+class BotSubscription:
+    """
+    Bot events delivered to a single client.
+
+    Events are buffered in a bounded queue. When the client can't keep
+    up and the queue overflows, buffered events are dropped and replaced
+    with a single `resync` event, telling the client to fetch
+    the bots again instead of applying diffs.
+    """
+
+    def __init__(
+        self,
+        bot_ids: List[str],
+        queue_size: int,
+        tenant: str = DEFAULT_TENANT,
+    ) -> None:
+        self.bot_ids = bot_ids
+        self.tenant = tenant
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(queue_size)
+
+    def put(self, event: Dict[str, Any]) -> None:
+        """
+        Buffer an event without blocking the publisher.
+
+        :param event: bot event.
+        """
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            metrics.inc("bot_events_dropped_total", self.queue.qsize())
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(self.resync_event())
+
+    def resync_event(self) -> Dict[str, Any]:
+        """Event telling the client to fetch its bots again."""
+        return {"type": "resync", "tenant": self.tenant, "bot_ids": self.bot_ids}
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Wait for the next event.
+
+        :param timeout: seconds to wait.
+        :return: event or None if there was none in time.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class BotEventHub:
+    """
+    Fan-out of bot change events to subscribers of this worker.
+
+    Every worker listens to all bot event channels with a single
+    redis pub/sub connection and dispatches events to local
+    subscriptions, so any worker can serve any subscriber.
+    """
+
+    def __init__(self, redis_pool: Any, queue_size: int = 100) -> None:
+        self.redis = Redis(connection_pool=redis_pool)
+        self.queue_size = queue_size
+        self._subscriptions: Dict[Tuple[str, str], Set[BotSubscription]] = (
+            defaultdict(set)
+        )
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """
+        Call a function with every event received by this worker.
+
+        :param listener: function taking a bot event, must not block.
+        """
+        self._listeners.append(listener)
+
+    def start(self) -> None:
+        """Start listening to bot events in background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop listening to bot events."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    def subscribe(
+        self,
+        bot_ids: List[str],
+        tenant: str = DEFAULT_TENANT,
+    ) -> BotSubscription:
+        """
+        Subscribe to events of bots.
+
+        :param bot_ids: ids of the bots.
+        :param tenant: tenant of the bots.
+        :return: subscription, must be passed to `unsubscribe` when done.
+        """
+        subscription = BotSubscription(bot_ids, self.queue_size, tenant)
+        for bot_id in bot_ids:
+            self._subscriptions[(tenant, bot_id)].add(subscription)
+        metrics.inc("bot_event_subscriptions_total")
+        return subscription
+
+    def unsubscribe(self, subscription: BotSubscription) -> None:
+        """
+        Stop delivering events to a subscription.
+
+        :param subscription: subscription returned by `subscribe`.
+        """
+        for bot_id in subscription.bot_ids:
+            key = (subscription.tenant, bot_id)
+            subscribers = self._subscriptions.get(key)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscriptions[key]
+
+    def dispatch(self, event: Dict[str, Any]) -> None:
+        """
+        Deliver an event to listeners and local subscribers of its bot.
+
+        :param event: bot event.
+        """
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.warning(f"Bot event listener error: {e}")
+        key = (event.get("tenant", DEFAULT_TENANT), event["bot_id"])
+        for subscription in list(self._subscriptions.get(key, ())):
+            subscription.put(event)
+
+    async def _run(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.psubscribe(f"{BOT_EVENTS_CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self.dispatch(json.loads(message["data"]))
+            except RedisError as e:
+                logger.warning(f"Bot events redis error: {e}")
+            finally:
+                await pubsub.aclose()
+            # Events published meanwhile are lost, let clients catch up.
+            subscriptions = {
+                subscription
+                for subscribers in self._subscriptions.values()
+                for subscription in subscribers
+            }
+            for subscription in subscriptions:
+                subscription.put(subscription.resync_event())
+            await asyncio.sleep(RETRY_DELAY)
+
+
+async def publish_bot_event(redis: Redis, event: Dict[str, Any]) -> None:
+    """
+    Publish a bot event to all workers.
+
+    :param redis: redis client.
+    :param event: event with at least `type`, `tenant` and `bot_id`.
+    """
+    await redis.publish(
+        f"{BOT_EVENTS_CHANNEL_PREFIX}{event['tenant']}:{event['bot_id']}",
+        json.dumps(event, ensure_ascii=False),
+    )
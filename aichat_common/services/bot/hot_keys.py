@@ -0,0 +1,173 @@
+import logging
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from aichat_common.metrics import metrics
+from aichat_common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HotKeyTracker:
+    """
+    Detection of hot bot cache keys from reads of this worker.
+
+    A share of reads is sampled and once per window the samples are
+    turned into estimated reads per second. Keys above `threshold`
+    are hot. With `replicas` they are read from one of that many suffixed
+    copies, which redis cluster places on other shards than the key
+    itself, a single redis gains nothing from them. Keys above
+    `local_threshold` are also kept in process memory for `local_ttl`
+    seconds.
+    """
+
+    def __init__(
+        self,
+        replicas: int = 4,
+        replica_ttl: int = 60,
+        sample_rate: float = 0.01,
+        window: float = 10,
+        threshold: float = 200,
+        local_threshold: float = 2000,
+        local_ttl: float = 1,
+    ) -> None:
+        self.replicas = replicas
+        self.replica_ttl = replica_ttl
+        self.sample_rate = sample_rate
+        self.window = window
+        self.threshold = threshold
+        self.local_threshold = local_threshold
+        self.local_ttl = local_ttl
+        self._samples: Counter = Counter()
+        self._window_start = time.monotonic()
+        # Estimated reads per second of hot keys in the last window.
+        self._hot: Dict[str, float] = {}
+        # (key, field) -> (expires at, value, revision)
+        self._local: Dict[Tuple[str, str], Tuple[float, bytes, bytes]] = {}
+
+    def sample(self, key: str) -> None:
+        """
+        Count a read of a key, if it is sampled.
+
+        :param key: cache key.
+        """
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:  # noqa: S311
+            return
+        self._samples[key] += 1
+        now = time.monotonic()
+        if now - self._window_start >= self.window:
+            self._rotate(now)
+
+    def _rotate(self, now: float) -> None:
+        elapsed = max(now - self._window_start, 1e-6)
+        hot = {}
+        for key, count in self._samples.items():
+            rate = count / self.sample_rate / elapsed
+            if rate >= self.threshold:
+                hot[key] = rate
+        for key in hot.keys() - self._hot.keys():
+            logger.info(f"Hot bot cache key {key}: {hot[key]:.0f} reads/s")
+        self._hot = hot
+        self._samples.clear()
+        self._window_start = now
+        # Keys that cooled down leave process memory right away.
+        self._local = {
+            entry: value
+            for entry, value in self._local.items()
+            if self._is_local(entry[0])
+        }
+        metrics.set_gauge("bot_hot_keys", len(hot))
+
+    def is_hot(self, key: str) -> bool:
+        """
+        Check whether a key is read from replicas.
+
+        :param key: cache key.
+        :return: whether the key is hot.
+        """
+        return self.replicas > 0 and key in self._hot
+
+    def _is_local(self, key: str) -> bool:
+        return self._hot.get(key, 0) >= self.local_threshold
+
+    def replica_key(self, key: str) -> Optional[str]:
+        """
+        Pick a random copy of a hot key.
+
+        :param key: cache key.
+        :return: key of the copy or None if the key isn't hot.
+        """
+        if not self.is_hot(key):
+            return None
+        return f"{key}:r{random.randrange(self.replicas)}"  # noqa: S311
+
+    def replica_keys(self, key: str) -> List[str]:
+        """
+        Get keys of all possible copies of a key.
+
+        Writers drop them all, as other workers may see the key as hot.
+
+        :param key: cache key.
+        :return: keys of the copies.
+        """
+        return [f"{key}:r{replica}" for replica in range(self.replicas)]
+
+    def get_local(self, key: str, field: str) -> Optional[Tuple[bytes, bytes]]:
+        """
+        Get a field of a key from process memory.
+
+        :param key: cache key.
+        :param field: hash field.
+        :return: field value and revision or None if they are not kept.
+        """
+        entry = self._local.get((key, field))
+        if entry is None:
+            return None
+        expires_at, value, revision = entry
+        if expires_at <= time.monotonic():
+            del self._local[(key, field)]
+            return None
+        return value, revision
+
+    def put_local(self, key: str, field: str, value: bytes, revision: bytes) -> None:
+        """
+        Keep a field of a key in process memory, if the key is hot enough.
+
+        :param key: cache key.
+        :param field: hash field.
+        :param value: field value.
+        :param revision: revision of the bot.
+        """
+        if self._is_local(key):
+            expires_at = time.monotonic() + self.local_ttl
+            self._local[(key, field)] = (expires_at, value, revision)
+
+    def forget(self, key: str) -> None:
+        """
+        Drop all fields of a key from process memory.
+
+        :param key: cache key.
+        """
+        for entry in [entry for entry in self._local if entry[0] == key]:
+            del self._local[entry]
+
+
+def get_hot_key_tracker() -> Optional[HotKeyTracker]:
+    """
+    Create a hot key tracker configured by settings.
+
+    :return: tracker or None if hot keys are not detected.
+    """
+    if settings.bot_hot_key_sample_rate <= 0:
+        return None
+    return HotKeyTracker(
+        replicas=settings.bot_hot_key_replicas,
+        replica_ttl=settings.bot_hot_key_replica_ttl,
+        sample_rate=settings.bot_hot_key_sample_rate,
+        window=settings.bot_hot_key_window,
+        threshold=settings.bot_hot_key_threshold,
+        local_threshold=settings.bot_hot_key_local_threshold,
+        local_ttl=settings.bot_hot_key_local_ttl,
+    )
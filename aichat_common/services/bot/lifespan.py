@@ -1,18 +1,59 @@
+from typing import Callable, Dict
+
 from fastapi import FastAPI
 
 from aichat_common.db.dao.bot_dao import BotDAO
+from aichat_common.db.dao.bot_repository import BotRepository
+from aichat_common.db.dao.memory_bot_dao import MemoryBotDAO
+from aichat_common.db.dao.snapshot_bot_dao import SnapshotBotDAO
+from aichat_common.db.snapshot import SnapshotCatalog
+from aichat_common.services.bot.events import BotEventHub
+from aichat_common.services.bot.hot_keys import get_hot_key_tracker
 from aichat_common.services.bot.service import BotService
+from aichat_common.services.bot.watcher import BotChangeWatcher
+from aichat_common.settings import BotBackend, settings
+
+
+def _snapshot_bot_dao() -> BotRepository:
+    catalog = SnapshotCatalog(
+        settings.bot_snapshot_path,
+        check_interval=settings.bot_snapshot_check_interval,
+    )
+    # Fail the startup, not the first request, if there is no snapshot.
+    catalog.current()
+    return SnapshotBotDAO(catalog)
+
+
+# Repository of bots of the default tenant for every backend.
+BOT_BACKENDS: Dict[BotBackend, Callable[[], BotRepository]] = {
+    BotBackend.MONGO: BotDAO,
+    BotBackend.MEMORY: MemoryBotDAO,
+    BotBackend.SNAPSHOT: _snapshot_bot_dao,
+}
 
 
 def init_bot_service(app: FastAPI) -> None:
     """
     Initialize and register the BotService instance to app.state.
     Should be called after DB and Redis are initialized.
+
+    Bots are stored in the backend selected by `bot_backend`.
     """
-    bot_dao = BotDAO()
+    bot_dao = BOT_BACKENDS[settings.bot_backend]()
     # Redis pool is optional, pass if needed
     redis_pool = getattr(app.state, "redis_pool", None)
-    app.state.bot_service = BotService(bot_dao=bot_dao, redis_pool=redis_pool)
+    if settings.bot_backend == BotBackend.SNAPSHOT:
+        # The snapshot is already in memory, caching it in redis is a hop more.
+        redis_pool = None
+    app.state.bot_service = BotService(
+        bot_dao=bot_dao,
+        redis_pool=redis_pool,
+        write_through=settings.bot_cache_write_through,
+        cache_quota=settings.bot_cache_tenant_quota,
+        tenant_cache_quotas=settings.bot_cache_tenant_quotas,
+        hot_keys=get_hot_key_tracker(),
+        lru_touch_rate=settings.bot_cache_lru_touch_rate,
+    )
 
 
 async def shutdown_bot_service(app: FastAPI) -> None:
@@ -22,3 +63,55 @@ async def shutdown_bot_service(app: FastAPI) -> None:
     bot_service = getattr(app.state, "bot_service", None)
     if bot_service and hasattr(bot_service, "close"):
         await bot_service.close()
+
+
+def init_bot_watcher(app: FastAPI) -> None:
+    """
+    Start the bot change stream watcher, if enabled in settings.
+
+    Should be called after BotService is initialized.
+    """
+    redis_pool = getattr(app.state, "redis_pool", None)
+    if not settings.bot_change_stream_enabled or redis_pool is None:
+        app.state.bot_watcher = None
+        return
+    app.state.bot_watcher = BotChangeWatcher(
+        bot_service=app.state.bot_service,
+        redis_pool=redis_pool,
+    )
+    app.state.bot_watcher.start()
+
+
+async def shutdown_bot_watcher(app: FastAPI) -> None:
+    """Stop the bot change stream watcher, if it is running."""
+    bot_watcher = getattr(app.state, "bot_watcher", None)
+    if bot_watcher is not None:
+        await bot_watcher.stop()
+
+
+def init_bot_events(app: FastAPI) -> None:
+    """
+    Start fan-out of bot events to subscribers of this worker.
+
+    Should be called after Redis and BotService are initialized.
+    """
+    redis_pool = getattr(app.state, "redis_pool", None)
+    if redis_pool is None:
+        app.state.bot_event_hub = None
+        return
+    app.state.bot_event_hub = BotEventHub(
+        redis_pool=redis_pool,
+        queue_size=settings.bot_events_queue_size,
+    )
+    bot_service = getattr(app.state, "bot_service", None)
+    if bot_service is not None:
+        # Bots changed by other workers leave process memory of this one.
+        app.state.bot_event_hub.add_listener(bot_service.on_bot_event)
+    app.state.bot_event_hub.start()
+
+
+async def shutdown_bot_events(app: FastAPI) -> None:
+    """Stop fan-out of bot events."""
+    bot_event_hub = getattr(app.state, "bot_event_hub", None)
+    if bot_event_hub is not None:
+        await bot_event_hub.stop()
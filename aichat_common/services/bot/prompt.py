@@ -0,0 +1,143 @@
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+from aichat_common.db.models.bot_model import Bot
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None  # type: ignore
+
+# Kana, CJK ideographs and hangul, mostly a token per character.
+CJK_RE = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]",
+)
+WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class PromptTemplate:
+    """
+    Template of a system prompt built from a bot persona.
+
+    Sections with empty values are left out. Bump `version`
+    on any change, rendered prompts are cached by it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        version: int,
+        header: str,
+        sections: List[Tuple[str, str]],
+    ) -> None:
+        """
+        Create a prompt template.
+
+        :param name: template name used in the API.
+        :param version: template version.
+        :param header: first line, formatted with bot fields.
+        :param sections: pairs of a section title and a bot field
+            (or "bot_cloth" for the cloth in use).
+        """
+        self.name = name
+        self.version = version
+        self.header = header
+        self.sections = sections
+
+    @property
+    def cache_variant(self) -> str:
+        """Name of the cached rendering of this template version."""
+        return f"prompt:{self.name}:v{self.version}"
+
+    def render(self, bot: Bot) -> str:
+        """
+        Render the prompt of a bot.
+
+        :param bot: bot to render.
+        :return: prompt text.
+        """
+        values = bot.model_dump(exclude={"id", "bot_clothes"})
+        values["bot_cloth"] = next(
+            (
+                cloth.cloth_description
+                for cloth in bot.bot_clothes
+                if cloth.cloth_in_use
+            ),
+            "",
+        )
+        lines = [self.header.format_map(values)]
+        for title, field in self.sections:
+            value = str(values.get(field) or "").strip()
+            if value:
+                # Sections use the full-width colon of the Chinese prompts.
+                lines.append(f"{title}：{value}")  # noqa: RUF001
+        return "\n".join(lines)
+
+
+PROMPT_TEMPLATES: Dict[str, PromptTemplate] = {
+    template.name: template
+    for template in (
+        PromptTemplate(
+            name="default",
+            version=1,
+            header="你是{bot_name}。请始终以该角色的身份进行对话。",
+            sections=[
+                ("人物属性", "bot_prop"),
+                ("人物外貌", "bot_appearance"),
+                ("当前服装", "bot_cloth"),
+                ("人物性格", "bot_personality"),
+                ("人物背景", "bot_character_background"),
+                ("工作信息", "bot_work_info"),
+                ("角色关系", "bot_relationships"),
+                ("人物喜好", "bot_hobbies"),
+                ("食物偏好", "bot_food_likes"),
+                ("其他偏好", "bot_other_likes"),
+                ("特殊技能", "bot_special_skills"),
+                ("喜欢人的类型", "bot_ideal_match"),
+                ("聊天话题喜好", "bot_chat_topics"),
+                ("聊天规则", "bot_chat_rules"),
+            ],
+        ),
+        PromptTemplate(
+            name="compact",
+            version=1,
+            header="你是{bot_name}。请始终以该角色的身份进行对话。",
+            sections=[
+                ("人物属性", "bot_prop"),
+                ("当前服装", "bot_cloth"),
+                ("人物性格", "bot_personality"),
+                ("聊天规则", "bot_chat_rules"),
+            ],
+        ),
+    )
+}
+
+
+def get_prompt_template(name: str) -> Optional[PromptTemplate]:
+    """
+    Get a prompt template by name.
+
+    :param name: template name.
+    :return: template or None if there is no such template.
+    """
+    return PROMPT_TEMPLATES.get(name)
+
+
+def count_tokens(text: str) -> Tuple[int, str]:
+    """
+    Count tokens of a prompt.
+
+    Uses tiktoken if it's installed, otherwise estimates:
+    a token per CJK character and per 4 characters of other words.
+
+    :param text: prompt text.
+    :return: number of tokens and the method used to count them.
+    """
+    if tiktoken is not None:
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return len(encoding.encode(text)), "cl100k_base"
+    tokens = len(CJK_RE.findall(text))
+    for word in WORD_RE.findall(CJK_RE.sub(" ", text)):
+        tokens += math.ceil(len(word) / 4)
+    return tokens, "estimate"
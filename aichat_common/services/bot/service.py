@@ -1,21 +1,121 @@
-import json
+import copy
 import logging
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from typing import List, Optional
-from redis.asyncio import Redis
-
-from aichat_common.db.dao.bot_dao import BotDAO
-from aichat_common.db.models.bot_model import BotModel
-
+from aichat_common.db.consistency import SessionToken, causal_session
+from aichat_common.db.dao.bot_dao import BotAlreadyExistsError, RevisionConflictError
+from aichat_common.db.dao.bot_repository import BotRepository
+from aichat_common.db.models.bot_model import (
+    Bot,
+    BotActiveCloth,
+    BotCloth,
+    BotSummary,
+)
+from aichat_common.db.models.bot_revision_model import BotRevision
+from aichat_common.metrics import metrics
+from aichat_common.resilience import ResilientRedis
+from aichat_common.response_cache import ResponseCache
+from aichat_common.services.bot.events import publish_bot_event
+from aichat_common.services.bot.hot_keys import HotKeyTracker
 
 logger = logging.getLogger(__name__)
 BOT_CACHE_TTL = 3600  # 1 hour
-BOT_CACHE_NONE_TTL = 300  # 5 min for negative cache
+BOT_CACHE_NONE_TTL = 300  # 5 min for negative cache (tombstones)
+# Tag of cached responses listing bots of a tenant.
+BOT_LIST_TAG = "bots:list:{tenant}"
+# Fields brought back by a rollback, the rest is derived or bookkeeping.
+ROLLBACK_FIELDS = [
+    field
+    for field in Bot.model_fields
+    if field.startswith("bot_") and field != "bot_id"
+]
+
+# Every script touches only the keys it declares, a single one, so it
+# runs on redis cluster whatever shards the keys of a bot land on.
+
+# Store a bot in its cache hash unless a newer revision is already cached.
+# Other fields (rendered bodies) of an older revision, or of other data with
+# the same revision (edits made outside of the service), are dropped.
+# KEYS[1] - cache key, ARGV[1] - revision, ARGV[2] - bot json, ARGV[3] - ttl.
+# Returns 1 if stored.
+CACHE_SET_IF_NEWER_SCRIPT = """
+local cached = redis.call('HMGET', KEYS[1], 'revision', 'data')
+if cached[1] and tonumber(cached[1]) > tonumber(ARGV[1]) then
+    return 0
+end
+if cached[1] and (tonumber(cached[1]) < tonumber(ARGV[1]) or cached[2] ~= ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+end
+redis.call('HSET', KEYS[1], 'revision', ARGV[1], 'data', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+# Track a cached bot of a tenant with a quota in a sorted set by last use.
+# When the tenant has more than its quota, the least recently used ones
+# are removed from the set and returned, the caller deletes their keys.
+# The set is never expired earlier than its entries (tombstones live shorter).
+# KEYS[1] - tenant's LRU set, ARGV[1] - cache key, ARGV[2] - ttl,
+# ARGV[3] - quota. Returns the evicted cache keys.
+CACHE_TRACK_SCRIPT = """
+local time = redis.call('TIME')
+redis.call('ZADD', KEYS[1], time[1] * 1000000 + time[2], ARGV[1])
+if redis.call('TTL', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+local evicted = {}
+local excess = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[3])
+if excess > 0 then
+    local oldest = redis.call('ZPOPMIN', KEYS[1], excess)
+    for i = 1, #oldest, 2 do
+        table.insert(evicted, oldest[i])
+    end
+end
+return evicted
+"""
+# Attach a rendered body to the cached bot if it still has the same revision.
+# KEYS[1] - cache key, ARGV[1] - revision, ARGV[2] - field, ARGV[3] - body.
+CACHE_SET_BODY_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'revision') == ARGV[1] then
+    redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+    return 1
+end
+return 0
+"""
+# Copy a field of a hot bot to one of its replicas unless the replica
+# has a newer revision. Replicas expire on their own, so a copy missed
+# by an invalidation is served for at most the ttl.
+# KEYS[1] - replica key, ARGV[1] - revision, ARGV[2] - field,
+# ARGV[3] - value, ARGV[4] - ttl.
+CACHE_SET_REPLICA_SCRIPT = """
+local cached = redis.call('HGET', KEYS[1], 'revision')
+if cached and tonumber(cached) > tonumber(ARGV[1]) then
+    return 0
+end
+if cached and tonumber(cached) < tonumber(ARGV[1]) then
+    redis.call('DEL', KEYS[1])
+end
+redis.call('HSET', KEYS[1], 'revision', ARGV[1], ARGV[2], ARGV[3])
+if redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+return 1
+"""
 
 
 class BotService:
     """
     Service layer for bot business logic.
+
+    A service works with bots of a single tenant,
+    use `with_tenant` to get a service for another one.
+    Cache keys are partitioned by tenant and every tenant has its own
+    cache quota, so one tenant can't evict hot bots of another.
+
+    With a `HotKeyTracker` reads of hot bots are spread over copies
+    of their cache keys and the hottest are kept in process memory,
+    writes drop all of the copies.
     """
 
     async def get_bots_count(self) -> int:
@@ -24,103 +124,619 @@ class BotService:
         """
         return await self.bot_dao.get_bots_count()
 
-    def __init__(self, bot_dao: BotDAO, redis_pool=None, cache_prefix: str = "bot:"):
+    def __init__(
+        self,
+        bot_dao: BotRepository,
+        redis_pool: Any = None,
+        cache_prefix: str = "bot:",
+        write_through: bool = False,
+        cache_quota: int = 0,
+        tenant_cache_quotas: Optional[Dict[str, int]] = None,
+        hot_keys: Optional[HotKeyTracker] = None,
+        lru_touch_rate: float = 1,
+    ) -> None:
         self.bot_dao = bot_dao
         self.redis_pool = redis_pool  # optional, for caching or future use
         self.cache_prefix = cache_prefix  # cache key prefix for bots
+        # Put fresh documents into cache on writes instead of dropping them
+        self.write_through = write_through
+        # Max cached bots per tenant (0 - unlimited) and per-tenant overrides
+        self.cache_quota = cache_quota
+        self.tenant_cache_quotas = tenant_cache_quotas or {}
+        # Share of cache hits that mark the bot as used for quota evictions
+        self.lru_touch_rate = lru_touch_rate
+        # Shared by services of all tenants, keys include the tenant
+        self.hot_keys = hot_keys
         self.redis = None
+        self.response_cache: Optional[ResponseCache] = None
         if redis_pool:
-            # Initialize Redis client using the connection pool, following project convention
-            self.redis = Redis(connection_pool=redis_pool)
+            # Initialize Redis client using the connection pool, following
+            # project convention. Commands have a deadline and are skipped
+            # while redis is down.
+            self.redis = ResilientRedis(connection_pool=redis_pool)
+            self._cache_set_if_newer = self.redis.register_script(
+                CACHE_SET_IF_NEWER_SCRIPT,
+            )
+            self._cache_track = self.redis.register_script(CACHE_TRACK_SCRIPT)
+            self._cache_set_body = self.redis.register_script(CACHE_SET_BODY_SCRIPT)
+            self._cache_set_replica = self.redis.register_script(
+                CACHE_SET_REPLICA_SCRIPT,
+            )
+            self.response_cache = ResponseCache(self.redis)
 
-    async def create_bot(self, **kwargs) -> Optional[BotModel]:
+    @property
+    def tenant(self) -> str:
+        """Tenant of the bots this service works with."""
+        return self.bot_dao.tenant
+
+    def with_tenant(self, tenant: str) -> "BotService":
+        """
+        Get a service for bots of another tenant.
+
+        The new service shares redis connections and scripts with this one.
+
+        :param tenant: tenant name.
+        :return: new service.
         """
-        Create a new bot.
+        if tenant == self.tenant:
+            return self
+        service = copy.copy(self)
+        service.bot_dao = self.bot_dao.with_tenant(tenant)
+        return service
+
+    def cache_key(self, bot_id: str, tenant: Optional[str] = None) -> str:
         """
-        return await self.bot_dao.create_bot_model(**kwargs)
+        Get the cache key of a bot.
 
-    async def get_bot_by_id(self, bot_id: str) -> Optional[BotModel]:
+        :param bot_id: bot id.
+        :param tenant: tenant of the bot, tenant of the service by default.
+        :return: redis key.
         """
-        Get a single bot by id, using Redis cache if available.
-        Implements cache penetration protection and proper TTL management.
+        return f"{self.cache_prefix}t:{tenant or self.tenant}:{bot_id}"
+
+    def _lru_key(self, tenant: str) -> str:
+        return f"{self.cache_prefix}lru:{tenant}"
+
+    def _cache_quota(self, tenant: str) -> int:
+        return self.tenant_cache_quotas.get(tenant, self.cache_quota)
+
+    async def create_bot(self, **kwargs: Any) -> Bot:
+        """
+        Create a new bot. In write-through mode it is cached right away.
+
+        Conflicts are decided by the unique index of the database only,
+        a cached copy of the bot may be stale.
+
+        :raises BotAlreadyExistsError: if a live bot has the same bot_id.
         """
+        try:
+            bot = await self.bot_dao.create_bot_model(**kwargs)
+        except BotAlreadyExistsError:
+            metrics.inc("bot_create_conflicts_total", tenant=self.tenant)
+            raise
+        await self.invalidate_list_cache()
+        # Copies of a tombstone the bot replaces.
+        await self._drop_replicas(bot.bot_id)
+        if self.write_through:
+            await self.cache_bot(bot)
+        return bot
+
+    async def get_bot_by_id(
+        self,
+        bot_id: str,
+        token: Optional[SessionToken] = None,
+    ) -> Optional[Bot]:
+        """
+        Get a single bot by id, using Redis cache if available.
+        Implements cache penetration protection and proper TTL management:
+        tombstones of deleted bots are cached too, so reads of deleted
+        bots don't reach the database.
 
-        cache_key = f"{self.cache_prefix}{bot_id}"
+        With the session token of a write, cached copies older than the
+        written revision are skipped and the database is read in a causally
+        consistent session after the write.
+        """
+        bot = None
         if self.redis:
             try:
-                cached = await self.redis.get(cache_key)
-                if cached is None:
+                cached, revision = await self._read_cache(bot_id, "data")
+                if cached is not None and self._is_stale(revision, token):
+                    cached = None
+                if cached is not None:
                     logger.info(f"Redis hit for bot_id={bot_id}")
-                    bot_dict = json.loads(cached)
-                    return BotModel(**bot_dict)
+                    bot = Bot.model_validate_json(cached)
             except Exception as e:
                 logger.warning(f"Redis error: {e}")
 
-        bot = await self.bot_dao.get_bot_by_id(bot_id)
-        if self.redis:
-            try:
-                if bot:
-                    bot_json = json.dumps(bot.model_dump())
-                    await self.redis.setex(cache_key, BOT_CACHE_TTL, bot_json)
-            except Exception as e:
-                logger.warning(f"Redis set error: {e}")
+        if bot is None and token is not None:
+            async with causal_session(after=token.operation_time):
+                bot = await self.bot_dao.get_bot_by_id(bot_id, include_deleted=True)
+            if bot:
+                await self.cache_bot(bot)
+        elif bot is None:
+            bot = await self.bot_dao.get_bot_by_id(bot_id, include_deleted=True)
+            if bot:
+                await self.cache_bot(bot)
+        if bot is None or bot.deleted_at is not None:
+            return None
         return bot
 
-    async def get_all_bots(self, limit: int = 20, offset: int = 0) -> List[BotModel]:
+    async def get_all_bots(self, limit: int = 20, offset: int = 0) -> List[Bot]:
         """
         Get all bots with pagination.
         """
         return await self.bot_dao.get_all_bots(limit, offset)
 
+    def iter_all_bots(
+        self,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> AsyncIterator[Bot]:
+        """Iterate over a page of bots as the database returns them."""
+        return self.bot_dao.iter_all_bots(limit, offset)
+
     async def get_bots(
         self, bot_id: Optional[str] = None, bot_name: Optional[str] = None
-    ) -> List[BotModel]:
+    ) -> List[Bot]:
         """
         Filter bots by id or name.
         """
         return await self.bot_dao.filter(bot_id=bot_id, bot_name=bot_name)
 
-    async def delete_bot(self, bot_id: str) -> Optional[BotModel]:
+    async def search_bots(
+        self,
+        text: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[List[BotSummary], int]:
+        """Search bots by persona words and/or name prefix with pagination."""
+        return await self.bot_dao.search(
+            text=text,
+            name_prefix=name_prefix,
+            limit=limit,
+            offset=offset,
+        )
+
+    async def delete_bot(self, bot_id: str) -> Optional[Bot]:
         """
-        Delete a bot by id. If cache exists, invalidate it.
+        Delete a bot by id. If cache exists, the bot is replaced
+        with its tombstone there.
         """
         deleted_bot = await self.bot_dao.delete_bot_by_id(bot_id)
-        # Invalidate cache if redis is enabled
-        if self.redis:
-            cache_key = f"{self.cache_prefix}{bot_id}"
-            try:
-                await self.redis.delete(cache_key)
-            except Exception as e:
-                logger.warning(f"Redis cache delete error: {e}")
+        if deleted_bot:
+            await self.invalidate_list_cache()
+            await self.cache_bot(deleted_bot)
+            await self._drop_replicas(bot_id)
+            await self._publish_event("deleted", deleted_bot)
         return deleted_bot
 
-    async def update_bot(self, bot_id: str, update_fields: dict) -> Optional[BotModel]:
+    async def delete_bots(
+        self,
+        bot_ids: Optional[List[str]] = None,
+        bot_name: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+    ) -> List[Bot]:
         """
-        Update a bot by id. If cache exists, invalidate it.
+        Delete all bots matching a filter.
+
+        If cache exists, invalidate the deleted bots, their tombstones
+        are cached on the next read.
         """
-        updated_bot = await self.bot_dao.update_bot_by_id(bot_id, update_fields)
-        # Invalidate cache if redis is enabled
-        if self.redis:
-            cache_key = f"{self.cache_prefix}{bot_id}"
+        deleted_bots = await self.bot_dao.delete_bots(
+            bot_ids=bot_ids,
+            bot_name=bot_name,
+            name_prefix=name_prefix,
+        )
+        if deleted_bots:
+            await self.invalidate_list_cache()
+        if deleted_bots and self.redis:
+            cache_keys = [self.cache_key(bot.bot_id) for bot in deleted_bots]
+            replica_keys = [
+                replica_key
+                for cache_key in cache_keys
+                for replica_key in self._hot_copies(cache_key)
+            ]
             try:
-                await self.redis.delete(cache_key)
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key in [*cache_keys, *replica_keys]:
+                        pipe.delete(key)
+                    pipe.zrem(self._lru_key(self.tenant), *cache_keys)
+                    await pipe.execute()
             except Exception as e:
                 logger.warning(f"Redis cache delete error: {e}")
+        for deleted_bot in deleted_bots:
+            await self._publish_event("deleted", deleted_bot)
+        return deleted_bots
+
+    async def restore_bot(self, bot_id: str) -> Optional[Bot]:
+        """Restore a deleted bot. If cache exists, refresh or invalidate it."""
+        restored_bot = await self.bot_dao.restore_bot_by_id(bot_id)
+        if restored_bot:
+            await self.invalidate_list_cache()
+            await self._refresh_cache(bot_id, restored_bot)
+            await self._publish_event("restored", restored_bot)
+        return restored_bot
+
+    async def update_bot(
+        self,
+        bot_id: str,
+        update_fields: dict,
+        expected_revision: Optional[int] = None,
+    ) -> Optional[Bot]:
+        """
+        Update a bot by id. If cache exists, refresh or invalidate it.
+
+        With `expected_revision` the update is applied only if nobody
+        changed the bot since, otherwise RevisionConflictError is raised.
+        """
+        updated_bot = await self.bot_dao.update_bot_by_id(
+            bot_id,
+            update_fields,
+            expected_revision=expected_revision,
+        )
+        await self._refresh_cache(bot_id, updated_bot)
+        if updated_bot:
+            await self.invalidate_list_cache()
+            changed = set(update_fields)
+            if "bot_clothes" in changed:
+                changed.add("active_cloth_id")
+            changes = updated_bot.model_dump(mode="json", include=changed)
+            await self._publish_event("updated", updated_bot, changes)
         return updated_bot
 
-    async def set_cloth_in_use(self, bot_id: str, cloth_id: str) -> Optional[BotModel]:
+    async def set_cloth_in_use(self, bot_id: str, cloth_id: str) -> Optional[Bot]:
         """
-        Set a specific cloth as in use for a bot. If cache exists, invalidate it.
+        Set a specific cloth as in use for a bot. If cache exists, refresh
+        or invalidate it.
         """
         updated_bot = await self.bot_dao.set_cloth_in_use(bot_id, cloth_id)
-        # Invalidate cache if redis is enabled
-        if self.redis:
-            cache_key = f"{self.cache_prefix}{bot_id}"
+        await self._clothes_changed(bot_id, updated_bot)
+        return updated_bot
+
+    async def add_cloth(self, bot_id: str, cloth: BotCloth) -> Optional[Bot]:
+        """
+        Add a cloth to a bot's wardrobe.
+
+        If cache exists, refresh or invalidate it.
+        """
+        updated_bot = await self.bot_dao.add_cloth(bot_id, cloth)
+        await self._clothes_changed(bot_id, updated_bot)
+        return updated_bot
+
+    async def remove_cloth(self, bot_id: str, cloth_id: str) -> Optional[Bot]:
+        """
+        Remove a cloth from a bot's wardrobe.
+
+        If cache exists, refresh or invalidate it.
+        """
+        updated_bot = await self.bot_dao.remove_cloth(bot_id, cloth_id)
+        await self._clothes_changed(bot_id, updated_bot)
+        return updated_bot
+
+    async def get_bot_revisions(
+        self,
+        bot_id: str,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[List[BotRevision], int]:
+        """Get the history of a bot with pagination, newest revisions first."""
+        return await self.bot_dao.revisions.get_revisions(bot_id, limit, offset)
+
+    async def get_bot_at_revision(
+        self,
+        bot_id: str,
+        revision: int,
+    ) -> Optional[Bot]:
+        """Get a bot as it was at a revision."""
+        return await self.bot_dao.get_bot_at_revision(bot_id, revision)
+
+    async def rollback_bot(
+        self,
+        bot_id: str,
+        revision: int,
+        expected_revision: Optional[int] = None,
+    ) -> Optional[Bot]:
+        """
+        Bring persona and wardrobe of a bot back to a revision.
+
+        The rollback is a new revision, the history is kept.
+        With `expected_revision` it is applied only if nobody changed
+        the bot since, otherwise RevisionConflictError is raised.
+        """
+        current = await self.bot_dao.get_bot_by_id(bot_id)
+        target = await self.bot_dao.get_bot_at_revision(bot_id, revision)
+        if current is None or target is None:
+            return None
+        if expected_revision is None:
+            expected_revision = current.revision
+        changes = {
+            field: getattr(target, field)
+            for field in ROLLBACK_FIELDS
+            if getattr(target, field) != getattr(current, field)
+        }
+        if not changes:
+            if current.revision != expected_revision:
+                raise RevisionConflictError(bot_id, current.revision)
+            return current
+        return await self.update_bot(bot_id, changes, expected_revision)
+
+    async def get_active_cloth(self, bot_id: str) -> Optional[BotActiveCloth]:
+        """Get the cloth a bot is wearing, without loading its wardrobe."""
+        return await self.bot_dao.get_active_cloth(bot_id)
+
+    async def _clothes_changed(self, bot_id: str, bot: Optional[Bot]) -> None:
+        await self._refresh_cache(bot_id, bot)
+        if bot:
+            await self.invalidate_list_cache()
+            changes = bot.model_dump(
+                mode="json",
+                include={"bot_clothes", "active_cloth_id"},
+            )
+            await self._publish_event("updated", bot, changes)
+
+    async def _publish_event(
+        self,
+        event_type: str,
+        bot: Bot,
+        changes: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Notify subscribers of the bot about a change.
+
+        :param event_type: "updated", "deleted" or "restored".
+        :param bot: changed bot.
+        :param changes: changed fields with their new values.
+        """
+        if not self.redis:
+            return
+        event = {
+            "type": event_type,
+            "tenant": bot.tenant,
+            "bot_id": bot.bot_id,
+            "revision": bot.revision,
+            "changes": changes or {},
+        }
+        try:
+            await publish_bot_event(self.redis, event)
+        except Exception as e:
+            logger.warning(f"Redis publish error: {e}")
+
+    async def cache_bot(self, bot: Bot) -> None:
+        """
+        Put a bot into cache, unless a newer revision of it is cached.
+
+        Tombstones of deleted bots are cached for a shorter time.
+        """
+        if not self.redis:
+            return
+        ttl = BOT_CACHE_TTL if bot.deleted_at is None else BOT_CACHE_NONE_TTL
+        cache_key = self.cache_key(bot.bot_id, bot.tenant)
+        quota = self._cache_quota(bot.tenant)
+        try:
+            stored = await self._cache_set_if_newer(
+                keys=[cache_key],
+                args=[bot.revision, bot.model_dump_json(), ttl],
+            )
+            if not stored or quota <= 0:
+                return
+            evicted = await self._cache_track(
+                keys=[self._lru_key(bot.tenant)],
+                args=[cache_key, ttl, quota],
+            )
+            await self._delete_keys(evicted)
+        except Exception as e:
+            logger.warning(f"Redis set error: {e}")
+            return
+        if evicted:
+            metrics.inc("bot_cache_evictions_total", len(evicted), tenant=bot.tenant)
+
+    async def get_cached_body(
+        self,
+        bot_id: str,
+        variant: str,
+        token: Optional[SessionToken] = None,
+    ) -> Optional[Tuple[bytes, int]]:
+        """
+        Get a rendered (e.g. compressed) response body of a cached bot.
+
+        :param bot_id: bot id.
+        :param variant: name of the rendering, e.g. content encoding.
+        :param token: session token of a write the body must include.
+        :return: body and the bot revision it was rendered from
+            or None if it isn't cached.
+        """
+        if not self.redis:
+            return None
+        try:
+            body, revision = await self._read_cache(bot_id, f"body:{variant}")
+        except Exception as e:
+            logger.warning(f"Redis error: {e}")
+            return None
+        if body is None or revision is None or self._is_stale(revision, token):
+            return None
+        return body, int(revision)
+
+    def _is_stale(
+        self,
+        revision: Optional[bytes],
+        token: Optional[SessionToken],
+    ) -> bool:
+        """Check whether a cached revision is older than a write of the client."""
+        if token is None or revision is None or int(revision) >= token.revision:
+            return False
+        metrics.inc("bot_cache_stale_reads_total", tenant=self.tenant)
+        return True
+
+    async def _read_cache(
+        self,
+        bot_id: str,
+        field: str,
+    ) -> Tuple[Optional[bytes], Optional[bytes]]:
+        """
+        Read a field and the revision of a cached bot.
+
+        Hits of tenants with a cache quota mark the bot as used, for
+        `lru_touch_rate` of the reads. Reads are sampled to detect hot bots.
+        Hot bots are read from process memory or a random replica first,
+        a replica that misses is filled from the cache key.
+
+        :return: field value and revision, None if they are not cached.
+        """
+        cache_key = self.cache_key(bot_id)
+        hot_keys = self.hot_keys
+        replica_key = None
+        if hot_keys:
+            hot_keys.sample(cache_key)
+            local = hot_keys.get_local(cache_key, field)
+            if local is not None:
+                self._count_cache_hit(tier="local")
+                return local
+            replica_key = hot_keys.replica_key(cache_key)
+        if hot_keys and replica_key:
+            value, revision = await self.redis.hmget(  # type: ignore
+                replica_key,
+                [field, "revision"],
+            )
+            if value is not None:
+                hot_keys.put_local(cache_key, field, value, revision)
+                self._count_cache_hit(tier="replica")
+                return value, revision
+        value, revision = await self.redis.hmget(  # type: ignore
+            cache_key,
+            [field, "revision"],
+        )
+        if value is None:
+            metrics.inc("bot_cache_requests_total", tenant=self.tenant, result="miss")
+            return value, revision
+        self._count_cache_hit(tier="primary")
+        touch = random.random() < self.lru_touch_rate  # noqa: S311
+        if touch and self._cache_quota(self.tenant) > 0:
+            await self.redis.zadd(  # type: ignore
+                self._lru_key(self.tenant),
+                {cache_key: int(time.time() * 1000000)},
+                xx=True,
+            )
+        if hot_keys:
+            hot_keys.put_local(cache_key, field, value, revision)
+        if hot_keys and replica_key:
             try:
-                await self.redis.delete(cache_key)
+                await self._cache_set_replica(
+                    keys=[replica_key],
+                    args=[revision, field, value, hot_keys.replica_ttl],
+                )
             except Exception as e:
-                logger.warning(f"Redis cache delete error: {e}")
-        return updated_bot
+                logger.warning(f"Redis set error: {e}")
+        return value, revision
+
+    def _count_cache_hit(self, tier: str) -> None:
+        metrics.inc("bot_cache_requests_total", tenant=self.tenant, result="hit")
+        if tier != "primary":
+            metrics.inc("bot_hot_cache_hits_total", tenant=self.tenant, tier=tier)
+
+    async def cache_body(self, bot: Bot, variant: str, body: bytes) -> None:
+        """
+        Store a rendered response body next to the cached bot.
+
+        The body is kept only while the cached bot has the same revision
+        and expires together with it. Replicas of a hot bot get it too.
+        """
+        if not self.redis:
+            return
+        cache_key = self.cache_key(bot.bot_id, bot.tenant)
+        field = f"body:{variant}"
+        try:
+            if self.hot_keys is None or not self.hot_keys.is_hot(cache_key):
+                await self._cache_set_body(
+                    keys=[cache_key],
+                    args=[bot.revision, field, body],
+                )
+                return
+            async with self.redis.pipeline(transaction=False) as pipe:
+                await self._cache_set_body(
+                    keys=[cache_key],
+                    args=[bot.revision, field, body],
+                    client=pipe,
+                )
+                for replica_key in self.hot_keys.replica_keys(cache_key):
+                    await self._cache_set_replica(
+                        keys=[replica_key],
+                        args=[bot.revision, field, body, self.hot_keys.replica_ttl],
+                        client=pipe,
+                    )
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis set error: {e}")
+
+    async def _refresh_cache(self, bot_id: str, bot: Optional[Bot]) -> None:
+        """Write the updated bot through to cache or drop the stale entry."""
+        if bot and self.write_through:
+            await self.cache_bot(bot)
+            await self._drop_replicas(bot_id)
+        else:
+            await self.invalidate_cache(bot_id)
+
+    async def invalidate_cache(self, bot_id: str, tenant: Optional[str] = None) -> None:
+        """Drop the cached bot and its copies, if redis is enabled."""
+        tenant = tenant or self.tenant
+        cache_key = self.cache_key(bot_id, tenant)
+        replica_keys = self._hot_copies(cache_key)
+        if not self.redis:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in [cache_key, *replica_keys]:
+                    pipe.delete(key)
+                pipe.zrem(self._lru_key(tenant), cache_key)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis cache delete error: {e}")
+
+    def _hot_copies(self, cache_key: str) -> List[str]:
+        """Drop a bot from process memory and get keys of its replicas."""
+        if self.hot_keys is None:
+            return []
+        self.hot_keys.forget(cache_key)
+        return self.hot_keys.replica_keys(cache_key)
+
+    async def _drop_replicas(self, bot_id: str) -> None:
+        """Drop copies of a bot whose cache key was just rewritten."""
+        replica_keys = self._hot_copies(self.cache_key(bot_id))
+        if not self.redis or not replica_keys:
+            return
+        try:
+            await self._delete_keys(replica_keys)
+        except Exception as e:
+            logger.warning(f"Redis cache delete error: {e}")
+
+    async def _delete_keys(self, keys: List[str]) -> None:
+        """Delete keys one by one, on redis cluster they are on different shards."""
+        if not keys:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:  # type: ignore
+            for key in keys:
+                pipe.delete(key)
+            await pipe.execute()
+
+    def on_bot_event(self, event: Dict[str, Any]) -> None:
+        """
+        Drop a bot changed by another worker from process memory.
+
+        :param event: bot event.
+        """
+        if self.hot_keys is not None:
+            cache_key = self.cache_key(event["bot_id"], event.get("tenant"))
+            self.hot_keys.forget(cache_key)
+
+    async def invalidate_list_cache(self, tenant: Optional[str] = None) -> None:
+        """Drop cached responses listing bots of a tenant, if redis is enabled."""
+        if not self.response_cache:
+            return
+        tag = BOT_LIST_TAG.format(tenant=tenant or self.tenant)
+        try:
+            await self.response_cache.invalidate([tag])
+        except Exception as e:
+            logger.warning(f"Redis response cache error: {e}")
 
     async def close(self):
         """
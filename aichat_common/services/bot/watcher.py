@@ -0,0 +1,195 @@
+import asyncio
+import contextlib
+import json
+import logging
+import uuid
+from typing import Any, Mapping, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from aichat_common.db.models.bot_model import DEFAULT_TENANT, BotModel
+from aichat_common.services.bot.service import BotService
+
+logger = logging.getLogger(__name__)
+
+RESUME_TOKEN_KEY = "bot:changestream:resume_token"  # noqa: S105
+LEADER_KEY = "bot:changestream:leader"
+# Change streams need a replica set or a sharded cluster.
+UNSUPPORTED_ERROR_CODES = {20, 40573}
+# The stored resume token can no longer be used.
+STALE_TOKEN_ERROR_CODES = {260, 280, 286}
+RETRY_DELAY = 5
+
+# Renew the leader lock only if this watcher still holds it.
+RENEW_LEADER_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEADER_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def get_changed_bot(change: Mapping[str, Any]) -> Optional[Tuple[str, str]]:
+    """
+    Extract tenant and bot_id of the document touched by a change event.
+
+    Deletes only carry them when pre-images are enabled
+    on the collection, otherwise None is returned.
+
+    :param change: change stream event.
+    :return: tenant and bot id or None if the event doesn't carry them.
+    """
+    for field in ("fullDocument", "fullDocumentBeforeChange"):
+        document = change.get(field) or {}
+        if document.get("bot_id"):
+            return document.get("tenant", DEFAULT_TENANT), document["bot_id"]
+    return None
+
+
+class BotChangeWatcher:
+    """
+    Background task keeping the bot cache coherent with the database.
+
+    It tails a change stream on the bots collection and invalidates
+    (or, in write-through mode, refreshes) cache entries of changed bots,
+    including writes made outside of BotService. Only one watcher across
+    all workers holds the leader lock in redis and actually tails the
+    stream. The resume token is stored in redis, so a new leader
+    continues where the old one stopped.
+
+    If change streams are not available (standalone mongo) the watcher
+    stops and caches fall back to TTL expiration.
+    """
+
+    def __init__(
+        self,
+        bot_service: BotService,
+        redis_pool: Any,
+        leader_ttl: int = 30,
+    ) -> None:
+        self.bot_service = bot_service
+        self.redis = Redis(connection_pool=redis_pool)
+        self.leader_ttl = leader_ttl
+        self.watcher_id = uuid.uuid4().hex
+        self._renew_leader = self.redis.register_script(RENEW_LEADER_SCRIPT)
+        self._release_leader = self.redis.register_script(RELEASE_LEADER_SCRIPT)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start tailing the change stream in background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and give up leadership."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        try:
+            await self._release_leader(keys=[LEADER_KEY], args=[self.watcher_id])
+        except Exception as e:
+            logger.warning(f"Redis leader release error: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self._acquire_leadership():
+                    await self._lead()
+                    continue
+            except OperationFailure as e:
+                if e.code in UNSUPPORTED_ERROR_CODES:
+                    logger.warning(
+                        f"Change streams are unavailable ({e}), "
+                        "bot cache falls back to TTL expiration",
+                    )
+                    await self._release_leader(
+                        keys=[LEADER_KEY],
+                        args=[self.watcher_id],
+                    )
+                    return
+                if e.code in STALE_TOKEN_ERROR_CODES:
+                    logger.warning(f"Dropping stale change stream resume token: {e}")
+                    await self.redis.delete(RESUME_TOKEN_KEY)
+                    continue
+                logger.warning(f"Change stream error: {e}")
+            except (PyMongoError, RedisError) as e:
+                logger.warning(f"Change stream error: {e}")
+            await asyncio.sleep(RETRY_DELAY)
+
+    async def _acquire_leadership(self) -> bool:
+        acquired = await self.redis.set(
+            LEADER_KEY,
+            self.watcher_id,
+            nx=True,
+            ex=self.leader_ttl,
+        )
+        if acquired:
+            return True
+        # We may still hold the lock after the stream was restarted.
+        renewed = await self._renew_leader(
+            keys=[LEADER_KEY],
+            args=[self.watcher_id, self.leader_ttl],
+        )
+        return bool(renewed)
+
+    async def _lead(self) -> None:
+        """Tail the stream while renewing the leader lock."""
+        watch_task = asyncio.create_task(self._watch())
+        try:
+            while True:
+                done, _ = await asyncio.wait({watch_task}, timeout=self.leader_ttl / 3)
+                if done:
+                    # Re-raises errors of the watch task.
+                    watch_task.result()
+                    return
+                renewed = await self._renew_leader(
+                    keys=[LEADER_KEY],
+                    args=[self.watcher_id, self.leader_ttl],
+                )
+                if not renewed:
+                    logger.info("Lost change stream leadership")
+                    return
+        finally:
+            watch_task.cancel()
+
+    async def _watch(self) -> None:
+        options: dict = {
+            "full_document": "updateLookup",
+            "full_document_before_change": "whenAvailable",
+        }
+        token = await self.redis.get(RESUME_TOKEN_KEY)
+        if token:
+            options["resume_after"] = json.loads(token)
+        collection = BotModel.get_motor_collection()
+        async with collection.watch(**options) as stream:
+            async for change in stream:
+                if change["operationType"] == "invalidate":
+                    # The collection was dropped or renamed, start over.
+                    await self.redis.delete(RESUME_TOKEN_KEY)
+                    return
+                changed_bot = get_changed_bot(change)
+                if changed_bot is not None:
+                    tenant, bot_id = changed_bot
+                    # Edits made outside of BotService keep the revision,
+                    # renderings and copies of the old data must go too.
+                    await self.bot_service.invalidate_cache(bot_id, tenant)
+                full_document = change.get("fullDocument")
+                if full_document and self.bot_service.write_through:
+                    await self.bot_service.cache_bot(
+                        BotModel.model_validate(full_document),
+                    )
+                if changed_bot is not None:
+                    await self.bot_service.invalidate_list_cache(changed_bot[0])
+                else:
+                    logger.debug(f"Change without bot_id: {change['documentKey']}")
+                await self.redis.set(RESUME_TOKEN_KEY, json.dumps(stream.resume_token))
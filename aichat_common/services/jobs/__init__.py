@@ -0,0 +1 @@
+"""Background jobs on redis streams."""
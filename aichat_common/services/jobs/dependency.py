@@ -0,0 +1,13 @@
+from fastapi import Request
+
+from aichat_common.services.jobs.queue import JobQueue
+
+
+async def get_job_queue(request: Request) -> JobQueue:
+    """
+    FastAPI dependency to get the job queue instance.
+
+    :param request: FastAPI request object.
+    :return: JobQueue singleton instance.
+    """
+    return request.app.state.job_queue
@@ -0,0 +1,177 @@
+import json
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Set
+
+import aiofiles
+
+from aichat_common.db.snapshot import iter_live_bots, write_snapshot
+from aichat_common.settings import settings
+from aichat_common.web.api.bot.schema import BotUpdateDTO
+
+if TYPE_CHECKING:
+    from aichat_common.services.bot.service import BotService
+    from aichat_common.services.jobs.queue import JobQueue
+
+
+class JobContext:
+    """Everything a job handler needs to do its work."""
+
+    def __init__(
+        self,
+        job_id: str,
+        params: dict,
+        queue: "JobQueue",
+        bot_service: "BotService",
+    ) -> None:
+        self.job_id = job_id
+        self.params = params
+        self.queue = queue
+        self.bot_service = bot_service
+
+    async def report_progress(self, progress: int, total: int) -> None:
+        """
+        Save job progress, so it can be polled through the API.
+
+        :param progress: number of processed items.
+        :param total: total number of items.
+        """
+        await self.queue.update_job(self.job_id, progress=progress, total=total)
+
+
+JobHandler = Callable[[JobContext], Awaitable[Any]]
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+# Jobs working across tenants or on the deployment itself, which can only
+# be submitted by operators (`python -m aichat_common submit <type>`).
+ADMIN_JOB_TYPES: Set[str] = set()
+# How often long running handlers save their progress.
+PROGRESS_EVERY = 100
+
+
+def job_handler(
+    job_type: str,
+    admin: bool = False,
+) -> Callable[[JobHandler], JobHandler]:
+    """
+    Register a coroutine as a handler of a job type.
+
+    Handler's return value is saved as the job result,
+    so it must be json serializable.
+
+    :param job_type: name of the job type.
+    :param admin: the job can't be submitted through the API.
+    :return: decorator.
+    """
+
+    def decorator(func: JobHandler) -> JobHandler:
+        JOB_HANDLERS[job_type] = func
+        if admin:
+            ADMIN_JOB_TYPES.add(job_type)
+        return func
+
+    return decorator
+
+
+@job_handler("bots.cache_rebuild")
+async def rebuild_bot_cache(ctx: JobContext) -> dict:
+    """Put every bot into the cache."""
+    total = await ctx.bot_service.get_bots_count()
+    cached = 0
+    async for bot in ctx.bot_service.bot_dao.iter_all_bots():
+        await ctx.bot_service.cache_bot(bot)
+        cached += 1
+        if cached % PROGRESS_EVERY == 0:
+            await ctx.report_progress(cached, total)
+    await ctx.report_progress(cached, total)
+    return {"cached": cached}
+
+
+@job_handler("bots.reindex", admin=True)
+async def reindex_bots(ctx: JobContext) -> dict:
+    """Create indexes declared on the bot model."""
+    names = await ctx.bot_service.bot_dao.ensure_indexes()
+    await ctx.report_progress(1, 1)
+    return {"indexes": names}
+
+
+@job_handler("bots.bulk_update")
+async def bulk_update_bots(ctx: JobContext) -> dict:
+    """
+    Apply the same update to many bots of the tenant of the job.
+
+    Params: `bot_ids` - list of bot ids, `update_fields` - fields to set,
+    the fields PATCH /api/bots/{bot_id} accepts except bot_id.
+    """
+    bot_ids = ctx.params["bot_ids"]
+    fields = ctx.params["update_fields"]
+    # Bookkeeping fields (tenant, revision, deleted_at) are never set.
+    unknown = set(fields) - (set(BotUpdateDTO.model_fields) - {"bot_id"})
+    if unknown:
+        raise ValueError(f"Fields can't be updated: {sorted(unknown)}")
+    update_fields = BotUpdateDTO.model_validate(fields).model_dump(
+        exclude_unset=True,
+        exclude_none=True,
+    )
+    if not update_fields:
+        raise ValueError("No fields to update")
+    updated = 0
+    for done, bot_id in enumerate(bot_ids, start=1):
+        if await ctx.bot_service.update_bot(bot_id, update_fields):
+            updated += 1
+        if done % PROGRESS_EVERY == 0:
+            await ctx.report_progress(done, len(bot_ids))
+    await ctx.report_progress(len(bot_ids), len(bot_ids))
+    return {"updated": updated, "missing": len(bot_ids) - updated}
+
+
+@job_handler("bots.export")
+async def export_bots(ctx: JobContext) -> dict:
+    """Export the whole bot catalog into a json lines file."""
+    settings.jobs_export_dir.mkdir(parents=True, exist_ok=True)
+    path = settings.jobs_export_dir / f"bots-{ctx.job_id}.jsonl"
+    total = await ctx.bot_service.get_bots_count()
+    exported = 0
+    async with aiofiles.open(path, "w", encoding="utf-8") as export_file:
+        async for bot in ctx.bot_service.bot_dao.iter_all_bots():
+            line = json.dumps(bot.model_dump(mode="json"), ensure_ascii=False)
+            await export_file.write(line + "\n")
+            exported += 1
+            if exported % PROGRESS_EVERY == 0:
+                await ctx.report_progress(exported, total)
+    await ctx.report_progress(exported, total)
+    return {"path": str(path), "exported": exported}
+
+
+@job_handler("bots.snapshot", admin=True)
+async def snapshot_bots(ctx: JobContext) -> dict:
+    """Write live bots of all tenants into the snapshot for edge nodes."""
+    if "path" in ctx.params:
+        raise ValueError("Snapshots are only written to bot_snapshot_path")
+    path = settings.bot_snapshot_path
+    written = await write_snapshot(iter_live_bots(), path)
+    await ctx.report_progress(written, written)
+    return {"path": str(path), "written": written}
+
+
+@job_handler("bots.purge_deleted", admin=True)
+async def purge_deleted_bots(ctx: JobContext) -> dict:
+    """
+    Remove tombstones of bots of all tenants deleted longer than the retention ago.
+
+    Params: `retention` - seconds, at least `bot_tombstone_retention`.
+    """
+    retention = max(
+        int(ctx.params.get("retention", 0)),
+        settings.bot_tombstone_retention,
+    )
+    deleted_before = datetime.now(timezone.utc) - timedelta(seconds=retention)
+    bot_dao = ctx.bot_service.bot_dao
+    total = await bot_dao.count_deleted(deleted_before)
+    purged = 0
+    async for removed in bot_dao.purge_deleted(
+        deleted_before,
+        batch_size=settings.bot_purge_batch_size,
+    ):
+        purged += removed
+        await ctx.report_progress(purged, total)
+    await ctx.report_progress(purged, max(purged, total))
+    return {"purged": purged}
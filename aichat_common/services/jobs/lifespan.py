@@ -0,0 +1,38 @@
+from fastapi import FastAPI
+
+from aichat_common.services.jobs.queue import JobQueue
+from aichat_common.services.jobs.worker import JobWorker
+from aichat_common.settings import settings
+
+
+def init_jobs(app: FastAPI) -> None:
+    """
+    Create the job queue and start in-process job workers.
+
+    Workers are started only if `jobs_app_workers` is set, otherwise
+    jobs are processed by `python -m aichat_common worker`.
+    Should be called after Redis and BotService are initialized.
+    """
+    app.state.job_queue = JobQueue(app.state.redis_pool)
+    app.state.job_workers = []
+    for _ in range(settings.jobs_app_workers):
+        worker = JobWorker(
+            queue=app.state.job_queue,
+            bot_service=app.state.bot_service,
+            redis_pool=app.state.redis_pool,
+            visibility_timeout=settings.jobs_visibility_timeout,
+            max_attempts=settings.jobs_max_attempts,
+        )
+        worker.start()
+        app.state.job_workers.append(worker)
+
+
+async def shutdown_jobs(app: FastAPI) -> None:
+    """
+    Stop in-process job workers.
+
+    Jobs they were running stay pending and are picked up
+    by other workers after the visibility timeout.
+    """
+    for worker in getattr(app.state, "job_workers", []):
+        await worker.stop()
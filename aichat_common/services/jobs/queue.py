@@ -0,0 +1,149 @@
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from redis.asyncio import ConnectionPool, Redis
+
+from aichat_common.services.jobs.handlers import JOB_HANDLERS
+from aichat_common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_STREAM_KEY = "jobs:stream"
+JOB_GROUP = "jobs:workers"
+JOB_KEY_PREFIX = "job:"
+JOB_TTL = 7 * 24 * 3600  # keep finished job status for a week
+
+
+class JobStatus:
+    """Possible states of a job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    RETRYING = "retrying"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class UnknownJobTypeError(ValueError):
+    """Raised when a job is submitted for a type without a handler."""
+
+
+class JobQueue:
+    """
+    Redis streams backed queue of background jobs.
+
+    Job messages are appended to a stream consumed by a consumer group,
+    job state lives in a separate hash per job.
+    """
+
+    def __init__(self, redis_pool: Any) -> None:
+        self.redis = Redis(connection_pool=redis_pool)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{JOB_KEY_PREFIX}{job_id}"
+
+    async def submit(
+        self,
+        job_type: str,
+        params: Optional[dict] = None,
+        tenant: Optional[str] = None,
+    ) -> str:
+        """
+        Put a new job in the queue.
+
+        :param job_type: name of a registered job handler.
+        :param params: json serializable parameters of the job.
+        :param tenant: tenant that submitted the job, None for operators.
+        :raises UnknownJobTypeError: if there's no handler for job_type.
+        :return: id of the new job.
+        """
+        if job_type not in JOB_HANDLERS:
+            raise UnknownJobTypeError(job_type)
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        job = {
+            "job_id": job_id,
+            "type": job_type,
+            "params": json.dumps(params or {}),
+            "status": JobStatus.QUEUED,
+            "attempts": 0,
+            "progress": 0,
+            "total": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if tenant is not None:
+            job["tenant"] = tenant
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job_id), mapping=job)
+            pipe.expire(self._job_key(job_id), JOB_TTL)
+            pipe.xadd(JOB_STREAM_KEY, {"job_id": job_id})
+            await pipe.execute()
+        logger.info(f"Job {job_id} ({job_type}) submitted")
+        return job_id
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get current state of a job.
+
+        :param job_id: job id.
+        :return: job state or None if the job is unknown or expired.
+        """
+        raw = await self.redis.hgetall(self._job_key(job_id))
+        if not raw:
+            return None
+        job = {key.decode(): value.decode() for key, value in raw.items()}
+        return {
+            "job_id": job["job_id"],
+            "type": job["type"],
+            "tenant": job.get("tenant"),
+            "params": json.loads(job["params"]),
+            "status": job["status"],
+            "attempts": int(job["attempts"]),
+            "progress": int(job["progress"]),
+            "total": int(job["total"]),
+            "result": json.loads(job["result"]) if "result" in job else None,
+            "error": job.get("error"),
+            "created_at": float(job["created_at"]),
+            "updated_at": float(job["updated_at"]),
+        }
+
+    async def update_job(self, job_id: str, **fields: Any) -> None:
+        """
+        Update state fields of a job.
+
+        :param job_id: job id.
+        :param fields: fields to set.
+        """
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        await self.redis.hset(self._job_key(job_id), mapping=fields)
+
+    async def add_attempt(self, job_id: str) -> int:
+        """
+        Count a new attempt to run the job.
+
+        :param job_id: job id.
+        :return: number of attempts so far.
+        """
+        return await self.redis.hincrby(self._job_key(job_id), "attempts", 1)
+
+
+async def run_job_submit(job_type: str) -> str:
+    """
+    Submit a job from the command line, operator-only jobs included.
+
+    :param job_type: name of a registered job handler.
+    :return: id of the new job.
+    """
+    redis_pool = ConnectionPool.from_url(str(settings.redis_url))
+    try:
+        job_id = await JobQueue(redis_pool).submit(job_type)
+    finally:
+        await redis_pool.disconnect()
+    logger.info(f"Submitted {job_type} as job {job_id}")
+    return job_id
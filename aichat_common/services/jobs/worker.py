@@ -0,0 +1,217 @@
+import asyncio
+import contextlib
+import logging
+import socket
+import traceback
+import uuid
+from typing import Any, Optional
+
+import beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+from redis.asyncio import ConnectionPool, Redis
+from redis.exceptions import RedisError, ResponseError
+
+from aichat_common.db.dao.bot_dao import BotDAO
+from aichat_common.db.models import load_all_models
+from aichat_common.db.models.bot_model import DEFAULT_TENANT
+from aichat_common.services.bot.hot_keys import get_hot_key_tracker
+from aichat_common.services.bot.service import BotService
+from aichat_common.services.jobs.handlers import JOB_HANDLERS, JobContext
+from aichat_common.services.jobs.queue import (
+    JOB_GROUP,
+    JOB_STREAM_KEY,
+    JobQueue,
+    JobStatus,
+)
+from aichat_common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobWorker:
+    """
+    Consumer of the job stream.
+
+    Messages that are not acknowledged within `visibility_timeout`
+    (the worker died or the job failed) are claimed again by any worker,
+    until the job runs out of attempts. While a job runs the worker
+    keeps re-claiming its message, so long jobs are not taken over.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        bot_service: BotService,
+        redis_pool: Any,
+        visibility_timeout: int = 300,
+        max_attempts: int = 3,
+        block_ms: int = 5000,
+    ) -> None:
+        self.queue = queue
+        self.bot_service = bot_service
+        self.redis = Redis(connection_pool=redis_pool)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.block_ms = block_ms
+        self.consumer = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_group(self) -> None:
+        """Create the consumer group if it doesn't exist yet."""
+        try:
+            await self.redis.xgroup_create(
+                JOB_STREAM_KEY,
+                JOB_GROUP,
+                id="0",
+                mkstream=True,
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def start(self) -> None:
+        """Start consuming jobs in background."""
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop consuming jobs."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def run(self) -> None:
+        """Consume jobs until cancelled."""
+        await self.ensure_group()
+        logger.info(f"Job worker {self.consumer} started")
+        while True:
+            try:
+                await self.run_once()
+            except RedisError as e:
+                logger.warning(f"Job worker redis error: {e}")
+                await asyncio.sleep(self.block_ms / 1000)
+
+    async def run_once(self) -> bool:
+        """
+        Process a single job, waiting up to `block_ms` for it.
+
+        Stale messages of other workers are picked up before new ones.
+
+        :return: True if a job was processed.
+        """
+        _, messages, _ = await self.redis.xautoclaim(
+            JOB_STREAM_KEY,
+            JOB_GROUP,
+            self.consumer,
+            min_idle_time=self.visibility_timeout * 1000,
+            start_id="0-0",
+            count=1,
+        )
+        if not messages:
+            streams = await self.redis.xreadgroup(
+                JOB_GROUP,
+                self.consumer,
+                {JOB_STREAM_KEY: ">"},
+                count=1,
+                block=self.block_ms,
+            )
+            messages = streams[0][1] if streams else []
+        for message_id, fields in messages:
+            await self._process(message_id, fields[b"job_id"].decode())
+        return bool(messages)
+
+    async def _process(self, message_id: bytes, job_id: str) -> None:
+        job = await self.queue.get_job(job_id)
+        if job is None:
+            logger.warning(f"Job {job_id} has expired, dropping it")
+            await self._ack(message_id)
+            return
+        attempts = await self.queue.add_attempt(job_id)
+        handler = JOB_HANDLERS.get(job["type"])
+        if handler is None or attempts > self.max_attempts:
+            error = "unknown job type" if handler is None else "too many attempts"
+            await self.queue.update_job(job_id, status=JobStatus.FAILED, error=error)
+            await self._ack(message_id)
+            return
+
+        await self.queue.update_job(job_id, status=JobStatus.RUNNING)
+        heartbeat = asyncio.create_task(self._keep_claimed(message_id))
+        bot_service = self.bot_service.with_tenant(
+            job["params"].get("tenant", DEFAULT_TENANT),
+        )
+        ctx = JobContext(job_id, job["params"], self.queue, bot_service)
+        try:
+            result = await handler(ctx)
+        except Exception as e:
+            logger.warning(f"Job {job_id} attempt {attempts} failed: {e}")
+            status = (
+                JobStatus.RETRYING if attempts < self.max_attempts else JobStatus.FAILED
+            )
+            await self.queue.update_job(
+                job_id,
+                status=status,
+                error=traceback.format_exc(limit=5),
+            )
+            if status == JobStatus.FAILED:
+                await self._ack(message_id)
+            # Otherwise the message stays pending and is retried
+            # after the visibility timeout.
+            return
+        finally:
+            heartbeat.cancel()
+        await self.queue.update_job(job_id, status=JobStatus.SUCCEEDED, result=result)
+        await self._ack(message_id)
+        logger.info(f"Job {job_id} ({job['type']}) succeeded")
+
+    async def _keep_claimed(self, message_id: bytes) -> None:
+        """Reset idle time of a running job, so nobody claims it."""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            await self.redis.xclaim(
+                JOB_STREAM_KEY,
+                JOB_GROUP,
+                self.consumer,
+                min_idle_time=0,
+                message_ids=[message_id],
+                justid=True,
+            )
+
+    async def _ack(self, message_id: bytes) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(JOB_STREAM_KEY, JOB_GROUP, message_id)
+            pipe.xdel(JOB_STREAM_KEY, message_id)
+            await pipe.execute()
+
+
+async def run_worker() -> None:
+    """Run a standalone job worker with its own db and redis connections."""
+    client = AsyncIOMotorClient(str(settings.db_url))  # type: ignore
+    await beanie.init_beanie(
+        database=client[settings.db_base],
+        document_models=load_all_models(),  # type: ignore
+        skip_indexes=not settings.db_create_indexes,
+    )
+    redis_pool = ConnectionPool.from_url(str(settings.redis_url))
+    bot_service = BotService(
+        bot_dao=BotDAO(),
+        redis_pool=redis_pool,
+        write_through=settings.bot_cache_write_through,
+        cache_quota=settings.bot_cache_tenant_quota,
+        tenant_cache_quotas=settings.bot_cache_tenant_quotas,
+        hot_keys=get_hot_key_tracker(),
+        lru_touch_rate=settings.bot_cache_lru_touch_rate,
+    )
+    worker = JobWorker(
+        queue=JobQueue(redis_pool),
+        bot_service=bot_service,
+        redis_pool=redis_pool,
+        visibility_timeout=settings.jobs_visibility_timeout,
+        max_attempts=settings.jobs_max_attempts,
+    )
+    try:
+        await worker.run()
+    finally:
+        await redis_pool.disconnect()
+        client.close()
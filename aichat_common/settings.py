@@ -1,12 +1,13 @@
 import enum
-import multiprocessing
 from pathlib import Path
 from tempfile import gettempdir
-from typing import Optional
+from typing import Dict, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from yarl import URL
 
+from aichat_common.runtime import available_cpus, recommended_workers
+
 TEMP_DIR = Path(gettempdir())
 
 
@@ -21,6 +22,32 @@ class LogLevel(str, enum.Enum):
     FATAL = "FATAL"
 
 
+class ServerKind(str, enum.Enum):
+    """Servers the application can be run with in prod."""
+
+    GUNICORN = "gunicorn"
+    # Supports HTTP/2, must be installed separately
+    HYPERCORN = "hypercorn"
+
+
+class QueryPlanCheck(str, enum.Enum):
+    """What to do when a DAO query is planned as a collection scan."""
+
+    OFF = "off"
+    WARN = "warn"
+    RAISE = "raise"
+
+
+class BotBackend(str, enum.Enum):
+    """Where bots are read from."""
+
+    MONGO = "mongo"
+    # Process memory of every worker, for tests and benchmarks
+    MEMORY = "memory"
+    # Read-only snapshot file written by `python -m aichat_common snapshot`
+    SNAPSHOT = "snapshot"
+
+
 class Settings(BaseSettings):
     """
     Application settings.
@@ -33,8 +60,29 @@ class Settings(BaseSettings):
     port: int = 8000
     # quantity of workers for uvicorn
     workers_count: int = 1
+    # Workers per available CPU in prod, if workers_count is not set
+    workers_per_cpu: float = 1
+    # Import the application once in gunicorn master and fork workers
+    preload_app: bool = True
+    # Mount echo and dummy example routers
+    dev_routers: bool = True
     # Enable uvicorn reloading
     reload: bool = False
+    # Server used when reload is off
+    server: ServerKind = ServerKind.GUNICORN
+    # Seconds to keep idle client connections open
+    keep_alive_timeout: int = 5
+    # Max number of pending connections
+    backlog: int = 2048
+    # Max concurrent connections per worker, 503 above it (uvicorn only)
+    limit_concurrency: Optional[int] = None
+    # Restart a worker after this many requests (0 - never), to contain leaks
+    max_requests: int = 0
+    # Random extra requests, so workers don't restart at the same time
+    max_requests_jitter: int = 0
+    # TLS certificate and key, required for HTTP/2 in browsers
+    ssl_certfile: Optional[str] = None
+    ssl_keyfile: Optional[str] = None
 
     # Current environment
     environment: str = "dev"
@@ -47,6 +95,15 @@ class Settings(BaseSettings):
     db_pass: str = "aichat_common"
     db_base: str = "admin"
     db_echo: bool = False
+    # Create indexes on every worker startup, otherwise they are created
+    # by `python -m aichat_common migrate` (prod default)
+    db_create_indexes: bool = True
+    # Run explain() on DAO queries and report COLLSCAN plans (dev/test only)
+    db_query_plan_check: QueryPlanCheck = QueryPlanCheck.OFF
+    # Max concurrent DAO operations per worker, others wait (0 - unlimited)
+    db_max_concurrency: int = 64
+    # Seconds a DAO operation may take, waiting included (0 - no limit)
+    db_operation_timeout: float = 10
 
     # Variables for Redis
     redis_host: str = "aichat_common-redis"
@@ -54,6 +111,92 @@ class Settings(BaseSettings):
     redis_user: Optional[str] = None
     redis_pass: Optional[str] = None
     redis_base: Optional[int] = None
+    # Seconds a redis command may take (0 - no limit)
+    redis_operation_timeout: float = 0.5
+    # Failures in a row that make the worker skip redis
+    breaker_failure_threshold: int = 5
+    # Seconds redis is skipped before it is tried again
+    breaker_reset_timeout: float = 30
+
+    # Write fresh bots into cache on writes instead of invalidating them
+    bot_cache_write_through: bool = False
+    # Max cached bots of a tenant, least recently used are evicted (0 - no limit)
+    bot_cache_tenant_quota: int = 0
+    # Quotas of particular tenants, e.g. '{"big-customer": 10000}'
+    bot_cache_tenant_quotas: Dict[str, int] = {}
+    # Share of cache hits of tenants with a quota that update the LRU order
+    bot_cache_lru_touch_rate: float = 0.05
+    # Tail a change stream on bots to invalidate cache on out-of-band writes
+    bot_change_stream_enabled: bool = False
+    # Events buffered per subscriber before it has to resync
+    bot_events_queue_size: int = 100
+    # Seconds between keep-alive comments of bot event streams
+    bot_events_heartbeat: float = 15
+    # Seconds deleted bots can be restored before the purge job removes them
+    bot_tombstone_retention: int = 7 * 24 * 3600
+    # Tombstones removed by the purge job at once
+    bot_purge_batch_size: int = 1000
+    # Every N-th revision of a bot is stored in full, others as diffs
+    bot_history_checkpoint_every: int = 10
+    # Share of bot cache reads sampled to detect hot bots (0 - no detection)
+    bot_hot_key_sample_rate: float = 0.01
+    # Seconds of samples hot bots are detected from
+    bot_hot_key_window: float = 10
+    # Reads per second of a worker that make a bot hot
+    bot_hot_key_threshold: float = 200
+    # Copies of hot bots in redis, reads are spread over them (0 - no copies).
+    # Only useful with redis cluster, where copies land on other shards.
+    bot_hot_key_replicas: int = 0
+    # Seconds a copy of a hot bot is kept
+    bot_hot_key_replica_ttl: int = 60
+    # Reads per second of a worker that keep a bot in process memory too
+    bot_hot_key_local_threshold: float = 2000
+    # Seconds a bot is served from process memory
+    bot_hot_key_local_ttl: float = 1
+
+    # Where bots are stored, see BotBackend
+    bot_backend: BotBackend = BotBackend.MONGO
+    bot_snapshot_path: Path = TEMP_DIR / "aichat_common_bots.snapshot"
+    # Seconds between checks for a new snapshot file
+    bot_snapshot_check_interval: float = 1
+
+    # Max concurrent requests per worker, 503 above it (0 - unlimited)
+    admission_max_in_flight: int = 0
+    # Shrink the in-flight limit while mongo latency is above the target
+    admission_adaptive: bool = False
+    admission_min_in_flight: int = 4
+    admission_target_db_latency_ms: float = 50
+    # Max open event streams per worker, 503 above it (0 - unlimited)
+    admission_max_streams: int = 0
+    # Per-client token bucket in redis, 429 when empty (0 - disabled)
+    rate_limit_per_second: float = 0
+    # Bucket size (0 - same as rate_limit_per_second)
+    rate_limit_burst: int = 0
+
+    # Responses smaller than this are not compressed
+    compression_min_size: int = 1024
+    # Seconds to keep cached responses of GET routes
+    response_cache_ttl: int = 60
+    # Larger responses are not cached
+    response_cache_max_body: int = 1024 * 1024
+    # Pages of at least this many items are encoded in the thread pool
+    list_stream_offload_size: int = 50
+    # Seconds responses of requests with an Idempotency-Key are replayed
+    idempotency_window: int = 24 * 3600
+    # Seconds retries get 409 while the first request with the key runs
+    idempotency_lock_ttl: int = 30
+
+    # Job workers to run inside each web worker (0 - only separate workers)
+    jobs_app_workers: int = 0
+    # Seconds before a job that wasn't acknowledged is retried
+    jobs_visibility_timeout: int = 300
+    jobs_max_attempts: int = 3
+    jobs_export_dir: Path = TEMP_DIR / "aichat_common_exports"
+
+    # Event loop lag probe period in seconds (0 - disabled)
+    loop_monitor_interval: float = 0.5
+    # Log the blocking code when the loop is stuck for longer than this
+    loop_slow_callback_ms: float = 100
 
     def model_post_init(self, __context):
         """
@@ -66,8 +209,13 @@ class Settings(BaseSettings):
             self.workers_count = 1
         elif self.environment == "prod":
             self.reload = False
-            cpu_count = multiprocessing.cpu_count()
-            self.workers_count = cpu_count * 2 + 1
+            if "db_create_indexes" not in self.model_fields_set:
+                self.db_create_indexes = False
+            if "workers_count" not in self.model_fields_set:
+                self.workers_count = recommended_workers(
+                    available_cpus(),
+                    self.workers_per_cpu,
+                )
 
     @property
     def db_url(self) -> URL:
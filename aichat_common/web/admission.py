@@ -0,0 +1,274 @@
+import ipaddress
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from aichat_common.db.latency import db_latency
+from aichat_common.metrics import metrics
+from aichat_common.resilience import ResilientRedis
+from aichat_common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Paths that are never limited.
+EXEMPT_PREFIXES = ("/api/health", "/api/metrics", "/api/docs", "/api/redoc", "/static")
+RATE_LIMIT_PREFIX = "ratelimit:"
+# Limit of locally remembered rate limited clients.
+MAX_BLOCKED_CLIENTS = 10000
+# How often the adaptive limit is re-evaluated, in seconds.
+ADAPT_INTERVAL = 1.0
+# Longest time an idle bucket is kept in redis, in milliseconds.
+MAX_BUCKET_TTL_MS = 3600 * 1000
+# IPv6 clients get whole /64 networks, so they can't rotate addresses.
+IPV6_CLIENT_PREFIX = 64
+
+# Token bucket kept in a redis hash.
+# KEYS[1] - bucket key, ARGV[1] - tokens per second, ARGV[2] - bucket size,
+# ARGV[3] - max milliseconds an idle bucket is kept.
+# Returns {allowed, milliseconds until a token is available}.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_ttl = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate / 1000)
+local allowed = 0
+local wait_ms = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait_ms = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.min(math.ceil(burst * 1000 / rate) + 1000, max_ttl))
+return {allowed, wait_ms}
+"""  # noqa: S105
+
+
+def long_lived(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Mark a route whose responses stay open, e.g. server-sent events.
+
+    Such requests don't take one of the `admission_max_in_flight` slots,
+    they are limited by `admission_max_streams` instead.
+
+    :param func: route endpoint.
+    :return: the endpoint.
+    """
+    func.__long_lived__ = True  # type: ignore
+    return func
+
+
+def client_id(scope: Scope) -> str:
+    """
+    Identify the client of a request for rate limiting.
+
+    :param scope: ASGI scope.
+    :return: authenticated user or peer address.
+    """
+    user = scope.get("user")
+    if user is not None and getattr(user, "is_authenticated", False):
+        return f"user:{user.display_name}"
+    client = scope.get("client")
+    if not client:
+        return "ip:unknown"
+    try:
+        address = ipaddress.ip_address(client[0])
+    except ValueError:
+        return f"ip:{client[0]}"
+    if address.version == 6:
+        network = ipaddress.ip_network(f"{address}/{IPV6_CLIENT_PREFIX}", strict=False)
+        return f"ip:{network}"
+    return f"ip:{address}"
+
+
+class AdmissionControlMiddleware:
+    """
+    Admission control for the API.
+
+    Requests are rejected with 503 and `Retry-After` when the worker
+    already serves `admission_max_in_flight` requests, and with 429
+    when the client ran out of tokens in its redis token bucket.
+    A client that was rate limited is rejected locally until its
+    bucket refills, without asking redis again. Clients are the users
+    set by an authentication middleware, otherwise peer addresses,
+    so a client can't get a fresh bucket by changing request headers.
+
+    With `admission_adaptive` the in-flight limit shrinks while mongo
+    latency is above `admission_target_db_latency_ms` and grows back
+    once it recovers. Routes marked with `long_lived` are counted
+    separately against `admission_max_streams`.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.in_flight = 0
+        self.max_in_flight = settings.admission_max_in_flight
+        self.streams = 0
+        self._long_lived_routes: Optional[List[Any]] = None
+        self._last_adapt = 0.0
+        self._blocked_until: Dict[str, float] = {}
+        self._redis: Optional[ResilientRedis] = None
+        self._token_bucket = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Admit a request to the app or reject it.
+
+        :param scope: ASGI scope.
+        :param receive: ASGI receive channel.
+        :param send: ASGI send channel.
+        """
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        stream = self._is_long_lived(scope)
+        if stream:
+            limit, used = settings.admission_max_streams, self.streams
+        else:
+            limit, used = self.max_in_flight, self.in_flight
+        if limit and used >= limit:
+            reason = "streams" if stream else "concurrency"
+            metrics.inc("admission_shed_total", reason=reason)
+            await self._reject(scope, receive, send, 503, retry_after=1)
+            return
+
+        if settings.rate_limit_per_second > 0:
+            retry_after = await self._consume_token(scope)
+            if retry_after is not None:
+                metrics.inc("admission_shed_total", reason="rate_limit")
+                await self._reject(scope, receive, send, 429, retry_after=retry_after)
+                return
+
+        if stream:
+            await self._run_stream(scope, receive, send)
+            return
+        self.in_flight += 1
+        metrics.set_gauge("admission_in_flight", self.in_flight)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            metrics.set_gauge("admission_in_flight", self.in_flight)
+            if settings.admission_adaptive and settings.admission_max_in_flight:
+                self._adapt_limit()
+
+    async def _run_stream(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.streams += 1
+        metrics.set_gauge("admission_streams", self.streams)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.streams -= 1
+            metrics.set_gauge("admission_streams", self.streams)
+
+    def _is_long_lived(self, scope: Scope) -> bool:
+        if self._long_lived_routes is None:
+            self._long_lived_routes = [
+                route
+                for route in scope["app"].routes
+                if hasattr(getattr(route, "endpoint", None), "__long_lived__")
+            ]
+        return any(
+            route.matches(scope)[0] == Match.FULL for route in self._long_lived_routes
+        )
+
+    async def _consume_token(self, scope: Scope) -> Optional[int]:
+        """
+        Take a token from the client's bucket.
+
+        :return: seconds to wait if the client is limited, otherwise None.
+        """
+        identity = client_id(scope)
+        now = time.monotonic()
+        blocked_until = self._blocked_until.get(identity)
+        if blocked_until is not None:
+            if blocked_until > now:
+                metrics.inc("admission_local_rejects_total")
+                return math.ceil(blocked_until - now)
+            del self._blocked_until[identity]
+
+        if self._token_bucket is None:
+            redis_pool = getattr(scope["app"].state, "redis_pool", None)
+            if redis_pool is None:
+                return None
+            self._redis = ResilientRedis(connection_pool=redis_pool)
+            self._token_bucket = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+        rate = settings.rate_limit_per_second
+        burst = settings.rate_limit_burst or math.ceil(rate)
+        try:
+            allowed, wait_ms = await self._token_bucket(
+                keys=[f"{RATE_LIMIT_PREFIX}{identity}"],
+                args=[rate, burst, MAX_BUCKET_TTL_MS],
+            )
+        except Exception as e:
+            # Let requests through when redis is unavailable.
+            logger.warning(f"Rate limiter redis error: {e}")
+            return None
+        if allowed:
+            return None
+        if len(self._blocked_until) > MAX_BLOCKED_CLIENTS:
+            self._blocked_until = {
+                client: until
+                for client, until in self._blocked_until.items()
+                if until > now
+            }
+        self._blocked_until[identity] = now + wait_ms / 1000
+        return max(1, math.ceil(wait_ms / 1000))
+
+    def _adapt_limit(self) -> None:
+        """Additive increase, multiplicative decrease of the in-flight limit."""
+        now = time.monotonic()
+        if now - self._last_adapt < ADAPT_INTERVAL:
+            return
+        self._last_adapt = now
+        upper = settings.admission_max_in_flight
+        lower = min(settings.admission_min_in_flight, upper)
+        if db_latency.ewma_ms > settings.admission_target_db_latency_ms:
+            self.max_in_flight = max(lower, int(self.max_in_flight * 0.9))
+        else:
+            self.max_in_flight = min(upper, self.max_in_flight + 1)
+        metrics.set_gauge("admission_max_in_flight", self.max_in_flight)
+
+    async def _reject(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        status_code: int,
+        retry_after: int,
+    ) -> None:
+        response = JSONResponse(
+            {"detail": "Too many requests, retry later"},
+            status_code=status_code,
+            headers={"Retry-After": str(retry_after)},
+        )
+        await response(scope, receive, send)
+
+
+async def overloaded_handler(request: Request, exc: Exception) -> JSONResponse:
+    """
+    Answer a request that hit a full bulkhead or a deadline with 503.
+
+    :param request: current request.
+    :param exc: BulkheadFullError or DeadlineExceededError.
+    :return: response asking to retry later.
+    """
+    metrics.inc("admission_shed_total", reason=type(exc).__name__)
+    return JSONResponse(
+        {"detail": "Service is overloaded, retry later"},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
@@ -1,6 +1,8 @@
+from datetime import datetime
 from typing import List, Optional
+
 from bson import ObjectId
-from pydantic import BaseModel, ConfigDict, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 
 class BotClothDTO(BaseModel):
@@ -35,6 +37,9 @@ class BotDTO(BaseModel):
     bot_character_background: str
     bot_work_info: str
     bot_clothes: List[BotClothDTO] = []
+    active_cloth_id: Optional[str] = None
+    revision: int = 0
+    deleted_at: Optional[datetime] = None
 
     @field_validator("id", mode="before")
     @classmethod
@@ -122,6 +127,141 @@ class BotPageResponse(BaseModel):
     code: int = 0
 
 
+class BotSearchHitDTO(BaseModel):
+    """DTO for a single bot search result."""
+
+    bot_id: str
+    bot_name: str
+    bot_prop: str
+    score: float = 0.0
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class BotSearchPageDataDTO(BaseModel):
+    """DTO for paginated bot search results."""
+
+    items: List[BotSearchHitDTO]
+    page: int
+    size: int
+    total: int
+    total_pages: int
+
+
+class BotSearchResponse(BaseModel):
+    """Standard API response for a bot search."""
+
+    data: BotSearchPageDataDTO
+    message: Optional[str] = "success"
+    code: int = 0
+
+
+class BotPromptDTO(BaseModel):
+    """DTO for a system prompt rendered from a bot persona."""
+
+    bot_id: str
+    revision: int
+    template: str
+    template_version: int
+    prompt: str
+    token_count: int
+    token_counter: str
+
+
+class BotPromptResponse(BaseModel):
+    """Standard API response for a rendered bot prompt."""
+
+    data: BotPromptDTO
+    message: Optional[str] = "success"
+    code: int = 0
+
+
+class BotClothCreateDTO(BaseModel):
+    """DTO for adding a cloth to a bot's wardrobe."""
+
+    cloth_id: str
+    cloth_description: str
+
+
+class BotActiveClothDTO(BaseModel):
+    """DTO for the cloth a bot is wearing."""
+
+    bot_id: str
+    active_cloth_id: Optional[str] = None
+    cloth: Optional[BotClothDTO] = None
+
+
+class BotActiveClothResponse(BaseModel):
+    """Standard API response for the cloth a bot is wearing."""
+
+    data: BotActiveClothDTO
+    message: Optional[str] = "success"
+    code: int = 0
+
+
+class BotBulkDeleteDTO(BaseModel):
+    """
+    DTO for deleting all bots matching a filter.
+
+    All given conditions must match, at least one is required.
+    """
+
+    bot_ids: Optional[List[str]] = Field(default=None, max_length=1000)
+    bot_name: Optional[str] = None
+    name_prefix: Optional[str] = Field(default=None, min_length=1)
+
+    @model_validator(mode="after")
+    def check_filter(self) -> "BotBulkDeleteDTO":
+        """Refuse an empty filter, it would delete all bots of the tenant."""
+        if self.bot_ids is None and self.bot_name is None and not self.name_prefix:
+            raise ValueError("bot_ids, bot_name or name_prefix is required")
+        return self
+
+
+class BotBulkDeleteDataDTO(BaseModel):
+    """DTO for the result of a bulk delete."""
+
+    deleted: int
+    bot_ids: List[str]
+
+
+class BotBulkDeleteResponse(BaseModel):
+    """Standard API response for a bulk delete."""
+
+    data: BotBulkDeleteDataDTO
+    message: Optional[str] = "success"
+    code: int = 0
+
+
+class BotRevisionDTO(BaseModel):
+    """DTO for a revision in the history of a bot."""
+
+    revision: int
+    checkpoint: bool
+    fields: List[str]
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class BotRevisionPageDataDTO(BaseModel):
+    """DTO for a paginated history of a bot."""
+
+    items: List[BotRevisionDTO]
+    page: int
+    size: int
+    total: int
+    total_pages: int
+
+
+class BotRevisionPageResponse(BaseModel):
+    """Standard API response for the history of a bot."""
+
+    data: BotRevisionPageDataDTO
+    message: Optional[str] = "success"
+    code: int = 0
+
+
 class SetClothInUseDTO(BaseModel):
     """
     DTO for setting a specific cloth as in use for a bot.
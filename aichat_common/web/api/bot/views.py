@@ -1,24 +1,71 @@
-from typing import List
+import json
+from typing import AsyncGenerator, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Path, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    status,
+)
+from fastapi.responses import Response, StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClientSession
 
+from aichat_common.db.consistency import SessionToken, causal_session
+from aichat_common.db.dao.bot_dao import BotAlreadyExistsError, RevisionConflictError
+from aichat_common.db.models.bot_model import Bot, BotCloth
+from aichat_common.services.bot.dependency import (
+    get_bot_event_hub,
+    get_bot_service,
+    get_session_token,
+    get_tenant,
+)
+from aichat_common.services.bot.events import BotEventHub, BotSubscription
+from aichat_common.services.bot.prompt import count_tokens, get_prompt_template
+from aichat_common.services.bot.service import BOT_LIST_TAG, BotService
+from aichat_common.settings import settings
+from aichat_common.web.admission import long_lived
 from aichat_common.web.api.bot.schema import (
-    BotDTO,
+    BotActiveClothDTO,
+    BotActiveClothResponse,
+    BotBulkDeleteDataDTO,
+    BotBulkDeleteDTO,
+    BotBulkDeleteResponse,
+    BotClothCreateDTO,
+    BotClothDTO,
     BotCreateDTO,
-    BotUpdateDTO,
-    BotResponse,
+    BotDTO,
     BotPageDataDTO,
     BotPageResponse,
-    BotClothDTO,
+    BotPromptDTO,
+    BotPromptResponse,
+    BotResponse,
+    BotRevisionDTO,
+    BotRevisionPageDataDTO,
+    BotRevisionPageResponse,
+    BotSearchHitDTO,
+    BotSearchPageDataDTO,
+    BotSearchResponse,
+    BotUpdateDTO,
     SetClothInUseDTO,
 )
-from aichat_common.services.bot.service import BotService
-from aichat_common.services.bot.dependency import get_bot_service
+from aichat_common.web.caching import cache_response
+from aichat_common.web.compression import compress, negotiate_encoding
+from aichat_common.web.idempotency import idempotent
+from aichat_common.web.streaming import stream_json_list
 
 router = APIRouter()
+# Max bots a single event stream can follow.
+MAX_SUBSCRIBED_BOTS = 100
+# Returned by writes, reads presenting it see the write.
+SESSION_TOKEN_HEADER = "X-Session-Token"  # noqa: S105
 
 
 @router.get("/", response_model=BotPageResponse)
+@cache_response(tags=[BOT_LIST_TAG])
 async def list_bots(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
@@ -26,38 +73,129 @@ async def list_bots(
 ):
     """
     List all bots with pagination.
+
+    Bots are serialized while the database cursor returns them.
     """
     offset = (page - 1) * size
-    bots = await bot_service.get_all_bots(limit=size, offset=offset)
     total = await bot_service.get_bots_count()  # Use actual count from DB
     total_pages = (total + size - 1) // size if size else 1
-    items = [BotDTO.model_validate(bot, from_attributes=True) for bot in bots]
     data = BotPageDataDTO(
-        items=items,
+        items=[],
         page=page,
         size=size,
         total=total,
         total_pages=total_pages,
     )
+    return StreamingResponse(
+        stream_json_list(
+            BotPageResponse(data=data),
+            bot_service.iter_all_bots(limit=size, offset=offset),
+            _encode_bot,
+            offload=size >= settings.list_stream_offload_size,
+        ),
+        media_type="application/json",
+    )
 
-    print(data.model_dump())
 
-    return BotPageResponse(data=data)
+def _encode_bot(bot: Bot) -> bytes:
+    return BotDTO.model_validate(bot, from_attributes=True).model_dump_json().encode()
+
+
+@router.get("/search", response_model=BotSearchResponse)
+@cache_response(tags=[BOT_LIST_TAG])
+async def search_bots(
+    q: Optional[str] = Query(None, min_length=1, description="Persona words"),
+    name_prefix: Optional[str] = Query(None, min_length=1, description="Name prefix"),
+    page: int = Query(1, ge=1),
+    size: int = Query(20, ge=1, le=100),
+    bot_service: BotService = Depends(get_bot_service),
+) -> BotSearchResponse:
+    """Search bots by persona words and/or bot name prefix."""
+    if q is None and name_prefix is None:
+        raise HTTPException(status_code=400, detail="q or name_prefix is required")
+    offset = (page - 1) * size
+    hits, total = await bot_service.search_bots(
+        text=q,
+        name_prefix=name_prefix,
+        limit=size,
+        offset=offset,
+    )
+    total_pages = (total + size - 1) // size if size else 1
+    data = BotSearchPageDataDTO(
+        items=[BotSearchHitDTO.model_validate(hit) for hit in hits],
+        page=page,
+        size=size,
+        total=total,
+        total_pages=total_pages,
+    )
+    return BotSearchResponse(data=data)
+
+
+@router.get("/events")
+@long_lived
+async def stream_bot_events(
+    request: Request,
+    bot_id: List[str] = Query(..., description="Bot IDs to follow"),
+    bot_event_hub: BotEventHub = Depends(get_bot_event_hub),
+    tenant: str = Depends(get_tenant),
+) -> StreamingResponse:
+    """
+    Stream changes of bots as server-sent events.
+
+    `updated` events carry the changed fields and the new revision,
+    `deleted` and `restored` events the new revision. After a `resync` event
+    the client has to fetch the bots again, some events were lost.
+    """
+    bot_ids = list(dict.fromkeys(bot_id))
+    if len(bot_ids) > MAX_SUBSCRIBED_BOTS:
+        raise HTTPException(status_code=400, detail="Too many bot ids")
+    subscription = bot_event_hub.subscribe(bot_ids, tenant)
+    return StreamingResponse(
+        _bot_event_stream(request, bot_event_hub, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _bot_event_stream(
+    request: Request,
+    bot_event_hub: BotEventHub,
+    subscription: BotSubscription,
+) -> AsyncGenerator[str, None]:
+    try:
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            event = await subscription.get(timeout=settings.bot_events_heartbeat)
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            data = json.dumps(event, ensure_ascii=False)
+            yield f"event: {event['type']}\ndata: {data}\n\n"
+    finally:
+        bot_event_hub.unsubscribe(subscription)
 
 
 @router.post("/", response_model=BotResponse, status_code=status.HTTP_201_CREATED)
+@idempotent
 async def create_bot(
     bot_in: BotCreateDTO,
+    response: Response,
     bot_service: BotService = Depends(get_bot_service),
 ):
     """
     Create a new bot.
+
+    Retries sent with the same Idempotency-Key get the response of the
+    first request. A bot with the same bot_id that is not deleted is
+    a 409.
     """
-    bot = await bot_service.create_bot(**bot_in.model_dump())
-    print(bot)
+    try:
+        async with causal_session() as session:
+            bot = await bot_service.create_bot(**bot_in.model_dump())
+    except BotAlreadyExistsError as e:
+        raise HTTPException(status_code=409, detail="Bot already exists") from e
 
-    if not bot:
-        raise HTTPException(status_code=500, detail="create bot failed")
+    _set_session_token(response, bot, session)
 
     # Usually, you would return the created object; here, just return a success response.
     return BotResponse(
@@ -69,63 +207,424 @@ async def create_bot(
 
 @router.get("/{bot_id}", response_model=BotResponse)
 async def get_bot(
+    request: Request,
+    response: Response,
     bot_id: str = Path(..., description="Bot ID"),
     bot_service: BotService = Depends(get_bot_service),
+    token: Optional[SessionToken] = Depends(get_session_token),
 ):
     """
     Get a single bot by ID.
+
+    With X-Session-Token returned by a write the bot is at least
+    as new as that write.
+
+    The bot revision is returned as ETag, requests with a matching
+    If-None-Match get 304. Compressed bodies are cached next to the bot,
+    so hot bots are not rendered and compressed on every request.
     """
-    bot = await bot_service.get_bot_by_id(bot_id)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None:
+        cached = await bot_service.get_cached_body(bot_id, encoding, token)
+        if cached is not None:
+            body, revision = cached
+            if _is_not_modified(request, revision):
+                return _not_modified_response(revision)
+            return _encoded_response(body, encoding, revision)
+    bot = await bot_service.get_bot_by_id(bot_id, token)
     if not bot:
         raise HTTPException(status_code=404, detail="Bot not found")
-    return BotResponse(data=BotDTO.model_validate(bot))
+    if _is_not_modified(request, bot.revision):
+        return _not_modified_response(bot.revision)
+    bot_response = BotResponse(data=BotDTO.model_validate(bot))
+    if encoding is None:
+        response.headers["ETag"] = _etag(bot.revision)
+        return bot_response
+    body = bot_response.model_dump_json().encode()
+    if len(body) < settings.compression_min_size:
+        return Response(
+            body,
+            media_type="application/json",
+            headers={"ETag": _etag(bot.revision)},
+        )
+    body = compress(body, encoding)
+    await bot_service.cache_body(bot, encoding, body)
+    return _encoded_response(body, encoding, bot.revision)
+
+
+def _etag(revision: int) -> str:
+    return f'"{revision}"'
+
+
+def _parse_etag(etag: str) -> Optional[int]:
+    """
+    Get bot revision from an ETag.
+
+    :param etag: entity tag, possibly weak.
+    :return: revision or None if it's not an ETag of a bot.
+    """
+    etag = etag.strip()
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    try:
+        return int(etag.strip('"'))
+    except ValueError:
+        return None
+
+
+def _is_not_modified(request: Request, revision: int) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(_parse_etag(etag) == revision for etag in if_none_match.split(","))
+
+
+def _expected_revision(if_match: Optional[str]) -> Optional[int]:
+    """
+    Get the revision a conditional write expects from If-Match.
+
+    :param if_match: value of If-Match header.
+    :raises HTTPException: if it's not an ETag of a bot.
+    :return: revision or None if any revision is fine.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    expected_revision = _parse_etag(if_match)
+    if expected_revision is None:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+    return expected_revision
+
+
+def _conflict(error: RevisionConflictError) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail="Bot was modified by another request",
+        headers={"ETag": _etag(error.revision)},
+    )
+
+
+def _set_session_token(
+    response: Response,
+    bot: Bot,
+    session: Optional[AsyncIOMotorClientSession],
+) -> None:
+    # Without a mongo session (other backends) the revision is the whole token.
+    operation_time = None if session is None else session.operation_time
+    token = SessionToken(bot.revision, operation_time)
+    response.headers[SESSION_TOKEN_HEADER] = token.encode()
+
+
+def _not_modified_response(revision: int) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": _etag(revision)},
+    )
+
+
+def _encoded_response(body: bytes, encoding: str, revision: int) -> Response:
+    return Response(
+        body,
+        media_type="application/json",
+        headers={
+            "Content-Encoding": encoding,
+            "Vary": "Accept-Encoding",
+            "ETag": _etag(revision),
+        },
+    )
+
+
+@router.get("/{bot_id}/prompt", response_model=BotPromptResponse)
+async def get_bot_prompt(
+    bot_id: str = Path(..., description="Bot ID"),
+    template: str = Query("default", description="Prompt template name"),
+    bot_service: BotService = Depends(get_bot_service),
+    token: Optional[SessionToken] = Depends(get_session_token),
+) -> Response:
+    """
+    Get a system prompt rendered from the bot persona.
+
+    The rendered response is cached next to the bot for its revision
+    and the template version, so chat turns get it in one cache hit.
+    """
+    prompt_template = get_prompt_template(template)
+    if prompt_template is None:
+        raise HTTPException(status_code=400, detail="Unknown prompt template")
+    cached = await bot_service.get_cached_body(
+        bot_id,
+        prompt_template.cache_variant,
+        token,
+    )
+    if cached is not None:
+        return Response(cached[0], media_type="application/json")
+    bot = await bot_service.get_bot_by_id(bot_id, token)
+    if not bot:
+        raise HTTPException(status_code=404, detail="Bot not found")
+    prompt = prompt_template.render(bot)
+    token_count, token_counter = count_tokens(prompt)
+    response = BotPromptResponse(
+        data=BotPromptDTO(
+            bot_id=bot.bot_id,
+            revision=bot.revision,
+            template=prompt_template.name,
+            template_version=prompt_template.version,
+            prompt=prompt,
+            token_count=token_count,
+            token_counter=token_counter,
+        ),
+    )
+    body = response.model_dump_json().encode()
+    await bot_service.cache_body(bot, prompt_template.cache_variant, body)
+    return Response(body, media_type="application/json")
 
 
 @router.patch("/{bot_id}", response_model=BotResponse)
 async def update_bot(
     bot_id: str,
     bot_update: BotUpdateDTO,
+    response: Response,
+    if_match: Optional[str] = Header(None, description="ETag of the bot"),
     bot_service: BotService = Depends(get_bot_service),
 ):
     """
     Update a bot by ID.
+
+    With If-Match the update is applied only if the bot wasn't changed
+    since the given ETag, otherwise 409 is returned with the current ETag.
     """
     update_fields = {k: v for k, v in bot_update.model_dump().items() if v is not None}
     if not update_fields:
         raise HTTPException(status_code=400, detail="No fields to update")
-    updated_bot = await bot_service.update_bot(bot_id, update_fields)
+    try:
+        async with causal_session() as session:
+            updated_bot = await bot_service.update_bot(
+                bot_id,
+                update_fields,
+                expected_revision=_expected_revision(if_match),
+            )
+    except RevisionConflictError as e:
+        raise _conflict(e) from e
     if not updated_bot:
         raise HTTPException(status_code=404, detail="Bot not found")
+    response.headers["ETag"] = _etag(updated_bot.revision)
+    _set_session_token(response, updated_bot, session)
     return BotResponse(data=BotDTO.model_validate(updated_bot))
 
 
 @router.delete("/{bot_id}", response_model=BotResponse)
 async def delete_bot(
     bot_id: str,
+    response: Response,
     bot_service: BotService = Depends(get_bot_service),
 ):
     """
     Delete a bot by ID.
     """
-    deleted_bot = await bot_service.delete_bot(bot_id)
+    async with causal_session() as session:
+        deleted_bot = await bot_service.delete_bot(bot_id)
     if not deleted_bot:
         raise HTTPException(status_code=404, detail="Bot not found")
-    return BotResponse(data=BotDTO.model_validate(deleted_bot), message="Bot deleted")
+    _set_session_token(response, deleted_bot, session)
+    return BotResponse(
+        data=BotDTO.model_validate(deleted_bot, from_attributes=True),
+        message="Bot deleted",
+    )
+
+
+@router.post("/bulk-delete", response_model=BotBulkDeleteResponse)
+async def delete_bots(
+    filter_in: BotBulkDeleteDTO,
+    bot_service: BotService = Depends(get_bot_service),
+) -> BotBulkDeleteResponse:
+    """Delete all bots matching a filter."""
+    deleted_bots = await bot_service.delete_bots(
+        bot_ids=filter_in.bot_ids,
+        bot_name=filter_in.bot_name,
+        name_prefix=filter_in.name_prefix,
+    )
+    return BotBulkDeleteResponse(
+        data=BotBulkDeleteDataDTO(
+            deleted=len(deleted_bots),
+            bot_ids=[bot.bot_id for bot in deleted_bots],
+        ),
+        message="Bots deleted",
+    )
+
+
+@router.post("/{bot_id}/restore", response_model=BotResponse)
+async def restore_bot(
+    bot_id: str,
+    response: Response,
+    bot_service: BotService = Depends(get_bot_service),
+) -> BotResponse:
+    """Restore a deleted bot, until it is purged."""
+    async with causal_session() as session:
+        restored_bot = await bot_service.restore_bot(bot_id)
+    if not restored_bot:
+        raise HTTPException(status_code=404, detail="Deleted bot not found")
+    _set_session_token(response, restored_bot, session)
+    return BotResponse(
+        data=BotDTO.model_validate(restored_bot, from_attributes=True),
+        message="Bot restored",
+    )
 
 
 @router.post("/{bot_id}/clothes/use", response_model=BotResponse)
 async def set_cloth_in_use(
     bot_id: str,
     params: SetClothInUseDTO,
+    response: Response,
     bot_service: BotService = Depends(get_bot_service),
 ):
     """
     Set a specific cloth as in use for a bot.
     """
-    updated_bot = await bot_service.set_cloth_in_use(bot_id, params.cloth_id)
+    async with causal_session() as session:
+        updated_bot = await bot_service.set_cloth_in_use(bot_id, params.cloth_id)
     if not updated_bot:
         raise HTTPException(status_code=404, detail="Bot or cloth not found")
+    _set_session_token(response, updated_bot, session)
     return BotResponse(
         data=BotDTO.model_validate(updated_bot, from_attributes=True),
         message="Cloth set in use",
     )
+
+
+@router.get("/{bot_id}/clothes/active", response_model=BotActiveClothResponse)
+async def get_active_cloth(
+    bot_id: str,
+    bot_service: BotService = Depends(get_bot_service),
+) -> BotActiveClothResponse:
+    """Get the cloth a bot is wearing."""
+    active = await bot_service.get_active_cloth(bot_id)
+    if not active:
+        raise HTTPException(status_code=404, detail="Bot not found")
+    cloth = active.bot_clothes[0] if active.bot_clothes else None
+    return BotActiveClothResponse(
+        data=BotActiveClothDTO(
+            bot_id=active.bot_id,
+            active_cloth_id=active.active_cloth_id,
+            cloth=BotClothDTO.model_validate(cloth, from_attributes=True)
+            if cloth
+            else None,
+        ),
+    )
+
+
+@router.post(
+    "/{bot_id}/clothes",
+    response_model=BotResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def add_cloth(
+    bot_id: str,
+    cloth_in: BotClothCreateDTO,
+    response: Response,
+    bot_service: BotService = Depends(get_bot_service),
+) -> BotResponse:
+    """Add a cloth to a bot's wardrobe."""
+    async with causal_session() as session:
+        updated_bot = await bot_service.add_cloth(
+            bot_id,
+            BotCloth(**cloth_in.model_dump()),
+        )
+    if not updated_bot:
+        if await bot_service.get_bot_by_id(bot_id):
+            raise HTTPException(status_code=409, detail="Cloth already exists")
+        raise HTTPException(status_code=404, detail="Bot not found")
+    _set_session_token(response, updated_bot, session)
+    return BotResponse(
+        data=BotDTO.model_validate(updated_bot, from_attributes=True),
+        message="Cloth added",
+    )
+
+
+@router.delete("/{bot_id}/clothes/{cloth_id}", response_model=BotResponse)
+async def remove_cloth(
+    bot_id: str,
+    cloth_id: str,
+    response: Response,
+    bot_service: BotService = Depends(get_bot_service),
+) -> BotResponse:
+    """Remove a cloth from a bot's wardrobe."""
+    async with causal_session() as session:
+        updated_bot = await bot_service.remove_cloth(bot_id, cloth_id)
+    if not updated_bot:
+        raise HTTPException(status_code=404, detail="Bot or cloth not found")
+    _set_session_token(response, updated_bot, session)
+    return BotResponse(
+        data=BotDTO.model_validate(updated_bot, from_attributes=True),
+        message="Cloth removed",
+    )
+
+
+@router.get("/{bot_id}/revisions", response_model=BotRevisionPageResponse)
+async def list_bot_revisions(
+    bot_id: str,
+    page: int = Query(1, ge=1),
+    size: int = Query(20, ge=1, le=100),
+    bot_service: BotService = Depends(get_bot_service),
+) -> BotRevisionPageResponse:
+    """List the history of a bot, newest revisions first."""
+    revisions, total = await bot_service.get_bot_revisions(
+        bot_id,
+        limit=size,
+        offset=(page - 1) * size,
+    )
+    if not total:
+        raise HTTPException(status_code=404, detail="Bot not found")
+    data = BotRevisionPageDataDTO(
+        items=[BotRevisionDTO.model_validate(revision) for revision in revisions],
+        page=page,
+        size=size,
+        total=total,
+        total_pages=(total + size - 1) // size,
+    )
+    return BotRevisionPageResponse(data=data)
+
+
+@router.get("/{bot_id}/revisions/{revision}", response_model=BotResponse)
+async def get_bot_revision(
+    bot_id: str,
+    revision: int = Path(..., ge=0, description="Revision of the bot"),
+    bot_service: BotService = Depends(get_bot_service),
+) -> BotResponse:
+    """Get a bot as it was at a revision."""
+    bot = await bot_service.get_bot_at_revision(bot_id, revision)
+    if not bot:
+        raise HTTPException(status_code=404, detail="Bot revision not found")
+    return BotResponse(data=BotDTO.model_validate(bot, from_attributes=True))
+
+
+@router.post("/{bot_id}/revisions/{revision}/rollback", response_model=BotResponse)
+async def rollback_bot(
+    response: Response,
+    bot_id: str,
+    revision: int = Path(..., ge=0, description="Revision to roll back to"),
+    if_match: Optional[str] = Header(None, description="ETag of the bot"),
+    bot_service: BotService = Depends(get_bot_service),
+) -> BotResponse:
+    """
+    Bring persona and clothes of a bot back to a revision.
+
+    The rollback is saved as a new revision. With If-Match it is applied
+    only if the bot wasn't changed since the given ETag.
+    """
+    try:
+        async with causal_session() as session:
+            bot = await bot_service.rollback_bot(
+                bot_id,
+                revision,
+                expected_revision=_expected_revision(if_match),
+            )
+    except RevisionConflictError as e:
+        raise _conflict(e) from e
+    if not bot:
+        raise HTTPException(status_code=404, detail="Bot revision not found")
+    response.headers["ETag"] = _etag(bot.revision)
+    _set_session_token(response, bot, session)
+    return BotResponse(
+        data=BotDTO.model_validate(bot, from_attributes=True),
+        message="Bot rolled back",
+    )
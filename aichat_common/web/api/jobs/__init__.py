@@ -0,0 +1,5 @@
+"""Background jobs API."""
+
+from aichat_common.web.api.jobs.views import router
+
+__all__ = ["router"]
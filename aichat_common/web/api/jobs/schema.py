@@ -0,0 +1,35 @@
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+
+class JobSubmitDTO(BaseModel):
+    """DTO for submitting a background job."""
+
+    type: str
+    params: dict = {}
+
+
+class JobDTO(BaseModel):
+    """DTO for returning state of a background job."""
+
+    job_id: str
+    type: str
+    tenant: Optional[str] = None
+    params: dict
+    status: str
+    attempts: int
+    progress: int
+    total: int
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
+class JobResponse(BaseModel):
+    """Standard API response for a single job."""
+
+    data: JobDTO
+    message: Optional[str] = "success"
+    code: int = 0
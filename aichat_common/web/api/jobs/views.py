@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, status
+
+from aichat_common.services.bot.dependency import get_tenant
+from aichat_common.services.jobs.dependency import get_job_queue
+from aichat_common.services.jobs.handlers import ADMIN_JOB_TYPES
+from aichat_common.services.jobs.queue import JobQueue, UnknownJobTypeError
+from aichat_common.web.api.jobs.schema import JobDTO, JobResponse, JobSubmitDTO
+
+router = APIRouter()
+
+
+@router.post("/", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    job_in: JobSubmitDTO,
+    job_queue: JobQueue = Depends(get_job_queue),
+    tenant: str = Depends(get_tenant),
+) -> JobResponse:
+    """
+    Submit a background job.
+
+    Bot jobs work with bots of the tenant from X-Tenant-ID header.
+    Jobs spanning all tenants are refused with 403, they are submitted
+    by operators from the command line.
+    """
+    if job_in.type in ADMIN_JOB_TYPES:
+        raise HTTPException(
+            status_code=403,
+            detail="Job type can only be submitted by operators",
+        )
+    params = {**job_in.params, "tenant": tenant}
+    try:
+        job_id = await job_queue.submit(job_in.type, params, tenant=tenant)
+    except UnknownJobTypeError as e:
+        raise HTTPException(status_code=400, detail="Unknown job type") from e
+    job = await job_queue.get_job(job_id)
+    return JobResponse(data=JobDTO(**job), message="Job submitted")
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str = Path(..., description="Job ID"),
+    job_queue: JobQueue = Depends(get_job_queue),
+    tenant: str = Depends(get_tenant),
+) -> JobResponse:
+    """
+    Get status and progress of a background job.
+
+    Jobs submitted by other tenants or by operators are not found.
+    """
+    job = await job_queue.get_job(job_id)
+    if job is None or job["tenant"] != tenant:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(data=JobDTO(**job))
@@ -1,5 +1,9 @@
+from typing import Dict
+
 from fastapi import APIRouter
 
+from aichat_common.metrics import metrics
+
 router = APIRouter()
 
 
@@ -10,3 +14,13 @@ def health_check() -> None:
 
     It returns 200 if the project is healthy.
     """
+
+
+@router.get("/metrics")
+def get_metrics() -> Dict[str, Dict[str, float]]:
+    """
+    Returns metrics of the current worker process.
+
+    :return: counters and gauges.
+    """
+    return metrics.snapshot()
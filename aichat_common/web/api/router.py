@@ -1,10 +1,19 @@
+from importlib import import_module
+
 from fastapi.routing import APIRouter
-from aichat_common.web.api import docs, dummy, echo, monitoring, redis, bot
+
+from aichat_common.settings import settings
+from aichat_common.web.api import bot, docs, jobs, monitoring, redis
 
 api_router = APIRouter()
 api_router.include_router(monitoring.router)
 api_router.include_router(docs.router)
-api_router.include_router(echo.router, prefix="/echo", tags=["echo"])
-api_router.include_router(dummy.router, prefix="/dummy", tags=["dummy"])
+if settings.dev_routers:
+    # Example routers are imported only when they are mounted.
+    echo = import_module("aichat_common.web.api.echo")
+    dummy = import_module("aichat_common.web.api.dummy")
+    api_router.include_router(echo.router, prefix="/echo", tags=["echo"])
+    api_router.include_router(dummy.router, prefix="/dummy", tags=["dummy"])
 api_router.include_router(redis.router, prefix="/redis", tags=["redis"])
 api_router.include_router(bot.router, prefix="/bots", tags=["bot"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
@@ -1,25 +1,52 @@
+import time
 from importlib import metadata
 from pathlib import Path
 
-from fastapi import FastAPI
-from fastapi.responses import UJSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, UJSONResponse
 from fastapi.staticfiles import StaticFiles
 
+from aichat_common.db.dao.snapshot_bot_dao import SnapshotUnsupportedError
 from aichat_common.log import configure_logging
+from aichat_common.metrics import metrics
+from aichat_common.resilience import BulkheadFullError, DeadlineExceededError
+from aichat_common.web.admission import AdmissionControlMiddleware, overloaded_handler
 from aichat_common.web.api.router import api_router
+from aichat_common.web.caching import ResponseCacheMiddleware
+from aichat_common.web.compression import CompressionMiddleware
+from aichat_common.web.idempotency import IdempotencyMiddleware
 from aichat_common.web.lifespan import lifespan_setup
 
 APP_ROOT = Path(__file__).parent.parent
 
 
+async def snapshot_unsupported_handler(
+    request: Request,
+    exc: SnapshotUnsupportedError,
+) -> JSONResponse:
+    """
+    Answer a request a bot snapshot can't serve with 405.
+
+    :param request: current request.
+    :param exc: error naming the operation.
+    :return: error response.
+    """
+    return JSONResponse({"detail": str(exc)}, status_code=405)
+
+
 def get_app() -> FastAPI:
     """
     Get FastAPI application.
 
     This is the main constructor of an application.
 
+    Everything imported here is imported once in gunicorn master
+    when `preload_app` is on, connections are only created
+    in the lifespan of each worker.
+
     :return: application.
     """
+    started = time.perf_counter()
     configure_logging()
     app = FastAPI(
         title="aichat_common",
@@ -31,10 +58,28 @@ def get_app() -> FastAPI:
         default_response_class=UJSONResponse,
     )
 
+    # Replays of routes marked with `idempotent`, stored uncompressed.
+    app.add_middleware(IdempotencyMiddleware)
+    # Negotiated gzip/br/zstd compression of responses.
+    app.add_middleware(CompressionMiddleware)
+    # Responses of routes marked with `cache_response`, stored compressed.
+    app.add_middleware(ResponseCacheMiddleware)
+    # Rate limiting and load shedding.
+    app.add_middleware(AdmissionControlMiddleware)
+    # Mongo is too slow or busy for this request.
+    app.add_exception_handler(BulkheadFullError, overloaded_handler)
+    app.add_exception_handler(DeadlineExceededError, overloaded_handler)
+    # Bots are served from a read-only snapshot.
+    app.add_exception_handler(
+        SnapshotUnsupportedError,
+        snapshot_unsupported_handler,  # type: ignore
+    )
+
     # Main router for the API.
     app.include_router(router=api_router, prefix="/api")
     # Adds static directory.
     # This directory is used to access swagger files.
     app.mount("/static", StaticFiles(directory=APP_ROOT / "static"), name="static")
 
+    metrics.set_gauge("startup_seconds", time.perf_counter() - started, step="app")
     return app
@@ -0,0 +1,232 @@
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from aichat_common.db.models.bot_model import DEFAULT_TENANT
+from aichat_common.metrics import metrics
+from aichat_common.resilience import ResilientRedis
+from aichat_common.response_cache import CachedResponse, ResponseCache
+from aichat_common.settings import settings
+from aichat_common.web.compression import negotiate_encoding
+
+logger = logging.getLogger(__name__)
+
+# Request headers every cached response depends on.
+DEFAULT_VARY = ("accept-encoding", "x-tenant-id")
+CACHE_STATUS = "aichat"
+
+
+class CachePolicy:
+    """How responses of a route are cached."""
+
+    def __init__(
+        self,
+        tags: Sequence[str],
+        ttl: Optional[int],
+        vary: Sequence[str],
+    ) -> None:
+        self.tags = tags
+        self.ttl = ttl
+        self.vary = tuple(DEFAULT_VARY) + tuple(name.lower() for name in vary)
+
+
+def cache_response(
+    tags: Sequence[str] = (),
+    ttl: Optional[int] = None,
+    vary: Sequence[str] = (),
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Cache successful responses of a GET route in redis.
+
+    Responses are keyed by the path, sorted query params and values
+    of `vary` request headers (plus Accept-Encoding and X-Tenant-ID).
+    Tags are formatted with path params and `tenant`, e.g.
+    "bots:list:{tenant}", pass them to `ResponseCache.invalidate`
+    to drop the responses after a write.
+
+    :param tags: tags of the cached responses.
+    :param ttl: seconds to keep responses, `response_cache_ttl` by default.
+    :param vary: other request headers the response depends on.
+    :return: decorator of a route endpoint.
+    """
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        func.__response_cache__ = CachePolicy(tags, ttl, vary)  # type: ignore
+        return func
+
+    return decorator
+
+
+def _vary_value(name: str, headers: Headers) -> str:
+    value = headers.get(name, "")
+    if name == "accept-encoding":
+        # Clients that get the same encoding share the entry.
+        return negotiate_encoding(value) or "identity"
+    if name == "x-tenant-id":
+        return value or DEFAULT_TENANT
+    return value.strip()
+
+
+class ResponseCacheMiddleware:
+    """
+    Serve responses of routes decorated with `cache_response` from redis.
+
+    Every response of such a route gets a `Cache-Status` header
+    (RFC 9211) telling whether it was a hit, and `Age` on hits.
+    Requests with `Cache-Control: no-cache` or `X-Session-Token`
+    skip the lookup but refresh the entry.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._policies: Optional[List[Tuple[Any, CachePolicy]]] = None
+        self._cache: Optional[ResponseCache] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Serve a GET request from the cache or store its response.
+
+        :param scope: ASGI scope.
+        :param receive: ASGI receive channel.
+        :param send: ASGI send channel.
+        """
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        matched = self._match(scope)
+        cache = self._get_cache(scope)
+        if matched is None or cache is None:
+            await self.app(scope, receive, send)
+            return
+        policy, path_params = matched
+        headers = Headers(scope=scope)
+        tenant = _vary_value("x-tenant-id", headers)
+        tags = [tag.format(tenant=tenant, **path_params) for tag in policy.tags]
+        query = sorted(parse_qsl(scope["query_string"].decode("latin-1"), True))
+        key = cache.key(
+            scope["path"],
+            urlencode(query),
+            *(f"{name}={_vary_value(name, headers)}" for name in policy.vary),
+        )
+
+        # Read-your-writes requests must not get a response older than the write.
+        no_cache = (
+            "no-cache" in headers.get("cache-control", "")
+            or "x-session-token" in headers
+        )
+        try:
+            cached, versions = await cache.lookup(key, tags)
+        except Exception as e:
+            logger.warning(f"Response cache redis error: {e}")
+            await self.app(scope, receive, send)
+            return
+        if cached is not None and not no_cache:
+            metrics.inc("response_cache_requests_total", result="hit")
+            await self._send_cached(cached, send)
+            return
+        metrics.inc("response_cache_requests_total", result="miss")
+        responder = _CachingResponder(send, "fwd=request" if no_cache else "fwd=miss")
+        await self.app(scope, receive, responder.send)
+        response = responder.cached_response()
+        if response is None:
+            return
+        try:
+            await cache.store(
+                key,
+                tags,
+                versions,
+                response,
+                policy.ttl or settings.response_cache_ttl,
+            )
+        except Exception as e:
+            logger.warning(f"Response cache redis error: {e}")
+
+    def _match(self, scope: Scope) -> Optional[Tuple[CachePolicy, Dict[str, Any]]]:
+        if self._policies is None:
+            self._policies = [
+                (route, route.endpoint.__response_cache__)
+                for route in scope["app"].routes
+                if hasattr(getattr(route, "endpoint", None), "__response_cache__")
+            ]
+        for route, policy in self._policies:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return policy, child_scope.get("path_params", {})
+        return None
+
+    def _get_cache(self, scope: Scope) -> Optional[ResponseCache]:
+        if self._cache is None:
+            redis_pool = getattr(scope["app"].state, "redis_pool", None)
+            if redis_pool is None:
+                return None
+            self._cache = ResponseCache(ResilientRedis(connection_pool=redis_pool))
+        return self._cache
+
+    async def _send_cached(self, cached: CachedResponse, send: Send) -> None:
+        headers = MutableHeaders(raw=list(cached.headers))
+        headers["Cache-Status"] = f"{CACHE_STATUS}; hit"
+        headers["Age"] = str(max(0, int(time.time() - cached.stored_at)))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": cached.status,
+                "headers": headers.raw,
+            },
+        )
+        await send({"type": "http.response.body", "body": cached.body})
+
+
+class _CachingResponder:
+    """Sends a response through while keeping a copy of it."""
+
+    def __init__(self, send: Send, cache_status: str) -> None:
+        self._send = send
+        self.cache_status = cache_status
+        self.status = 0
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.body: List[bytes] = []
+        self.size = 0
+        self.cacheable = False
+        self.complete = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            self.headers = list(message.get("headers", []))
+            cache_control = Headers(raw=self.headers).get("cache-control", "")
+            self.cacheable = self.status == 200 and not any(
+                directive in cache_control for directive in ("no-store", "private")
+            )
+            headers = MutableHeaders(raw=list(self.headers))
+            headers["Cache-Status"] = f"{CACHE_STATUS}; {self.cache_status}"
+            message = {**message, "headers": headers.raw}
+        elif message["type"] == "http.response.body" and self.cacheable:
+            body = message.get("body", b"")
+            self.size += len(body)
+            if self.size > settings.response_cache_max_body:
+                self.cacheable = False
+                self.body = []
+            else:
+                self.body.append(body)
+            self.complete = not message.get("more_body", False)
+        await self._send(message)
+
+    def cached_response(self) -> Optional[CachedResponse]:
+        """
+        Get the response to cache.
+
+        :return: the response or None if it must not be cached.
+        """
+        if not self.cacheable or not self.complete:
+            return None
+        return CachedResponse(
+            status=self.status,
+            headers=self.headers,
+            body=b"".join(self.body),
+            stored_at=time.time(),
+        )
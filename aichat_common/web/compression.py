@@ -0,0 +1,198 @@
+import zlib
+from typing import Any, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from aichat_common.settings import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # type: ignore
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# Streams must reach clients as soon as they are produced.
+STREAMING_TYPES = ("text/event-stream",)
+
+
+def supported_encodings() -> List[str]:
+    """
+    List encodings the server can produce, most preferred first.
+
+    Brotli and zstd are used only if their packages are installed.
+
+    :return: list of encodings.
+    """
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Choose response encoding from the Accept-Encoding header.
+
+    :param accept_encoding: value of Accept-Encoding header.
+    :return: chosen encoding or None if nothing acceptable is supported.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    candidates: List[Tuple[float, int, str]] = []
+    for rank, encoding in enumerate(supported_encodings()):
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            candidates.append((quality, -rank, encoding))
+    if not candidates:
+        return None
+    return max(candidates)[2]
+
+
+class _Compressor:
+    """Incremental compressor for one of supported encodings."""
+
+    def __init__(self, encoding: str) -> None:
+        self._obj: Any
+        if encoding == "gzip":
+            self._obj = zlib.compressobj(6, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=5)
+        else:
+            self._obj = zstandard.ZstdCompressor(level=3).compressobj()
+        self.encoding = encoding
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._obj.process(data)
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        """Get everything compressed so far, the stream can be continued."""
+        if self.encoding == "gzip":
+            return self._obj.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._obj.flush()
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """
+    Compress a whole body.
+
+    :param data: body to compress.
+    :param encoding: one of supported encodings.
+    :return: compressed body.
+    """
+    compressor = _Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Negotiated gzip/brotli/zstd response compression.
+
+    Responses smaller than `compression_min_size`, responses of
+    non-text types and responses that are already encoded
+    (e.g. precompressed bot bodies) are sent as is.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Compress the response in the encoding the client accepts.
+
+        :param scope: ASGI scope.
+        :param receive: ASGI receive channel.
+        :param send: ASGI send channel.
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(send, encoding)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, send: Send, encoding: str) -> None:
+        self._send = send
+        self.encoding = encoding
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or content_type.startswith(STREAMING_TYPES)
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        # The first chunk decides if the whole response is compressed.
+        if (
+            self.start_message is not None
+            and not self.passthrough
+            and (more_body or len(body) >= settings.compression_min_size)
+        ):
+            self.compressor = _Compressor(self.encoding)
+        if self.compressor is not None:
+            body = self.compressor.compress(body)
+            # Chunks of streamed responses are sent as they are produced.
+            if more_body:
+                body += self.compressor.flush()
+            else:
+                body += self.compressor.finish()
+        if self.start_message is not None:
+            if self.compressor is not None:
+                headers = MutableHeaders(raw=self.start_message["headers"])
+                headers["Content-Encoding"] = self.encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+            await self._send(self.start_message)
+            self.start_message = None
+        await self._send(
+            {"type": "http.response.body", "body": body, "more_body": more_body},
+        )
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from aichat_common.db.models.bot_model import DEFAULT_TENANT
+from aichat_common.idempotency import (
+    IdempotencyKeyInUseError,
+    IdempotencyKeyReusedError,
+    IdempotencyStore,
+)
+from aichat_common.metrics import metrics
+from aichat_common.resilience import ResilientRedis
+from aichat_common.response_cache import CachedResponse
+from aichat_common.settings import settings
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_HEADER = "idempotency-key"
+# Keys are chosen by clients, longer ones are refused.
+MAX_KEY_LENGTH = 255
+
+
+def idempotent(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Deduplicate requests of a route sent with an Idempotency-Key header.
+
+    The response of the first request with a key is stored for
+    `idempotency_window` seconds and returned to retries with the same
+    key and body, with `Idempotent-Replayed: true`, without running the
+    route again. Keys are scoped by tenant, method and path.
+
+    :param func: route endpoint.
+    :return: the endpoint.
+    """
+    func.__idempotent__ = True  # type: ignore
+    return func
+
+
+def _error(status: int, detail: str, headers: Optional[dict] = None) -> Message:
+    return {
+        "status": status,
+        "headers": MutableHeaders(
+            {"content-type": "application/json", **(headers or {})},
+        ).raw,
+        "body": json.dumps({"detail": detail}).encode(),
+    }
+
+
+class IdempotencyMiddleware:
+    """
+    Replay responses of routes decorated with `idempotent` to retries.
+
+    A retry that comes while the first request is running gets 409,
+    a request reusing a key with another body gets 422. Responses
+    with 5xx statuses are not stored, the request can be retried.
+    When redis is down requests run without deduplication.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._routes: Optional[List[Any]] = None
+        self._store: Optional[IdempotencyStore] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Run a request, or replay the response stored for its key.
+
+        :param scope: ASGI scope.
+        :param receive: ASGI receive channel.
+        :param send: ASGI send channel.
+        """
+        if scope["type"] != "http" or scope["method"] == "GET":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get(IDEMPOTENCY_KEY_HEADER)
+        store = self._get_store(scope)
+        if not idempotency_key or store is None or not self._match(scope):
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            await self._send(
+                _error(400, f"Idempotency-Key is longer than {MAX_KEY_LENGTH}"),
+                send,
+            )
+            return
+
+        body, receive = await _buffer_body(receive)
+        key = store.key(
+            headers.get("x-tenant-id") or DEFAULT_TENANT,
+            scope["method"],
+            scope["path"],
+            idempotency_key,
+        )
+        fingerprint = hashlib.sha256(body).hexdigest()
+        try:
+            stored = await store.claim(key, fingerprint)
+        except IdempotencyKeyInUseError:
+            metrics.inc("idempotency_requests_total", result="in_progress")
+            await self._send(
+                _error(
+                    409,
+                    "A request with this Idempotency-Key is in progress",
+                    {"Retry-After": "1"},
+                ),
+                send,
+            )
+        except IdempotencyKeyReusedError:
+            metrics.inc("idempotency_requests_total", result="reused")
+            await self._send(
+                _error(422, "Idempotency-Key was used with another request"),
+                send,
+            )
+        except Exception as e:
+            logger.warning(f"Idempotency redis error: {e}")
+            metrics.inc("idempotency_requests_total", result="unavailable")
+            await self.app(scope, receive, send)
+        else:
+            if stored is not None:
+                await self._replay(stored, send)
+            else:
+                await self._run_and_store(
+                    scope,
+                    receive,
+                    send,
+                    store,
+                    key,
+                    fingerprint,
+                )
+
+    async def _run_and_store(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        store: IdempotencyStore,
+        key: str,
+        fingerprint: str,
+    ) -> None:
+        """
+        Run the first request with a key and store its response.
+
+        :param store: store holding the claim.
+        :param key: claimed redis key.
+        :param fingerprint: hash of the request body.
+        """
+        metrics.inc("idempotency_requests_total", result="new")
+        recorder = _RecordingResponder(send)
+        try:
+            await self.app(scope, receive, recorder.send)
+        finally:
+            response = recorder.recorded_response()
+            try:
+                if response is None:
+                    await store.release(key)
+                else:
+                    await store.complete(key, fingerprint, response)
+            except Exception as e:
+                logger.warning(f"Idempotency redis error: {e}")
+
+    def _match(self, scope: Scope) -> bool:
+        if self._routes is None:
+            self._routes = [
+                route
+                for route in scope["app"].routes
+                if hasattr(getattr(route, "endpoint", None), "__idempotent__")
+            ]
+        return any(route.matches(scope)[0] == Match.FULL for route in self._routes)
+
+    def _get_store(self, scope: Scope) -> Optional[IdempotencyStore]:
+        if self._store is None:
+            redis_pool = getattr(scope["app"].state, "redis_pool", None)
+            if redis_pool is None:
+                return None
+            self._store = IdempotencyStore(
+                ResilientRedis(connection_pool=redis_pool),
+                window=settings.idempotency_window,
+                lock_ttl=settings.idempotency_lock_ttl,
+            )
+        return self._store
+
+    async def _send(self, response: Message, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response["status"],
+                "headers": response["headers"],
+            },
+        )
+        await send({"type": "http.response.body", "body": response["body"]})
+
+    async def _replay(self, stored: CachedResponse, send: Send) -> None:
+        metrics.inc("idempotency_requests_total", result="replayed")
+        headers = MutableHeaders(raw=list(stored.headers))
+        headers["Idempotent-Replayed"] = "true"
+        headers["Age"] = str(max(0, int(time.time() - stored.stored_at)))
+        await self._send(
+            {"status": stored.status, "headers": headers.raw, "body": stored.body},
+            send,
+        )
+
+
+async def _buffer_body(receive: Receive) -> Tuple[bytes, Receive]:
+    """
+    Read the whole request body.
+
+    :param receive: receive of the request.
+    :return: the body and a receive giving it to the route.
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    body = b"".join(chunks)
+    replayed = False
+
+    async def replay() -> Message:
+        nonlocal replayed
+        if replayed:
+            return await receive()
+        replayed = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return body, replay
+
+
+class _RecordingResponder:
+    """Sends a response through while keeping a copy of it."""
+
+    def __init__(self, send: Send) -> None:
+        self._send = send
+        self.status = 0
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.body: List[bytes] = []
+        self.complete = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            self.headers = list(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            self.body.append(message.get("body", b""))
+            self.complete = not message.get("more_body", False)
+        await self._send(message)
+
+    def recorded_response(self) -> Optional[CachedResponse]:
+        """
+        Get the response to keep for retries.
+
+        :return: the response or None if the request has to run again.
+        """
+        if not self.complete or self.status >= 500:
+            return None
+        return CachedResponse(
+            status=self.status,
+            headers=self.headers,
+            body=b"".join(self.body),
+            stored_at=time.time(),
+        )
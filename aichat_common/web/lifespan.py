@@ -1,23 +1,64 @@
-from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncGenerator, Dict, Iterator
 
 import beanie
 from fastapi import FastAPI
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from aichat_common.db.latency import db_latency
 from aichat_common.db.models import load_all_models
+from aichat_common.loop_monitor import LoopMonitor
+from aichat_common.metrics import metrics
+from aichat_common.runtime import available_cpus
+from aichat_common.services.bot.lifespan import (
+    init_bot_events,
+    init_bot_service,
+    init_bot_watcher,
+    shutdown_bot_events,
+    shutdown_bot_service,
+    shutdown_bot_watcher,
+)
+from aichat_common.services.jobs.lifespan import init_jobs, shutdown_jobs
 from aichat_common.services.redis.lifespan import init_redis, shutdown_redis
-from aichat_common.services.bot.lifespan import init_bot_service, shutdown_bot_service
-from aichat_common.settings import settings
+from aichat_common.settings import BotBackend, settings
+
+logger = logging.getLogger(__name__)
 
 
 async def _setup_db(app: FastAPI) -> None:
-    client = AsyncIOMotorClient(str(settings.db_url))  # type: ignore
+    client = AsyncIOMotorClient(  # type: ignore
+        str(settings.db_url),
+        event_listeners=[db_latency],
+    )
     app.state.db_client = client
     await beanie.init_beanie(
         database=client[settings.db_base],
         document_models=load_all_models(),  # type: ignore
+        skip_indexes=not settings.db_create_indexes,
+    )
+
+
+def _start_loop_monitor(app: FastAPI) -> None:
+    app.state.loop_monitor = None
+    metrics.set_gauge("process_available_cpus", available_cpus())
+    metrics.set_gauge("workers_count", settings.workers_count)
+    if settings.loop_monitor_interval <= 0:
+        return
+    app.state.loop_monitor = LoopMonitor(
+        interval=settings.loop_monitor_interval,
+        slow_callback_ms=settings.loop_slow_callback_ms,
     )
+    app.state.loop_monitor.start()
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], step: str) -> Iterator[None]:
+    started = time.perf_counter()
+    yield
+    timings[step] = time.perf_counter() - started
+    metrics.set_gauge("startup_seconds", timings[step], step=step)
 
 
 @asynccontextmanager
@@ -34,12 +75,30 @@ async def lifespan_setup(
     :return: function that actually performs actions.
     """
 
-    app.middleware_stack = None
-    await _setup_db(app)
-    init_redis(app)
-    init_bot_service(app)  # Initialize BotService after Redis
-    app.middleware_stack = app.build_middleware_stack()
+    timings: Dict[str, float] = {}
+    with _timed(timings, "total"):
+        app.middleware_stack = None
+        _start_loop_monitor(app)
+        if settings.bot_backend == BotBackend.MONGO:
+            with _timed(timings, "db"):
+                await _setup_db(app)
+        with _timed(timings, "services"):
+            init_redis(app)
+            init_bot_service(app)  # Initialize BotService after Redis
+            init_bot_watcher(app)
+            init_bot_events(app)
+            init_jobs(app)
+        app.middleware_stack = app.build_middleware_stack()
+    report = ", ".join(
+        f"{step}: {took * 1000:.0f}ms" for step, took in timings.items()
+    )
+    logger.info(f"Worker started ({report})")
 
     yield
+    await shutdown_jobs(app)
+    await shutdown_bot_watcher(app)  # Stop watcher while Redis is still up
+    await shutdown_bot_events(app)
     await shutdown_redis(app)
     await shutdown_bot_service(app)  # Shutdown BotService on app shutdown
+    if app.state.loop_monitor is not None:
+        await app.state.loop_monitor.stop()
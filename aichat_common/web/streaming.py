@@ -0,0 +1,59 @@
+from typing import AsyncIterable, AsyncIterator, Callable, List, TypeVar
+
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+# Items encoded (and sent) at once.
+STREAM_BATCH_SIZE = 10
+
+
+async def _batches(items: AsyncIterable[T]) -> AsyncIterator[List[T]]:
+    batch: List[T] = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _encode_batch(encode: Callable[[T], bytes], batch: List[T]) -> bytes:
+    return b",".join(encode(item) for item in batch)
+
+
+async def stream_json_list(
+    envelope: BaseModel,
+    items: AsyncIterable[T],
+    encode: Callable[[T], bytes],
+    field: str = "items",
+    offload: bool = False,
+) -> AsyncIterator[bytes]:
+    """
+    Serialize a response with a list filled incrementally.
+
+    The list is written while `items` produces them (e.g. from a database
+    cursor), in batches of `STREAM_BATCH_SIZE`, so a long list neither
+    waits for all items nor blocks the event loop while it is encoded.
+
+    :param envelope: response with the list left empty.
+    :param items: items of the list.
+    :param encode: function returning json of an item.
+    :param field: name of the list in the envelope.
+    :param offload: encode batches in the thread pool.
+    :yield: chunks of json.
+    """
+    placeholder = f'"{field}":[]'.encode()
+    head, tail = envelope.model_dump_json().encode().split(placeholder)
+    yield head + placeholder[:-1]
+    separator = b""
+    async for batch in _batches(items):
+        if offload:
+            chunk = await run_in_threadpool(_encode_batch, encode, batch)
+        else:
+            chunk = _encode_batch(encode, batch)
+        yield separator + chunk
+        separator = b","
+    yield b"]" + tail
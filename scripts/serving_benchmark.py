@@ -0,0 +1,148 @@
+r"""
+Compare server configurations on the bot endpoints.
+
+For each configuration the server is started with extra environment
+variables, a test bot is created and `GET /api/bots/{bot_id}` and
+`GET /api/bots/` are requested by concurrent clients for a while.
+Database and redis settings are taken from the environment, e.g.:
+
+    python scripts/serving_benchmark.py --duration 20 --concurrency 64 \\
+        --config default= \\
+        --config keepalive=AICHAT_COMMON_KEEP_ALIVE_TIMEOUT=75 \\
+        --config hypercorn=AICHAT_COMMON_SERVER=hypercorn
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def parse_config(value: str) -> Tuple[str, Dict[str, str]]:
+    """Parse `name=VAR=value,VAR=value` into a name and variables."""
+    name, _, variables = value.partition("=")
+    env = {}
+    for variable in filter(None, variables.split(",")):
+        key, _, val = variable.partition("=")
+        env[key] = val
+    return name, env
+
+
+@contextmanager
+def running_server(env: Dict[str, str], base_url: str) -> Iterator[None]:
+    """Run the server with extra environment variables until it answers."""
+    server = subprocess.Popen(  # noqa: S603
+        [sys.executable, "-m", "aichat_common"],
+        env={**os.environ, "AICHAT_COMMON_ENVIRONMENT": "prod", **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        started = time.perf_counter()
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode}")
+            if time.perf_counter() - started > 60:
+                raise TimeoutError("Server didn't start in 60s")
+            try:
+                httpx.get(f"{base_url}/api/health", timeout=1).raise_for_status()
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        yield
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+async def load(
+    base_url: str,
+    duration: float,
+    concurrency: int,
+    http2: bool,
+) -> Tuple[int, int, List[float]]:
+    """
+    Request bot endpoints from concurrent clients.
+
+    :return: number of successful and failed requests and their latencies.
+    """
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        http2=http2,
+        limits=httpx.Limits(max_connections=concurrency),
+    ) as client:
+        bot_id = uuid.uuid4().hex
+        fields = (
+            "prop appearance chat_rules chat_topics personality ideal_match "
+            "hobbies food_likes other_likes special_skills relationships "
+            "character_background work_info"
+        )
+        bot = {f"bot_{field}": "benchmark" for field in fields.split()}
+        response = await client.post(
+            "/api/bots/",
+            json={**bot, "bot_id": bot_id, "bot_name": "Benchmark"},
+        )
+        response.raise_for_status()
+        latencies: List[float] = []
+        errors = 0
+        deadline = time.perf_counter() + duration
+
+        async def user(number: int) -> None:
+            nonlocal errors
+            url = f"/api/bots/{bot_id}" if number % 2 else "/api/bots/"
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(user(number) for number in range(concurrency)))
+        await client.delete(f"/api/bots/{bot_id}")
+    return len(latencies), errors, latencies
+
+
+def main() -> None:
+    """Run the benchmark."""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--config", action="append", type=parse_config)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--http2", action="store_true", help="Requires h2 package")
+    parser.add_argument(
+        "--url",
+        default=f"http://127.0.0.1:{os.getenv('AICHAT_COMMON_PORT', '8000')}",
+    )
+    args = parser.parse_args()
+    for name, env in args.config or [("default", {})]:
+        with running_server(env, args.url):
+            done, errors, latencies = asyncio.run(
+                load(args.url, args.duration, args.concurrency, args.http2),
+            )
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+        median = statistics.median(latencies) if latencies else 0
+        logger.info(
+            f"{name}: {done / args.duration:.0f} req/s, {errors} errors, "
+            f"p50 {median * 1000:.1f}ms, p99 {p99 * 1000:.1f}ms",
+        )
+
+
+if __name__ == "__main__":
+    main()
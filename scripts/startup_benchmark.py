@@ -0,0 +1,80 @@
+r"""
+Measure time to first request of the API.
+
+Starts the server the same way as `python -m aichat_common`,
+polls the health check until it answers and prints how long it took.
+Settings are taken from the environment, e.g.:
+
+    AICHAT_COMMON_ENVIRONMENT=prod AICHAT_COMMON_WORKERS_COUNT=8 \\
+        python scripts/startup_benchmark.py --runs 5
+"""
+
+import argparse
+import logging
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+
+def time_to_first_request(url: str, timeout: float) -> float:
+    """
+    Start the server and wait for its first successful response.
+
+    :param url: health check url.
+    :param timeout: seconds to wait for the server.
+    :return: seconds since the process was started.
+    """
+    started = time.perf_counter()
+    server = subprocess.Popen(  # noqa: S603
+        [sys.executable, "-m", "aichat_common"],
+        env=os.environ.copy(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1):  # noqa: S310
+                    return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError(f"No response from {url} in {timeout}s")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+def main() -> None:
+    """Run the benchmark."""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument(
+        "--url",
+        default=f"http://127.0.0.1:{os.getenv('AICHAT_COMMON_PORT', '8000')}"
+        "/api/health",
+    )
+    args = parser.parse_args()
+    results = []
+    for run in range(1, args.runs + 1):
+        took = time_to_first_request(args.url, args.timeout)
+        results.append(took)
+        logger.info(f"run {run}: {took * 1000:.0f}ms")
+    logger.info(
+        f"min {min(results) * 1000:.0f}ms, "
+        f"median {statistics.median(results) * 1000:.0f}ms, "
+        f"max {max(results) * 1000:.0f}ms",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,15 @@ import beanie
 import pytest
 from fakeredis import FakeServer
 from fakeredis.aioredis import FakeConnection
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from httpx import AsyncClient
 from motor.motor_asyncio import AsyncIOMotorClient
 from redis.asyncio import ConnectionPool
 
 from aichat_common.services.redis.dependency import get_redis_pool
-from aichat_common.services.bot.dependency import get_bot_service
+from aichat_common.services.bot.dependency import get_bot_service, get_tenant
+from aichat_common.services.jobs.dependency import get_job_queue
+from aichat_common.services.jobs.queue import JobQueue
 from aichat_common.settings import settings
 from aichat_common.web.application import get_app
 from aichat_common.services.bot.service import BotService
@@ -44,6 +46,20 @@ async def setup_db() -> AsyncGenerator[None, None]:
     yield
 
 
+@pytest.fixture
+def without_mongo(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Undo `setup_db` for a test, as on nodes without mongo.
+
+    Beanie documents are left as before `init_beanie`, so any code
+    building them fails like it would there.
+    """
+    from aichat_common.db.models import load_all_models
+
+    for model in load_all_models():
+        monkeypatch.setattr(model, "_document_settings", None)
+
+
 @pytest.fixture
 async def fake_redis_pool() -> AsyncGenerator[ConnectionPool, None]:
     """
@@ -86,8 +102,11 @@ def fastapi_app(
     """
     application = get_app()
     application.dependency_overrides[get_redis_pool] = lambda: fake_redis_pool
-    application.dependency_overrides[get_bot_service] = lambda: BotService(
-        BotDAO(), redis_pool=fake_redis_pool
+    application.dependency_overrides[get_bot_service] = lambda tenant=Depends(
+        get_tenant,
+    ): BotService(BotDAO(), redis_pool=fake_redis_pool).with_tenant(tenant)
+    application.dependency_overrides[get_job_queue] = lambda: JobQueue(
+        fake_redis_pool,
     )
     return application
 
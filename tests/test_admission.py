@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from redis.asyncio import ConnectionPool
+from starlette import status
+from starlette.authentication import SimpleUser, UnauthenticatedUser
+from starlette.types import Receive, Scope, Send
+
+from aichat_common.settings import settings
+from aichat_common.web.admission import (
+    AdmissionControlMiddleware,
+    client_id,
+    long_lived,
+)
+
+
+@pytest.mark.anyio
+async def test_rate_limit(
+    fastapi_app: FastAPI,
+    fake_redis_pool: ConnectionPool,
+    client: AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that clients are limited by their token bucket."""
+    monkeypatch.setattr(settings, "rate_limit_per_second", 1)
+    monkeypatch.setattr(settings, "rate_limit_burst", 1)
+    fastapi_app.state.redis_pool = fake_redis_pool
+    url = fastapi_app.url_path_for("send_echo_message")
+
+    response = await client.post(url, json={"message": "1"})
+    assert response.status_code == status.HTTP_200_OK
+    response = await client.post(url, json={"message": "2"})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers["Retry-After"]) >= 1
+    # Request headers don't give a fresh bucket.
+    response = await client.post(
+        url,
+        json={"message": "3"},
+        headers={"X-Client-ID": "other-client"},
+    )
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    # Health checks are never limited.
+    response = await client.get(fastapi_app.url_path_for("health_check"))
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_client_id() -> None:
+    """Test that clients are identified by user or peer address."""
+    assert client_id({"client": ("10.0.0.1", 1)}) == "ip:10.0.0.1"
+    assert (
+        client_id({"client": ("2001:db8::1", 1)})
+        == client_id({"client": ("2001:db8::2", 1)})
+        == "ip:2001:db8::/64"
+    )
+    assert client_id({"client": None}) == "ip:unknown"
+    peer = ("10.0.0.1", 1)
+    assert client_id({"client": peer, "user": SimpleUser("alice")}) == "user:alice"
+    assert client_id({"client": peer, "user": UnauthenticatedUser()}) == "ip:10.0.0.1"
+
+
+@pytest.mark.anyio
+async def test_concurrency_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that requests above the in-flight limit are shed."""
+    monkeypatch.setattr(settings, "admission_max_in_flight", 1)
+    release = asyncio.Event()
+
+    async def slow_app(scope: Scope, receive: Receive, send: Send) -> None:
+        await release.wait()
+
+    middleware = AdmissionControlMiddleware(slow_app)
+    scope = {"type": "http", "path": "/api/bots/", "headers": [], "app": FastAPI()}
+    sent = []
+
+    async def receive() -> dict:
+        return {"type": "http.request"}
+
+    async def send(message: dict) -> None:
+        sent.append(message)
+
+    first = asyncio.create_task(middleware(scope, receive, send))
+    await asyncio.sleep(0)
+    await middleware(scope, receive, send)
+    assert sent[0]["status"] == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert (b"retry-after", b"1") in sent[0]["headers"]
+    release.set()
+    await first
+    assert middleware.in_flight == 0
+
+
+@pytest.mark.anyio
+async def test_stream_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that open event streams don't take in-flight slots."""
+    monkeypatch.setattr(settings, "admission_max_in_flight", 1)
+    monkeypatch.setattr(settings, "admission_max_streams", 1)
+    app = FastAPI()
+
+    @app.get("/events")
+    @long_lived
+    async def events() -> None:
+        """Stream events."""
+
+    release = asyncio.Event()
+
+    async def slow_app(scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["path"] == "/events":
+            await release.wait()
+        else:
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+    middleware = AdmissionControlMiddleware(slow_app)
+    sent = []
+
+    async def receive() -> dict:
+        return {"type": "http.request"}
+
+    async def send(message: dict) -> None:
+        sent.append(message)
+
+    def scope(path: str) -> dict:
+        return {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "headers": [],
+            "app": app,
+        }
+
+    stream = asyncio.create_task(middleware(scope("/events"), receive, send))
+    await asyncio.sleep(0)
+    assert middleware.streams == 1
+    await middleware(scope("/api/bots/"), receive, send)
+    assert sent[0]["status"] == status.HTTP_200_OK
+    await middleware(scope("/events"), receive, send)
+    assert sent[-2]["status"] == status.HTTP_503_SERVICE_UNAVAILABLE
+    release.set()
+    await stream
+    assert middleware.streams == 0
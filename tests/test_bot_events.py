@@ -0,0 +1,78 @@
+import asyncio
+import uuid
+
+import pytest
+from redis.asyncio import ConnectionPool
+
+from aichat_common.services.bot.events import BotEventHub, BotSubscription
+from aichat_common.services.bot.service import BotService
+
+
+@pytest.mark.anyio
+async def test_bot_events(
+    bot_service: BotService,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    """Test that bot changes reach subscribers through redis."""
+    test_bot_id = uuid.uuid4().hex
+    await bot_service.create_bot(
+        bot_id=test_bot_id,
+        bot_name="TestBot",
+        bot_prop="test",
+        bot_appearance="test",
+        bot_chat_rules="rule",
+        bot_chat_topics="topic",
+        bot_personality="personality",
+        bot_ideal_match="match",
+        bot_hobbies="hobby",
+        bot_food_likes="food",
+        bot_other_likes="other",
+        bot_special_skills="skills",
+        bot_relationships="rel",
+        bot_character_background="bg",
+        bot_work_info="work",
+        bot_clothes=[{"cloth_id": "c1", "cloth_description": "coat"}],
+    )
+    hub = BotEventHub(fake_redis_pool)
+    hub.start()
+    subscription = hub.subscribe([test_bot_id])
+    other = hub.subscribe([uuid.uuid4().hex])
+    # Let the hub subscribe to the channels.
+    await asyncio.sleep(0.1)
+
+    await bot_service.update_bot(test_bot_id, {"bot_hobbies": "chess"})
+    event = await subscription.get(timeout=2)
+    assert event == {
+        "type": "updated",
+        "tenant": "default",
+        "bot_id": test_bot_id,
+        "revision": 1,
+        "changes": {"bot_hobbies": "chess"},
+    }
+    await bot_service.set_cloth_in_use(test_bot_id, "c1")
+    event = await subscription.get(timeout=2)
+    assert event is not None
+    assert event["changes"]["bot_clothes"][0]["cloth_in_use"] is True
+    await bot_service.delete_bot(test_bot_id)
+    event = await subscription.get(timeout=2)
+    assert event is not None
+    assert event["type"] == "deleted"
+    assert await other.get(timeout=0.1) is None
+
+    hub.unsubscribe(subscription)
+    hub.unsubscribe(other)
+    await hub.stop()
+
+
+@pytest.mark.anyio
+async def test_slow_subscriber_resync() -> None:
+    """Test that an overflowing subscriber gets a single resync event."""
+    subscription = BotSubscription(["bot"], queue_size=2)
+    for revision in range(5):
+        subscription.put({"type": "updated", "bot_id": "bot", "revision": revision})
+    assert await subscription.get(timeout=0.1) == {
+        "type": "resync",
+        "tenant": "default",
+        "bot_ids": ["bot"],
+    }
+    assert await subscription.get(timeout=0.1) is None
@@ -0,0 +1,202 @@
+import uuid
+from pathlib import Path
+from typing import Callable, Dict
+
+import pytest
+
+from aichat_common.db.dao.bot_dao import (
+    BotAlreadyExistsError,
+    BotDAO,
+    RevisionConflictError,
+)
+from aichat_common.db.dao.bot_repository import BotRepository
+from aichat_common.db.dao.memory_bot_dao import MemoryBotDAO
+from aichat_common.db.dao.snapshot_bot_dao import SnapshotBotDAO
+from aichat_common.db.models.bot_model import BotCloth
+from aichat_common.db.snapshot import SnapshotCatalog, write_snapshot
+
+# Backends that store changes, every test runs against each of them.
+WRITABLE_BACKENDS: Dict[str, Callable[[], BotRepository]] = {
+    "mongo": BotDAO,
+    "memory": MemoryBotDAO,
+}
+
+
+def _bot_data(bot_id: str, bot_name: str) -> dict:
+    fields = [
+        "bot_prop",
+        "bot_appearance",
+        "bot_chat_rules",
+        "bot_chat_topics",
+        "bot_personality",
+        "bot_ideal_match",
+        "bot_hobbies",
+        "bot_food_likes",
+        "bot_other_likes",
+        "bot_special_skills",
+        "bot_relationships",
+        "bot_character_background",
+        "bot_work_info",
+    ]
+    return {
+        "bot_id": bot_id,
+        "bot_name": bot_name,
+        "bot_clothes": [
+            {"cloth_id": "c1", "cloth_description": "coat", "cloth_in_use": True},
+            {"cloth_id": "c2", "cloth_description": "hat"},
+        ],
+        **{field: "test" for field in fields},
+    }
+
+
+async def _seed(repository: BotRepository) -> None:
+    for bot_id, bot_name in [
+        ("b2", "Zed"),
+        ("b1", "Amy"),
+        ("b3", "Amy"),
+        ("b4", "Amber"),
+        ("b5", "Deleted"),
+    ]:
+        await repository.create_bot_model(**_bot_data(bot_id, bot_name))
+    await repository.delete_bot_by_id("b5")
+
+
+@pytest.fixture(params=list(WRITABLE_BACKENDS))
+def repository(request: pytest.FixtureRequest) -> BotRepository:
+    """
+    Repository of a tenant of its own in every backend that stores changes.
+
+    :return: empty repository.
+    """
+    if request.param != "mongo":
+        request.getfixturevalue("without_mongo")
+    return WRITABLE_BACKENDS[request.param]().with_tenant(uuid.uuid4().hex)
+
+
+@pytest.fixture(params=[*WRITABLE_BACKENDS, "snapshot"])
+async def seeded_repository(
+    request: pytest.FixtureRequest,
+    tmp_path: Path,
+) -> BotRepository:
+    """
+    Repository with the same bots in every backend.
+
+    :return: repository.
+    """
+    if request.param != "mongo":
+        request.getfixturevalue("without_mongo")
+    tenant = uuid.uuid4().hex
+    if request.param != "snapshot":
+        repository = WRITABLE_BACKENDS[request.param]().with_tenant(tenant)
+        await _seed(repository)
+        return repository
+    source = MemoryBotDAO().with_tenant(tenant)
+    await _seed(source)
+    path = tmp_path / "bots.snapshot"
+    await write_snapshot(source.iter_all_bots(), path)
+    return SnapshotBotDAO(SnapshotCatalog(path)).with_tenant(tenant)
+
+
+@pytest.mark.anyio
+async def test_reads(seeded_repository: BotRepository) -> None:
+    """Test that every backend reads the same bots."""
+    repository = seeded_repository
+    assert await repository.get_bots_count() == 4
+    bot = await repository.get_bot_by_id("b1")
+    assert bot is not None
+    assert (bot.bot_name, bot.tenant, bot.active_cloth_id) == (
+        "Amy",
+        repository.tenant,
+        "c1",
+    )
+    assert await repository.get_bot_by_id("b5") is None
+    assert await repository.get_bot_by_id("missing") is None
+    assert await repository.with_tenant(uuid.uuid4().hex).get_bot_by_id("b1") is None
+
+    page = await repository.get_all_bots(limit=2, offset=1)
+    assert [bot.bot_id for bot in page] == ["b1", "b3"]
+    assert [bot.bot_id async for bot in repository.iter_all_bots(offset=2)] == [
+        "b3",
+        "b2",
+    ]
+    assert [bot.bot_id for bot in await repository.filter(bot_name="Amy")] == [
+        "b1",
+        "b3",
+    ]
+    assert [bot.bot_id for bot in await repository.filter(bot_id="b2")] == ["b2"]
+    assert await repository.filter(bot_id="b2", bot_name="Amy") == []
+    found, total = await repository.search(name_prefix="Am", limit=2, offset=1)
+    assert ([summary.bot_id for summary in found], total) == (["b1", "b3"], 3)
+
+    active = await repository.get_active_cloth("b1")
+    assert active is not None
+    assert active.active_cloth_id == "c1"
+    assert [cloth.cloth_id for cloth in active.bot_clothes] == ["c1"]
+
+
+@pytest.mark.anyio
+async def test_writes(repository: BotRepository) -> None:
+    """Test that every backend changes bots and their history alike."""
+    bot = await repository.create_bot_model(**_bot_data("b1", "Amy"))
+    assert bot is not None
+    assert (bot.revision, bot.tenant) == (0, repository.tenant)
+    with pytest.raises(BotAlreadyExistsError):
+        await repository.create_bot_model(**_bot_data("b1", "Amy"))
+
+    bot = await repository.update_bot_by_id("b1", {"bot_name": "Ann"}, 0)
+    assert bot is not None
+    assert (bot.bot_name, bot.revision) == ("Ann", 1)
+    with pytest.raises(RevisionConflictError) as conflict:
+        await repository.update_bot_by_id("b1", {"bot_name": "Bea"}, 0)
+    assert conflict.value.revision == 1
+    assert await repository.update_bot_by_id("missing", {"bot_name": "Bea"}) is None
+
+    bot = await repository.set_cloth_in_use("b1", "c2")
+    assert bot is not None
+    assert bot.active_cloth_id == "c2"
+    assert [cloth.cloth_in_use for cloth in bot.bot_clothes] == [False, True]
+    assert await repository.set_cloth_in_use("b1", "missing") is None
+    cloth = BotCloth(cloth_id="c3", cloth_description="scarf", cloth_in_use=True)
+    bot = await repository.add_cloth("b1", cloth)
+    assert bot is not None
+    assert [c.cloth_id for c in bot.bot_clothes if c.cloth_in_use] == ["c2"]
+    assert await repository.add_cloth("b1", cloth) is None
+    bot = await repository.remove_cloth("b1", "c2")
+    assert bot is not None
+    assert ([c.cloth_id for c in bot.bot_clothes], bot.active_cloth_id) == (
+        ["c1", "c3"],
+        None,
+    )
+    assert bot.revision == 4
+
+    tombstone = await repository.delete_bot_by_id("b1")
+    assert tombstone is not None
+    assert tombstone.deleted_at is not None
+    assert await repository.get_bot_by_id("b1") is None
+    assert await repository.get_bot_by_id("b1", include_deleted=True) is not None
+    restored = await repository.restore_bot_by_id("b1")
+    assert restored is not None
+    assert (restored.deleted_at, restored.revision) == (None, 6)
+    assert await repository.restore_bot_by_id("b1") is None
+
+    revisions, total = await repository.revisions.get_revisions("b1", 2, 0)
+    assert total == 7
+    assert [revision.revision for revision in revisions] == [6, 5]
+    old = await repository.get_bot_at_revision("b1", 1)
+    assert old is not None
+    assert (old.bot_name, old.active_cloth_id, old.revision) == ("Ann", "c1", 1)
+
+
+@pytest.mark.anyio
+async def test_bulk_delete(repository: BotRepository) -> None:
+    """Test that every backend deletes and recreates bots alike."""
+    await repository.create_bot_model(**_bot_data("b1", "Amy"))
+    await repository.create_bot_model(**_bot_data("b2", "Amber"))
+    await repository.create_bot_model(**_bot_data("b3", "Bob"))
+    deleted = await repository.delete_bots(name_prefix="A", bot_ids=["b1", "b3"])
+    assert [bot.bot_id for bot in deleted] == ["b1"]
+    assert await repository.delete_bots() == []
+    # A new bot replaces the tombstone and continues its revisions.
+    bot = await repository.create_bot_model(**_bot_data("b1", "Amy"))
+    assert bot.revision == 2
+    assert await repository.get_bots_count() == 3
@@ -0,0 +1,261 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from redis.asyncio import ConnectionPool, Redis
+
+from aichat_common.db.dao.bot_dao import BotDAO, RevisionConflictError
+from aichat_common.db.models.bot_model import BotCloth
+from aichat_common.db.models.bot_revision_model import BotRevisionModel
+from aichat_common.metrics import metrics
+from aichat_common.services.bot.hot_keys import HotKeyTracker
+from aichat_common.services.bot.service import BotService
+
+
+def _bot_data(bot_id: str) -> dict:
+    return {
+        "bot_id": bot_id,
+        "bot_name": "TestBot",
+        "bot_prop": "test",
+        "bot_appearance": "test",
+        "bot_chat_rules": "rule",
+        "bot_chat_topics": "topic",
+        "bot_personality": "personality",
+        "bot_ideal_match": "match",
+        "bot_hobbies": "hobby",
+        "bot_food_likes": "food",
+        "bot_other_likes": "other",
+        "bot_special_skills": "skills",
+        "bot_relationships": "rel",
+        "bot_character_background": "bg",
+        "bot_work_info": "work",
+        "bot_clothes": [],
+    }
+
+
+@pytest.mark.anyio
+async def test_write_through_cache(fake_redis_pool: ConnectionPool) -> None:
+    """Test that writes put fresh bots into cache in write-through mode."""
+    service = BotService(BotDAO(), redis_pool=fake_redis_pool, write_through=True)
+    test_bot_id = uuid.uuid4().hex
+    cache_key = service.cache_key(test_bot_id)
+    await service.create_bot(**_bot_data(test_bot_id))
+    async with Redis(connection_pool=fake_redis_pool) as redis:
+        assert await redis.hget(cache_key, "revision") == b"0"
+        await service.update_bot(test_bot_id, {"bot_name": "UpdatedBot"})
+        assert await redis.hget(cache_key, "revision") == b"1"
+    cached_bot = await service.get_bot_by_id(test_bot_id)
+    assert cached_bot is not None
+    assert cached_bot.bot_name == "UpdatedBot"
+    # Clean up
+    await service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_cache_keeps_newer_revision(bot_service: BotService) -> None:
+    """Test that a stale revision never overwrites a newer cached one."""
+    test_bot_id = uuid.uuid4().hex
+    stale_bot = await bot_service.create_bot(**_bot_data(test_bot_id))
+    assert stale_bot is not None
+    fresh_bot = await bot_service.update_bot(test_bot_id, {"bot_name": "Fresh"})
+    assert fresh_bot is not None
+    await bot_service.cache_bot(fresh_bot)
+    await bot_service.cache_bot(stale_bot)
+    cached_bot = await bot_service.get_bot_by_id(test_bot_id)
+    assert cached_bot is not None
+    assert cached_bot.bot_name == "Fresh"
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_tenant_cache_quota(fake_redis_pool: ConnectionPool) -> None:
+    """Test that tenants are isolated and evict only their own cached bots."""
+    service = BotService(
+        BotDAO(),
+        redis_pool=fake_redis_pool,
+        write_through=True,
+        tenant_cache_quotas={"small": 2},
+    )
+    small = service.with_tenant("small")
+    test_bot_ids = [uuid.uuid4().hex for _ in range(3)]
+    # The same bot id lives in both tenants independently.
+    await service.create_bot(**_bot_data(test_bot_ids[0]))
+    evictions = metrics.get("bot_cache_evictions_total", tenant="small")
+    for test_bot_id in test_bot_ids:
+        await small.create_bot(**_bot_data(test_bot_id))
+        await small.get_bot_by_id(test_bot_ids[0])
+    await small.update_bot(test_bot_ids[0], {"bot_name": "Small"})
+
+    async with Redis(connection_pool=fake_redis_pool) as redis:
+        # The least recently used bot of the small tenant was evicted.
+        assert await redis.exists(small.cache_key(test_bot_ids[0]))
+        assert not await redis.exists(small.cache_key(test_bot_ids[1]))
+        assert await redis.exists(small.cache_key(test_bot_ids[2]))
+        assert await redis.exists(service.cache_key(test_bot_ids[0]))
+        # Bots of tenants without a quota are not tracked.
+        assert not await redis.exists("bot:lru:default")
+    assert metrics.get("bot_cache_evictions_total", tenant="small") == evictions + 1
+    default_bot = await service.get_bot_by_id(test_bot_ids[0])
+    assert default_bot is not None
+    assert default_bot.bot_name == "TestBot"
+    assert await service.get_bot_by_id(test_bot_ids[1]) is None
+    # Clean up
+    await service.delete_bot(test_bot_ids[0])
+    for test_bot_id in test_bot_ids:
+        await small.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_hot_key_replicas(fake_redis_pool: ConnectionPool) -> None:
+    """Test that hot bots are read from replicas dropped by writes."""
+    # Every read is sampled and makes the bot hot right away.
+    hot_keys = HotKeyTracker(
+        replicas=2,
+        sample_rate=1,
+        window=0,
+        threshold=1,
+        local_threshold=1e12,
+    )
+    service = BotService(BotDAO(), redis_pool=fake_redis_pool, hot_keys=hot_keys)
+    test_bot_id = uuid.uuid4().hex
+    cache_key = service.cache_key(test_bot_id)
+    replica_keys = hot_keys.replica_keys(cache_key)
+    await service.create_bot(**_bot_data(test_bot_id))
+    for _ in range(20):
+        bot = await service.get_bot_by_id(test_bot_id)
+        assert bot is not None
+        assert bot.bot_name == "TestBot"
+    assert hot_keys.is_hot(cache_key)
+    hits = metrics.get("bot_hot_cache_hits_total", tenant="default", tier="replica")
+    assert hits > 0
+
+    async with Redis(connection_pool=fake_redis_pool) as redis:
+        assert await redis.exists(*replica_keys) == 2
+        await service.update_bot(test_bot_id, {"bot_name": "Hot"})
+        assert not await redis.exists(cache_key, *replica_keys)
+    bot = await service.get_bot_by_id(test_bot_id)
+    assert bot is not None
+    assert bot.bot_name == "Hot"
+
+    # The hottest bots are served from process memory until a write.
+    hot_keys.local_threshold = 1
+    for _ in range(3):
+        await service.get_bot_by_id(test_bot_id)
+    assert hot_keys.get_local(cache_key, "data") is not None
+    await service.delete_bot(test_bot_id)
+    assert hot_keys.get_local(cache_key, "data") is None
+    assert await service.get_bot_by_id(test_bot_id) is None
+
+
+@pytest.mark.anyio
+async def test_soft_delete(bot_service: BotService) -> None:
+    """Test tombstones of deleted bots, their restore and purge."""
+    test_bot_id = uuid.uuid4().hex
+    await bot_service.create_bot(**_bot_data(test_bot_id))
+    deleted_bot = await bot_service.delete_bot(test_bot_id)
+    assert deleted_bot is not None
+    assert deleted_bot.deleted_at is not None
+    assert await bot_service.delete_bot(test_bot_id) is None
+    assert await bot_service.get_bot_by_id(test_bot_id) is None
+    # Reads of the deleted bot are answered by the cached tombstone.
+    hits = metrics.get("bot_cache_requests_total", tenant="default", result="hit")
+    assert await bot_service.get_bot_by_id(test_bot_id) is None
+    assert (
+        metrics.get("bot_cache_requests_total", tenant="default", result="hit")
+        == hits + 1
+    )
+    assert await bot_service.update_bot(test_bot_id, {"bot_name": "X"}) is None
+
+    restored_bot = await bot_service.restore_bot(test_bot_id)
+    assert restored_bot is not None
+    assert restored_bot.deleted_at is None
+    assert await bot_service.get_bot_by_id(test_bot_id) is not None
+    assert await bot_service.restore_bot(test_bot_id) is None
+
+    # A tombstone doesn't block creating a bot with the same id,
+    # the new bot continues its revisions.
+    await bot_service.delete_bot(test_bot_id)
+    recreated_bot = await bot_service.create_bot(**_bot_data(test_bot_id))
+    assert recreated_bot is not None
+    assert recreated_bot.revision == 4
+
+    await bot_service.delete_bot(test_bot_id)
+    bot_dao = bot_service.bot_dao
+    deleted_before = datetime.now(timezone.utc) + timedelta(seconds=1)
+    assert await bot_dao.count_deleted(deleted_before) >= 1
+    async for _ in bot_dao.purge_deleted(deleted_before, batch_size=2):
+        pass
+    assert await bot_dao.count_deleted(deleted_before) == 0
+    assert await bot_dao.get_bot_by_id(test_bot_id, include_deleted=True) is None
+    assert await bot_service.restore_bot(test_bot_id) is None
+
+
+@pytest.mark.anyio
+async def test_bot_history(bot_service: BotService) -> None:
+    """Test rebuilding bot revisions from checkpoints and diffs."""
+    test_bot_id = uuid.uuid4().hex
+    await bot_service.create_bot(**_bot_data(test_bot_id))
+    for number in range(1, 13):
+        await bot_service.update_bot(test_bot_id, {"bot_hobbies": f"hobby {number}"})
+    await bot_service.add_cloth(
+        test_bot_id,
+        BotCloth(cloth_id="c1", cloth_description="coat"),
+    )
+
+    revisions, total = await bot_service.get_bot_revisions(test_bot_id, limit=20)
+    assert total == 14
+    assert [revision.revision for revision in revisions] == list(range(13, -1, -1))
+    assert [revision.revision for revision in revisions if revision.checkpoint] == [
+        10,
+        0,
+    ]
+    assert revisions[0].fields == ["active_cloth_id", "bot_clothes"]
+    for number in range(13):
+        bot = await bot_service.get_bot_at_revision(test_bot_id, number)
+        assert bot is not None
+        assert bot.revision == number
+        assert bot.bot_hobbies == (f"hobby {number}" if number else "hobby")
+        assert bot.bot_clothes == []
+    assert await bot_service.get_bot_at_revision(test_bot_id, 14) is None
+
+    rolled_back_bot = await bot_service.rollback_bot(test_bot_id, 3)
+    assert rolled_back_bot is not None
+    assert rolled_back_bot.revision == 14
+    assert rolled_back_bot.bot_hobbies == "hobby 3"
+    assert rolled_back_bot.bot_clothes == []
+    with pytest.raises(RevisionConflictError):
+        await bot_service.rollback_bot(test_bot_id, 5, expected_revision=13)
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_bot_history_gap(bot_service: BotService) -> None:
+    """Test that a lost revision doesn't break rebuilding later ones."""
+    test_bot_id = uuid.uuid4().hex
+    await bot_service.create_bot(**_bot_data(test_bot_id))
+    await bot_service.update_bot(test_bot_id, {"bot_hobbies": "hobby 1"})
+    await bot_service.update_bot(test_bot_id, {"bot_hobbies": "hobby 2"})
+    # A revision whose write failed after the bot was updated.
+    await BotRevisionModel.get_motor_collection().delete_one(
+        {"bot_id": test_bot_id, "revision": 2},
+    )
+    await bot_service.update_bot(test_bot_id, {"bot_name": "Gap"})
+    await bot_service.update_bot(test_bot_id, {"bot_hobbies": "hobby 4"})
+
+    revisions, _ = await bot_service.get_bot_revisions(test_bot_id, limit=20)
+    assert [revision.revision for revision in revisions if revision.checkpoint] == [
+        3,
+        0,
+    ]
+    assert await bot_service.get_bot_at_revision(test_bot_id, 2) is None
+    bot = await bot_service.get_bot_at_revision(test_bot_id, 3)
+    assert bot is not None
+    assert bot.bot_name == "Gap"
+    assert bot.bot_hobbies == "hobby 2"
+    bot = await bot_service.get_bot_at_revision(test_bot_id, 4)
+    assert bot is not None
+    assert bot.bot_hobbies == "hobby 4"
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
@@ -1,11 +1,26 @@
+import hashlib
+import json
 import uuid
+
 import pytest
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from httpx import AsyncClient
+from redis.asyncio import ConnectionPool, Redis
 from starlette import status
 
+from aichat_common.db.consistency import SessionToken
+from aichat_common.db.dao.memory_bot_dao import MemoryBotDAO
+from aichat_common.idempotency import IdempotencyStore
+from aichat_common.metrics import metrics
+from aichat_common.services.bot.dependency import get_bot_service, get_tenant
 from aichat_common.services.bot.service import BotService
-from aichat_common.web.api.bot.schema import BotClothDTO
+from aichat_common.settings import BotBackend, settings
+from aichat_common.web.api.bot.schema import (
+    BotDTO,
+    BotPageDataDTO,
+    BotPageResponse,
+)
+
 # from aichat_common.web.api.bot.schema import (
 #     BotCreateDTO,
 #     BotUpdateDTO,
@@ -180,6 +195,55 @@ async def test_list_bots(
     await bot_service.delete_bot(test_bot_id)
 
 
+@pytest.mark.anyio
+async def test_list_bots_streamed(
+    fastapi_app: FastAPI,
+    bot_service: BotService,
+    client: AsyncClient,
+) -> None:
+    """Test that a streamed page of bots matches the page model."""
+    test_bot_ids = [uuid.uuid4().hex for _ in range(23)]
+    for test_bot_id in test_bot_ids:
+        await bot_service.create_bot(
+            bot_id=test_bot_id,
+            bot_name=f"Streamed {test_bot_id}",
+            bot_prop="test",
+            bot_appearance="test",
+            bot_chat_rules="rule",
+            bot_chat_topics="topic",
+            bot_personality="personality",
+            bot_ideal_match="match",
+            bot_hobbies="hobby",
+            bot_food_likes="food",
+            bot_other_likes="other",
+            bot_special_skills="skills",
+            bot_relationships="rel",
+            bot_character_background="bg",
+            bot_work_info="work",
+            bot_clothes=[],
+        )
+    url = fastapi_app.url_path_for("list_bots")
+    total = await bot_service.get_bots_count()
+    # Small pages are encoded on the event loop, large ones in the thread pool.
+    for size in (7, 100):
+        response = await client.get(url, params={"page": 2, "size": size})
+        assert response.status_code == status.HTTP_200_OK
+        bots = await bot_service.get_all_bots(limit=size, offset=size)
+        expected = BotPageResponse(
+            data=BotPageDataDTO(
+                items=[BotDTO.model_validate(bot) for bot in bots],
+                page=2,
+                size=size,
+                total=total,
+                total_pages=(total + size - 1) // size,
+            ),
+        )
+        assert response.json() == expected.model_dump(mode="json")
+    # Clean up
+    for test_bot_id in test_bot_ids:
+        await bot_service.delete_bot(test_bot_id)
+
+
 @pytest.mark.anyio
 async def test_set_cloth_in_use(
     fastapi_app: FastAPI, bot_service: BotService, client: AsyncClient
@@ -215,3 +279,619 @@ async def test_set_cloth_in_use(
     assert any(cloth["cloth_id"] == "c1" and cloth["cloth_in_use"] for cloth in clothes)
     # Clean up
     await bot_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_search_bots(
+    fastapi_app: FastAPI,
+    bot_service: BotService,
+    client: AsyncClient,
+) -> None:
+    """Test bot search by persona words and by name prefix."""
+    test_bot_id = uuid.uuid4().hex
+    bot_name = f"Search{test_bot_id}"
+    bot_data = {
+        "bot_id": test_bot_id,
+        "bot_name": bot_name,
+        "bot_prop": "test",
+        "bot_appearance": "test",
+        "bot_chat_rules": "rule",
+        "bot_chat_topics": "topic",
+        "bot_personality": f"cheerful {test_bot_id}",
+        "bot_ideal_match": "match",
+        "bot_hobbies": "hobby",
+        "bot_food_likes": "food",
+        "bot_other_likes": "other",
+        "bot_special_skills": "skills",
+        "bot_relationships": "rel",
+        "bot_character_background": "bg",
+        "bot_work_info": "work",
+        "bot_clothes": [],
+    }
+    await bot_service.create_bot(**bot_data)
+    url = fastapi_app.url_path_for("search_bots")
+    response = await client.get(url, params={"q": test_bot_id})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()["data"]
+    assert data["total"] == 1
+    assert data["items"][0]["bot_id"] == test_bot_id
+    assert data["items"][0]["score"] > 0
+    response = await client.get(url, params={"name_prefix": bot_name[:-4]})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"]["items"][0]["bot_id"] == test_bot_id
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_get_bot_compressed(
+    fastapi_app: FastAPI,
+    bot_service: BotService,
+    client: AsyncClient,
+) -> None:
+    """Test that large bot responses are gzipped and served from cache."""
+    test_bot_id = uuid.uuid4().hex
+    bot_data = {
+        "bot_id": test_bot_id,
+        "bot_name": "TestBot",
+        "bot_prop": "test",
+        "bot_appearance": "test",
+        "bot_chat_rules": "rule",
+        "bot_chat_topics": "topic",
+        "bot_personality": "personality " * 200,
+        "bot_ideal_match": "match",
+        "bot_hobbies": "hobby",
+        "bot_food_likes": "food",
+        "bot_other_likes": "other",
+        "bot_special_skills": "skills",
+        "bot_relationships": "rel",
+        "bot_character_background": "bg",
+        "bot_work_info": "work",
+        "bot_clothes": [],
+    }
+    await bot_service.create_bot(**bot_data)
+    url = fastapi_app.url_path_for("get_bot", bot_id=test_bot_id)
+    for _ in range(2):
+        response = await client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json()["data"]["bot_id"] == test_bot_id
+    assert await bot_service.get_cached_body(test_bot_id, "gzip") is not None
+    # Cached bodies are validated by the bot revision too.
+    headers = {"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]}
+    response = await client.get(url, headers=headers)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_get_bot_prompt(
+    fastapi_app: FastAPI,
+    bot_service: BotService,
+    client: AsyncClient,
+) -> None:
+    """Test prompt rendering and its invalidation on bot update."""
+    test_bot_id = uuid.uuid4().hex
+    bot_data = {
+        "bot_id": test_bot_id,
+        "bot_name": "TestBot",
+        "bot_prop": "test",
+        "bot_appearance": "test",
+        "bot_chat_rules": "rule",
+        "bot_chat_topics": "topic",
+        "bot_personality": "开朗",
+        "bot_ideal_match": "match",
+        "bot_hobbies": "hobby",
+        "bot_food_likes": "food",
+        "bot_other_likes": "other",
+        "bot_special_skills": "skills",
+        "bot_relationships": "rel",
+        "bot_character_background": "bg",
+        "bot_work_info": "work",
+        "bot_clothes": [
+            {
+                "cloth_id": "c1",
+                "cloth_description": "红色外套",
+                "cloth_in_use": True,
+            },
+        ],
+    }
+    await bot_service.create_bot(**bot_data)
+    url = fastapi_app.url_path_for("get_bot_prompt", bot_id=test_bot_id)
+    response = await client.get(url, params={"template": "compact"})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()["data"]
+    assert data["template"] == "compact"
+    assert "TestBot" in data["prompt"]
+    assert "红色外套" in data["prompt"]
+    assert "开朗" in data["prompt"]
+    assert data["token_count"] > 0
+    # Served from cache until the bot changes.
+    assert await bot_service.get_cached_body(test_bot_id, "prompt:compact:v1")
+    await bot_service.update_bot(test_bot_id, {"bot_personality": "安静"})
+    response = await client.get(url, params={"template": "compact"})
+    assert "安静" in response.json()["data"]["prompt"]
+    response = await client.get(url, params={"template": "missing"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_cloth_operations(
+    fastapi_app: FastAPI,
+    bot_service: BotService,
+    client: AsyncClient,
+) -> None:
+    """Test adding, wearing and removing clothes."""
+    test_bot_id = uuid.uuid4().hex
+    bot_data = {
+        "bot_id": test_bot_id,
+        "bot_name": "TestBot",
+        "bot_prop": "test",
+        "bot_appearance": "test",
+        "bot_chat_rules": "rule",
+        "bot_chat_topics": "topic",
+        "bot_personality": "personality",
+        "bot_ideal_match": "match",
+        "bot_hobbies": "hobby",
+        "bot_food_likes": "food",
+        "bot_other_likes": "other",
+        "bot_special_skills": "skills",
+        "bot_relationships": "rel",
+        "bot_character_background": "bg",
+        "bot_work_info": "work",
+        "bot_clothes": [
+            {"cloth_id": "c1", "cloth_description": "desc", "cloth_in_use": True},
+        ],
+    }
+    await bot_service.create_bot(**bot_data)
+    add_url = fastapi_app.url_path_for("add_cloth", bot_id=test_bot_id)
+    active_url = fastapi_app.url_path_for("get_active_cloth", bot_id=test_bot_id)
+
+    response = await client.get(active_url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"]["active_cloth_id"] == "c1"
+
+    cloth = {"cloth_id": "c2", "cloth_description": "coat"}
+    response = await client.post(add_url, json=cloth)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(response.json()["data"]["bot_clothes"]) == 2
+    response = await client.post(add_url, json=cloth)
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+    use_url = fastapi_app.url_path_for("set_cloth_in_use", bot_id=test_bot_id)
+    response = await client.post(use_url, json={"cloth_id": "c2"})
+    assert response.json()["data"]["active_cloth_id"] == "c2"
+    response = await client.get(active_url)
+    data = response.json()["data"]
+    assert data["cloth"] == {
+        "cloth_id": "c2",
+        "cloth_description": "coat",
+        "cloth_in_use": True,
+    }
+
+    remove_url = fastapi_app.url_path_for(
+        "remove_cloth",
+        bot_id=test_bot_id,
+        cloth_id="c2",
+    )
+    response = await client.delete(remove_url)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()["data"]
+    assert data["active_cloth_id"] is None
+    assert [cloth["cloth_id"] for cloth in data["bot_clothes"]] == ["c1"]
+    response = await client.delete(remove_url)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_update_bot_if_match(
+    fastapi_app: FastAPI,
+    bot_service: BotService,
+    client: AsyncClient,
+) -> None:
+    """Test conditional bot updates and ETags."""
+    test_bot_id = uuid.uuid4().hex
+    bot_data = {
+        "bot_id": test_bot_id,
+        "bot_name": "TestBot",
+        "bot_prop": "test",
+        "bot_appearance": "test",
+        "bot_chat_rules": "rule",
+        "bot_chat_topics": "topic",
+        "bot_personality": "personality",
+        "bot_ideal_match": "match",
+        "bot_hobbies": "hobby",
+        "bot_food_likes": "food",
+        "bot_other_likes": "other",
+        "bot_special_skills": "skills",
+        "bot_relationships": "rel",
+        "bot_character_background": "bg",
+        "bot_work_info": "work",
+        "bot_clothes": [],
+    }
+    await bot_service.create_bot(**bot_data)
+    get_url = fastapi_app.url_path_for("get_bot", bot_id=test_bot_id)
+    url = fastapi_app.url_path_for("update_bot", bot_id=test_bot_id)
+    response = await client.get(get_url)
+    etag = response.headers["etag"]
+    assert etag == '"0"'
+    response = await client.get(get_url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = await client.patch(
+        url,
+        json={"bot_name": "First"},
+        headers={"If-Match": etag},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] == '"1"'
+    # A concurrent update based on the old revision is rejected.
+    response = await client.patch(
+        url,
+        json={"bot_hobbies": "chess"},
+        headers={"If-Match": etag},
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.headers["etag"] == '"1"'
+    response = await client.patch(
+        url,
+        json={"bot_hobbies": "chess"},
+        headers={"If-Match": "garbage"},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = await client.get(get_url)
+    data = response.json()["data"]
+    assert data["bot_name"] == "First"
+    assert data["bot_hobbies"] == "hobby"
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_read_your_writes(
+    fastapi_app: FastAPI,
+    bot_service: BotService,
+    client: AsyncClient,
+) -> None:
+    """Test that reads with a session token see the write despite stale cache."""
+    test_bot_id = uuid.uuid4().hex
+    bot_data = {
+        "bot_id": test_bot_id,
+        "bot_name": "TestBot",
+        "bot_prop": "test",
+        "bot_appearance": "test",
+        "bot_chat_rules": "rule",
+        "bot_chat_topics": "topic",
+        "bot_personality": "personality",
+        "bot_ideal_match": "match",
+        "bot_hobbies": "hobby",
+        "bot_food_likes": "food",
+        "bot_other_likes": "other",
+        "bot_special_skills": "skills",
+        "bot_relationships": "rel",
+        "bot_character_background": "bg",
+        "bot_work_info": "work",
+        "bot_clothes": [],
+    }
+    response = await client.post(fastapi_app.url_path_for("create_bot"), json=bot_data)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert SessionToken.decode(response.headers["x-session-token"]).revision == 0
+    response = await client.patch(
+        fastapi_app.url_path_for("update_bot", bot_id=test_bot_id),
+        json={"bot_name": "First"},
+    )
+    assert SessionToken.decode(response.headers["x-session-token"]).revision == 1
+    get_url = fastapi_app.url_path_for("get_bot", bot_id=test_bot_id)
+    await client.get(get_url)
+    # A write whose invalidation didn't reach the cache yet.
+    updated_bot = await bot_service.bot_dao.update_bot_by_id(
+        test_bot_id,
+        {"bot_name": "Second"},
+    )
+    assert updated_bot is not None
+    token = SessionToken(updated_bot.revision).encode()
+    response = await client.get(get_url)
+    assert response.json()["data"]["bot_name"] == "First"
+    for encoding in ("identity", "gzip"):
+        response = await client.get(
+            get_url,
+            headers={"Accept-Encoding": encoding, "X-Session-Token": token},
+        )
+        assert response.json()["data"]["bot_name"] == "Second"
+    # The read brought the cache up to date for everybody.
+    response = await client.get(get_url)
+    assert response.json()["data"]["bot_name"] == "Second"
+    response = await client.get(get_url, headers={"X-Session-Token": "garbage"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_bot_tenants(
+    fastapi_app: FastAPI,
+    bot_service: BotService,
+    client: AsyncClient,
+) -> None:
+    """Test that tenants only see their own bots."""
+    test_bot_id = uuid.uuid4().hex
+    bot_data = {
+        "bot_id": test_bot_id,
+        "bot_name": "TestBot",
+        "bot_prop": "test",
+        "bot_appearance": "test",
+        "bot_chat_rules": "rule",
+        "bot_chat_topics": "topic",
+        "bot_personality": "personality",
+        "bot_ideal_match": "match",
+        "bot_hobbies": "hobby",
+        "bot_food_likes": "food",
+        "bot_other_likes": "other",
+        "bot_special_skills": "skills",
+        "bot_relationships": "rel",
+        "bot_character_background": "bg",
+        "bot_work_info": "work",
+        "bot_clothes": [],
+    }
+    tenant_service = bot_service.with_tenant("acme")
+    await tenant_service.create_bot(**bot_data)
+    url = fastapi_app.url_path_for("get_bot", bot_id=test_bot_id)
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = await client.get(url, headers={"X-Tenant-ID": "acme"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"]["bot_id"] == test_bot_id
+    response = await client.get(url, headers={"X-Tenant-ID": "no/such tenant"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    # Clean up
+    await tenant_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_bulk_delete_bots(
+    fastapi_app: FastAPI,
+    bot_service: BotService,
+    client: AsyncClient,
+) -> None:
+    """Test deleting bots by a filter."""
+    name_prefix = uuid.uuid4().hex
+    test_bot_ids = [uuid.uuid4().hex for _ in range(3)]
+    for number, test_bot_id in enumerate(test_bot_ids):
+        await bot_service.create_bot(
+            bot_id=test_bot_id,
+            bot_name=f"{name_prefix}-{number}",
+            bot_prop="test",
+            bot_appearance="test",
+            bot_chat_rules="rule",
+            bot_chat_topics="topic",
+            bot_personality="personality",
+            bot_ideal_match="match",
+            bot_hobbies="hobby",
+            bot_food_likes="food",
+            bot_other_likes="other",
+            bot_special_skills="skills",
+            bot_relationships="rel",
+            bot_character_background="bg",
+            bot_work_info="work",
+            bot_clothes=[],
+        )
+    url = fastapi_app.url_path_for("delete_bots")
+    response = await client.post(url, json={})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = await client.post(
+        url,
+        json={"bot_ids": test_bot_ids[:2], "name_prefix": name_prefix},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()["data"]
+    assert data["deleted"] == 2
+    assert sorted(data["bot_ids"]) == sorted(test_bot_ids[:2])
+    get_url = fastapi_app.url_path_for("get_bot", bot_id=test_bot_ids[0])
+    response = await client.get(get_url)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    restore_url = fastapi_app.url_path_for("restore_bot", bot_id=test_bot_ids[0])
+    response = await client.post(restore_url)
+    assert response.status_code == status.HTTP_200_OK
+    response = await client.get(get_url)
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await client.post(url, json={"name_prefix": name_prefix})
+    assert response.json()["data"]["deleted"] == 2
+
+
+@pytest.mark.anyio
+async def test_bot_revisions(
+    fastapi_app: FastAPI,
+    bot_service: BotService,
+    client: AsyncClient,
+) -> None:
+    """Test listing, reading and rolling back bot revisions."""
+    test_bot_id = uuid.uuid4().hex
+    bot_data = {
+        "bot_id": test_bot_id,
+        "bot_name": "TestBot",
+        "bot_prop": "test",
+        "bot_appearance": "test",
+        "bot_chat_rules": "rule",
+        "bot_chat_topics": "topic",
+        "bot_personality": "personality",
+        "bot_ideal_match": "match",
+        "bot_hobbies": "hobby",
+        "bot_food_likes": "food",
+        "bot_other_likes": "other",
+        "bot_special_skills": "skills",
+        "bot_relationships": "rel",
+        "bot_character_background": "bg",
+        "bot_work_info": "work",
+        "bot_clothes": [],
+    }
+    await bot_service.create_bot(**bot_data)
+    update_url = fastapi_app.url_path_for("update_bot", bot_id=test_bot_id)
+    await client.patch(update_url, json={"bot_name": "Renamed"})
+
+    url = fastapi_app.url_path_for("list_bot_revisions", bot_id=test_bot_id)
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    items = response.json()["data"]["items"]
+    assert [item["revision"] for item in items] == [1, 0]
+    assert items[0]["fields"] == ["bot_name"]
+    url = fastapi_app.url_path_for("get_bot_revision", bot_id=test_bot_id, revision=0)
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"]["bot_name"] == "TestBot"
+
+    url = fastapi_app.url_path_for("rollback_bot", bot_id=test_bot_id, revision=0)
+    response = await client.post(url, headers={"If-Match": '"0"'})
+    assert response.status_code == status.HTTP_409_CONFLICT
+    response = await client.post(url, headers={"If-Match": '"1"'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] == '"2"'
+    assert response.json()["data"]["bot_name"] == "TestBot"
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_idempotent_create_bot(
+    fastapi_app: FastAPI,
+    bot_service: BotService,
+    client: AsyncClient,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    """Test that retries with an Idempotency-Key get the first response."""
+    fastapi_app.state.redis_pool = fake_redis_pool
+    url = fastapi_app.url_path_for("create_bot")
+    test_bot_id = uuid.uuid4().hex
+    bot_data = {
+        "bot_id": test_bot_id,
+        "bot_name": "TestBot",
+        "bot_prop": "test",
+        "bot_appearance": "test",
+        "bot_chat_rules": "rule",
+        "bot_chat_topics": "topic",
+        "bot_personality": "personality",
+        "bot_ideal_match": "match",
+        "bot_hobbies": "hobby",
+        "bot_food_likes": "food",
+        "bot_other_likes": "other",
+        "bot_special_skills": "skills",
+        "bot_relationships": "rel",
+        "bot_character_background": "bg",
+        "bot_work_info": "work",
+        "bot_clothes": [],
+    }
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    replayed = metrics.get("idempotency_requests_total", result="replayed")
+    first = await client.post(url, json=bot_data, headers=headers)
+    assert first.status_code == status.HTTP_201_CREATED
+    retry = await client.post(url, json=bot_data, headers=headers)
+    assert retry.status_code == status.HTTP_201_CREATED
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.headers["x-session-token"] == first.headers["x-session-token"]
+    assert retry.json() == first.json()
+    assert metrics.get("idempotency_requests_total", result="replayed") == replayed + 1
+    response = await client.post(
+        url,
+        json={**bot_data, "bot_name": "Other"},
+        headers=headers,
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    # A key claimed by a request that is still running.
+    store = IdempotencyStore(Redis(connection_pool=fake_redis_pool), 60, 60)
+    running_key = uuid.uuid4().hex
+    body = json.dumps(bot_data).encode()
+    await store.claim(
+        store.key("default", "POST", url, running_key),
+        hashlib.sha256(body).hexdigest(),
+    )
+    response = await client.post(
+        url,
+        content=body,
+        headers={"Idempotency-Key": running_key, "Content-Type": "application/json"},
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.headers["retry-after"] == "1"
+
+    # Without a key a duplicate is refused by the database.
+    conflicts = metrics.get("bot_create_conflicts_total", tenant="default")
+    response = await client.post(url, json=bot_data)
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert (
+        metrics.get("bot_create_conflicts_total", tenant="default") == conflicts + 1
+    )
+    # A stale live copy in the cache doesn't refuse a create.
+    await client.get(fastapi_app.url_path_for("get_bot", bot_id=test_bot_id))
+    await bot_service.bot_dao.delete_bots([test_bot_id])
+    response = await client.post(url, json=bot_data)
+    assert response.status_code == status.HTTP_201_CREATED
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("without_mongo")
+async def test_memory_backend(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    fake_redis_pool: ConnectionPool,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that bots are written and read through the API without mongo."""
+    monkeypatch.setattr(settings, "bot_backend", BotBackend.MEMORY)
+    bot_service = BotService(MemoryBotDAO(), redis_pool=fake_redis_pool)
+    fastapi_app.dependency_overrides[get_bot_service] = lambda tenant=Depends(
+        get_tenant,
+    ): bot_service.with_tenant(tenant)
+    test_bot_id = uuid.uuid4().hex
+    bot_data = {
+        "bot_id": test_bot_id,
+        "bot_name": "TestBot",
+        "bot_prop": "test",
+        "bot_appearance": "test",
+        "bot_chat_rules": "rule",
+        "bot_chat_topics": "topic",
+        "bot_personality": "personality",
+        "bot_ideal_match": "match",
+        "bot_hobbies": "hobby",
+        "bot_food_likes": "food",
+        "bot_other_likes": "other",
+        "bot_special_skills": "skills",
+        "bot_relationships": "rel",
+        "bot_character_background": "bg",
+        "bot_work_info": "work",
+        "bot_clothes": [],
+    }
+    response = await client.post(fastapi_app.url_path_for("create_bot"), json=bot_data)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.headers["x-session-token"] == "0"
+    get_url = fastapi_app.url_path_for("get_bot", bot_id=test_bot_id)
+    response = await client.get(get_url)
+    assert response.status_code == status.HTTP_200_OK
+    response = await client.patch(
+        fastapi_app.url_path_for("update_bot", bot_id=test_bot_id),
+        json={"bot_name": "Renamed"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["x-session-token"] == "1"
+    response = await client.get(
+        get_url,
+        headers={"X-Session-Token": response.headers["x-session-token"]},
+    )
+    assert response.json()["data"]["bot_name"] == "Renamed"
+    response = await client.delete(
+        fastapi_app.url_path_for("delete_bot", bot_id=test_bot_id),
+    )
+    assert response.status_code == status.HTTP_200_OK
+    response = await client.get(get_url)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
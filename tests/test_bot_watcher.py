@@ -0,0 +1,67 @@
+import uuid
+
+import pytest
+from redis.asyncio import ConnectionPool, Redis
+
+from aichat_common.db.models.bot_model import Bot
+from aichat_common.services.bot.service import BotService
+from aichat_common.services.bot.watcher import get_changed_bot
+
+
+def test_get_changed_bot() -> None:
+    """Test tenant and bot_id extraction from change stream events."""
+    update = {
+        "operationType": "update",
+        "documentKey": {"_id": "1"},
+        "fullDocument": {"bot_id": "b1"},
+    }
+    delete_with_pre_image = {
+        "operationType": "delete",
+        "documentKey": {"_id": "1"},
+        "fullDocumentBeforeChange": {"tenant": "t1", "bot_id": "b1"},
+    }
+    delete = {"operationType": "delete", "documentKey": {"_id": "1"}}
+    assert get_changed_bot(update) == ("default", "b1")
+    assert get_changed_bot(delete_with_pre_image) == ("t1", "b1")
+    assert get_changed_bot(delete) is None
+
+
+@pytest.mark.anyio
+async def test_invalidate_cache(
+    bot_service: BotService,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    """Test that invalidating a bot drops its cache entry."""
+    test_bot_id = uuid.uuid4().hex
+    cache_key = bot_service.cache_key(test_bot_id)
+    async with Redis(connection_pool=fake_redis_pool) as redis:
+        await redis.set(cache_key, "{}")
+        await bot_service.invalidate_cache(test_bot_id)
+        assert await redis.get(cache_key) is None
+
+
+@pytest.mark.anyio
+async def test_cache_out_of_band_edit(
+    bot_service: BotService,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    """Test that caching other data of the same revision drops old renderings."""
+    test_bot_id = uuid.uuid4().hex
+    fields = {
+        name: "test"
+        for name, field in Bot.model_fields.items()
+        if field.is_required()
+    }
+    bot = Bot(**{**fields, "bot_id": test_bot_id, "bot_name": "Old", "revision": 3})
+    cache_key = bot_service.cache_key(test_bot_id)
+    async with Redis(connection_pool=fake_redis_pool) as redis:
+        await bot_service.cache_bot(bot)
+        await redis.hset(cache_key, "body:gzip", b"old")
+        # The same bot again keeps its renderings.
+        await bot_service.cache_bot(bot)
+        assert await redis.hget(cache_key, "body:gzip") == b"old"
+        # An edit made outside of the service keeps the revision.
+        await bot_service.cache_bot(bot.model_copy(update={"bot_name": "New"}))
+        assert await redis.hget(cache_key, "body:gzip") is None
+        assert await redis.hget(cache_key, "revision") == b"3"
+        await bot_service.invalidate_cache(test_bot_id)
@@ -0,0 +1,42 @@
+import zlib
+
+import pytest
+from starlette.types import Receive, Scope, Send
+
+from aichat_common.web.compression import CompressionMiddleware
+
+
+@pytest.mark.anyio
+async def test_streamed_chunks_are_flushed() -> None:
+    """Test that every chunk of a streamed response can be decoded on arrival."""
+    chunks = [b'{"items": [', b'{"bot_id": "b1"}', b"]}"]
+
+    async def streaming_app(scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json")],
+            },
+        )
+        for number, chunk in enumerate(chunks, 1):
+            more_body = number < len(chunks)
+            await send(
+                {"type": "http.response.body", "body": chunk, "more_body": more_body},
+            )
+
+    sent = []
+
+    async def receive() -> dict:
+        return {"type": "http.request"}
+
+    async def send(message: dict) -> None:
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    await CompressionMiddleware(streaming_app)(scope, receive, send)
+    assert (b"content-encoding", b"gzip") in sent[0]["headers"]
+    decompressor = zlib.decompressobj(31)
+    for chunk, message in zip(chunks, sent[1:]):
+        assert decompressor.decompress(message["body"]) == chunk
+    assert decompressor.eof
@@ -0,0 +1,153 @@
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from redis.asyncio import ConnectionPool
+from starlette import status
+
+from aichat_common.services.bot.service import BotService
+from aichat_common.services.jobs.handlers import (
+    JobContext,
+    bulk_update_bots,
+    purge_deleted_bots,
+    snapshot_bots,
+)
+from aichat_common.services.jobs.queue import JobQueue, JobStatus
+from aichat_common.services.jobs.worker import JobWorker
+
+BOT_DATA = {
+    "bot_name": "TestBot",
+    "bot_prop": "test",
+    "bot_appearance": "test",
+    "bot_chat_rules": "rule",
+    "bot_chat_topics": "topic",
+    "bot_personality": "personality",
+    "bot_ideal_match": "match",
+    "bot_hobbies": "hobby",
+    "bot_food_likes": "food",
+    "bot_other_likes": "other",
+    "bot_special_skills": "skills",
+    "bot_relationships": "rel",
+    "bot_character_background": "bg",
+    "bot_work_info": "work",
+}
+
+
+@pytest.mark.anyio
+async def test_submit_unknown_job(fastapi_app: FastAPI, client: AsyncClient) -> None:
+    """Test that jobs without a handler are rejected."""
+    url = fastapi_app.url_path_for("submit_job")
+    response = await client.post(url, json={"type": "no.such.job"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.anyio
+async def test_job_lifecycle(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    bot_service: BotService,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    """Test that a submitted job is processed by a worker."""
+    url = fastapi_app.url_path_for("submit_job")
+    response = await client.post(url, json={"type": "bots.cache_rebuild"})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    job_id = response.json()["data"]["job_id"]
+    assert response.json()["data"]["status"] == JobStatus.QUEUED
+
+    worker = JobWorker(
+        queue=JobQueue(fake_redis_pool),
+        bot_service=bot_service,
+        redis_pool=fake_redis_pool,
+        block_ms=10,
+    )
+    await worker.ensure_group()
+    assert await worker.run_once()
+
+    response = await client.get(fastapi_app.url_path_for("get_job", job_id=job_id))
+    assert response.status_code == status.HTTP_200_OK
+    job = response.json()["data"]
+    assert job["tenant"] == "default"
+    assert job["status"] == JobStatus.SUCCEEDED
+    # Jobs of other tenants are not found.
+    response = await client.get(
+        fastapi_app.url_path_for("get_job", job_id=job_id),
+        headers={"X-Tenant-ID": "acme"},
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert job["attempts"] == 1
+    assert job["progress"] == job["total"]
+
+
+@pytest.mark.anyio
+async def test_submit_admin_job(fastapi_app: FastAPI, client: AsyncClient) -> None:
+    """Test that jobs spanning all tenants can't be submitted through the API."""
+    url = fastapi_app.url_path_for("submit_job")
+    for job_type in ["bots.reindex", "bots.snapshot", "bots.purge_deleted"]:
+        response = await client.post(
+            url,
+            json={"type": job_type, "params": {"path": "/etc/passwd"}},
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.anyio
+async def test_snapshot_job_path(
+    bot_service: BotService,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    """Test that the snapshot job doesn't write anywhere but the snapshot path."""
+    ctx = JobContext(
+        "job",
+        {"path": "/etc/passwd"},
+        JobQueue(fake_redis_pool),
+        bot_service,
+    )
+    with pytest.raises(ValueError):
+        await snapshot_bots(ctx)
+
+
+@pytest.mark.anyio
+async def test_bulk_update_fields(
+    bot_service: BotService,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    """Test that bulk updates set only the fields clients may change."""
+    bot_service = bot_service.with_tenant(uuid.uuid4().hex)
+    await bot_service.create_bot(bot_id="b1", **BOT_DATA)
+    queue = JobQueue(fake_redis_pool)
+    for update_fields in [{"tenant": "other"}, {"revision": 9}, {"bot_id": "b2"}, {}]:
+        params = {"bot_ids": ["b1"], "update_fields": update_fields}
+        ctx = JobContext("job", params, queue, bot_service)
+        with pytest.raises(ValueError):
+            await bulk_update_bots(ctx)
+
+    ctx = JobContext(
+        "job",
+        {"bot_ids": ["b1", "missing"], "update_fields": {"bot_name": "Bulk"}},
+        queue,
+        bot_service,
+    )
+    assert await bulk_update_bots(ctx) == {"updated": 1, "missing": 1}
+    bot = await bot_service.bot_dao.get_bot_by_id("b1")
+    assert bot is not None
+    assert (bot.bot_name, bot.tenant, bot.revision) == (
+        "Bulk",
+        bot_service.tenant,
+        1,
+    )
+
+
+@pytest.mark.anyio
+async def test_purge_retention(
+    bot_service: BotService,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    """Test that the purge job keeps tombstones for at least the retention."""
+    bot_service = bot_service.with_tenant(uuid.uuid4().hex)
+    await bot_service.create_bot(bot_id="b1", **BOT_DATA)
+    await bot_service.delete_bot("b1")
+    ctx = JobContext("job", {"retention": 0}, JobQueue(fake_redis_pool), bot_service)
+    await purge_deleted_bots(ctx)
+    assert await bot_service.bot_dao.get_bot_by_id("b1", include_deleted=True)
@@ -0,0 +1,52 @@
+import uuid
+
+import pytest
+
+from aichat_common.db.dao.bot_dao import BotDAO
+from aichat_common.db.query_plan import find_collscans
+from aichat_common.services.bot.service import BotService
+
+
+def test_find_collscans() -> None:
+    """Test that COLLSCAN stages are found anywhere in a plan."""
+    ixscan_plan = {
+        "stage": "FETCH",
+        "inputStage": {"stage": "IXSCAN", "indexName": "bot_id_1"},
+    }
+    collscan_plan = {
+        "stage": "SORT",
+        "inputStages": [{"stage": "COLLSCAN", "direction": "forward"}],
+    }
+    assert find_collscans(ixscan_plan) == []
+    assert len(find_collscans(collscan_plan)) == 1
+
+
+@pytest.mark.anyio
+async def test_bot_queries_use_indexes(bot_service: BotService) -> None:
+    """Test that bot DAO queries pass the query plan check."""
+    test_bot_id = uuid.uuid4().hex
+    bot_data = {
+        "bot_id": test_bot_id,
+        "bot_name": "TestBot",
+        "bot_prop": "test",
+        "bot_appearance": "test",
+        "bot_chat_rules": "rule",
+        "bot_chat_topics": "topic",
+        "bot_personality": "personality",
+        "bot_ideal_match": "match",
+        "bot_hobbies": "hobby",
+        "bot_food_likes": "food",
+        "bot_other_likes": "other",
+        "bot_special_skills": "skills",
+        "bot_relationships": "rel",
+        "bot_character_background": "bg",
+        "bot_work_info": "work",
+        "bot_clothes": [],
+    }
+    await bot_service.create_bot(**bot_data)
+    dao = BotDAO()
+    assert await dao.get_bot_by_id(test_bot_id) is not None
+    assert await dao.filter(bot_name="TestBot")
+    assert await dao.get_all_bots(limit=10, offset=0)
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from redis.asyncio import ConnectionPool
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from aichat_common.metrics import metrics
+from aichat_common.resilience import (
+    OPEN,
+    Bulkhead,
+    BulkheadFullError,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceededError,
+    ResilientRedis,
+)
+
+
+@pytest.mark.anyio
+async def test_circuit_breaker(fake_redis_pool: ConnectionPool) -> None:
+    """Test that redis is skipped after failures and tried again later."""
+    breaker = CircuitBreaker("test-redis", failure_threshold=2, reset_timeout=0.1)
+    # Nothing listens there, connections are refused.
+    down = ResilientRedis(host="127.0.0.1", port=1, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(RedisConnectionError):
+            await down.get("key")
+    assert breaker.state == OPEN
+    assert metrics.get("circuit_breaker_state", breaker="test-redis") == 1
+    with pytest.raises(CircuitOpenError):
+        await down.get("key")
+    async with down.pipeline(transaction=False) as pipe:
+        pipe.get("key")
+        with pytest.raises(CircuitOpenError):
+            await pipe.execute()
+
+    await asyncio.sleep(0.1)
+    # A successful probe closes the breaker.
+    up = ResilientRedis(connection_pool=fake_redis_pool, breaker=breaker)
+    await up.set("key", "value")
+    assert await up.get("key") == b"value"
+    assert metrics.get("circuit_breaker_state", breaker="test-redis") == 0
+    await down.aclose()
+
+
+@pytest.mark.anyio
+async def test_bulkhead() -> None:
+    """Test that a bulkhead limits concurrency and operations have deadlines."""
+    bulkhead = Bulkhead("test", limit=1)
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def hold() -> str:
+        started.set()
+        await release.wait()
+        # Nested operations run in the slot of the outer one.
+        return await bulkhead.run(lambda: asyncio.sleep(0, "done"), timeout=1)
+
+    holder = asyncio.create_task(bulkhead.run(hold, timeout=1))
+    await started.wait()
+    with pytest.raises(BulkheadFullError):
+        await bulkhead.run(lambda: asyncio.sleep(0), timeout=0.05)
+    release.set()
+    assert await holder == "done"
+    with pytest.raises(DeadlineExceededError):
+        await bulkhead.run(lambda: asyncio.sleep(1), timeout=0.05)
+    assert bulkhead.in_use == 0
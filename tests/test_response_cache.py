@@ -0,0 +1,112 @@
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from redis.asyncio import ConnectionPool, Redis
+from starlette import status
+
+from aichat_common.response_cache import CachedResponse, ResponseCache
+from aichat_common.services.bot.service import BotService
+
+
+@pytest.mark.anyio
+async def test_bot_list_response_cache(
+    fastapi_app: FastAPI,
+    bot_service: BotService,
+    client: AsyncClient,
+    fake_redis_pool: ConnectionPool,
+) -> None:
+    """Test that bot lists are cached until a bot changes."""
+    fastapi_app.state.redis_pool = fake_redis_pool
+    test_bot_id = uuid.uuid4().hex
+    await bot_service.create_bot(
+        bot_id=test_bot_id,
+        bot_name="TestBot",
+        bot_prop="test",
+        bot_appearance="test",
+        bot_chat_rules="rule",
+        bot_chat_topics="topic",
+        bot_personality="personality",
+        bot_ideal_match="match",
+        bot_hobbies="hobby",
+        bot_food_likes="food",
+        bot_other_likes="other",
+        bot_special_skills="skills",
+        bot_relationships="rel",
+        bot_character_background="bg",
+        bot_work_info="work",
+        bot_clothes=[],
+    )
+    url = fastapi_app.url_path_for("list_bots")
+    params = {"page": 1, "size": 100}
+    response = await client.get(url, params=params)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["cache-status"] == "aichat; fwd=miss"
+    # Params in another order hit the same entry.
+    response = await client.get(f"{url}?size=100&page=1")
+    assert response.headers["cache-status"] == "aichat; hit"
+    assert "age" in response.headers
+    items = response.json()["data"]["items"]
+    assert any(item["bot_id"] == test_bot_id for item in items)
+    # Other tenants and encodings get their own entries.
+    response = await client.get(url, params=params, headers={"X-Tenant-ID": "acme"})
+    assert response.headers["cache-status"] == "aichat; fwd=miss"
+    response = await client.get(
+        url,
+        params=params,
+        headers={"Accept-Encoding": "identity"},
+    )
+    assert response.headers["cache-status"] == "aichat; fwd=miss"
+    response = await client.get(
+        url,
+        params=params,
+        headers={"Accept-Encoding": "identity"},
+    )
+    assert response.headers["cache-status"] == "aichat; hit"
+    assert response.json()["data"]["total"] >= 1
+
+    await bot_service.update_bot(test_bot_id, {"bot_name": "Renamed"})
+    response = await client.get(url, params=params)
+    assert response.headers["cache-status"] == "aichat; fwd=miss"
+    items = response.json()["data"]["items"]
+    assert any(item["bot_name"] == "Renamed" for item in items)
+    response = await client.get(
+        url,
+        params=params,
+        headers={"X-Tenant-ID": "acme"},
+    )
+    assert response.headers["cache-status"] == "aichat; hit"
+    response = await client.get(
+        url,
+        params=params,
+        headers={"Cache-Control": "no-cache"},
+    )
+    assert response.headers["cache-status"] == "aichat; fwd=request"
+    # Clean up
+    await bot_service.delete_bot(test_bot_id)
+
+
+@pytest.mark.anyio
+async def test_response_cache_invalidation(fake_redis_pool: ConnectionPool) -> None:
+    """Test that responses computed during an invalidation are never served."""
+    tag = f"test:{uuid.uuid4().hex}"
+    response = CachedResponse(status=200, headers=[], body=b"old", stored_at=0)
+    async with Redis(connection_pool=fake_redis_pool) as redis:
+        cache = ResponseCache(redis)
+        key = cache.key(tag)
+        cached, versions = await cache.lookup(key, [tag])
+        assert cached is None
+        await cache.store(key, [tag], versions, response, 60)
+        cached, versions = await cache.lookup(key, [tag])
+        assert cached is not None
+        assert cached.body == b"old"
+        assert await cache.invalidate([tag]) == 1
+        assert not await redis.exists(key)
+
+        # A response computed before the invalidation landed.
+        cached, versions = await cache.lookup(key, [tag])
+        await cache.invalidate([tag])
+        await cache.store(key, [tag], versions, response, 60)
+        cached, _ = await cache.lookup(key, [tag])
+        assert cached is None
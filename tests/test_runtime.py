@@ -0,0 +1,54 @@
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+from aichat_common.loop_monitor import LoopMonitor
+from aichat_common.metrics import metrics
+from aichat_common.runtime import (
+    available_cpus,
+    cgroup_cpu_quota,
+    recommended_workers,
+)
+
+
+def test_cgroup_v2_quota(tmp_path: Path) -> None:
+    """Test reading of cgroup v2 CPU limit."""
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    assert cgroup_cpu_quota(tmp_path) == 1.5
+    assert available_cpus(tmp_path) <= 1.5
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert cgroup_cpu_quota(tmp_path) is None
+
+
+def test_cgroup_v1_quota(tmp_path: Path) -> None:
+    """Test reading of cgroup v1 CPU limit."""
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("200000\n")
+    assert cgroup_cpu_quota(tmp_path) == 2
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    assert cgroup_cpu_quota(tmp_path) is None
+    assert cgroup_cpu_quota(tmp_path / "missing") is None
+
+
+def test_recommended_workers() -> None:
+    """Test that workers are sized by CPUs."""
+    assert recommended_workers(0.5) == 1
+    assert recommended_workers(1.5) == 2
+    assert recommended_workers(4, workers_per_cpu=2) == 8
+
+
+@pytest.mark.anyio
+async def test_loop_monitor() -> None:
+    """Test that the monitor measures lag and reports blocked loop."""
+    monitor = LoopMonitor(interval=0.01, slow_callback_ms=50)
+    slow_before = metrics.get("event_loop_slow_callbacks_total")
+    monitor.start()
+    await asyncio.sleep(0.05)
+    time.sleep(0.3)
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    assert monitor.max_lag_ms >= 200
+    assert metrics.get("event_loop_slow_callbacks_total") == slow_before + 1
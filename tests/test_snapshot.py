@@ -0,0 +1,92 @@
+from pathlib import Path
+from typing import AsyncIterator, List
+
+import pytest
+
+from aichat_common.db.dao.snapshot_bot_dao import (
+    SnapshotBotDAO,
+    SnapshotUnsupportedError,
+)
+from aichat_common.db.models.bot_model import Bot
+from aichat_common.db.snapshot import SnapshotCatalog, write_snapshot
+
+
+def _bot(tenant: str, bot_id: str, bot_name: str) -> Bot:
+    fields = [
+        "bot_prop",
+        "bot_appearance",
+        "bot_chat_rules",
+        "bot_chat_topics",
+        "bot_personality",
+        "bot_ideal_match",
+        "bot_hobbies",
+        "bot_food_likes",
+        "bot_other_likes",
+        "bot_special_skills",
+        "bot_relationships",
+        "bot_character_background",
+        "bot_work_info",
+    ]
+    return Bot(
+        tenant=tenant,
+        bot_id=bot_id,
+        bot_name=bot_name,
+        **{field: "test" for field in fields},
+    )
+
+
+async def _iter(bots: List[Bot]) -> AsyncIterator[Bot]:
+    for bot in bots:
+        yield bot
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("without_mongo")
+async def test_snapshot_backend(tmp_path: Path) -> None:
+    """Test that bots are served from a snapshot, which is swapped when replaced."""
+    path = tmp_path / "bots.snapshot"
+    bots = [
+        _bot("default", "b2", "Zed"),
+        _bot("default", "b1", "Amy"),
+        _bot("default", "b3", "Amy"),
+        _bot("default", "b4", "Amber"),
+        _bot("other", "b1", "Other"),
+    ]
+    assert await write_snapshot(_iter(bots), path) == 5
+    dao = SnapshotBotDAO(SnapshotCatalog(path, check_interval=0))
+
+    assert await dao.get_bots_count() == 4
+    bot = await dao.get_bot_by_id("b1")
+    assert bot is not None
+    assert bot.bot_name == "Amy"
+    assert await dao.get_bot_by_id("missing") is None
+    other = await dao.with_tenant("other").get_bot_by_id("b1")
+    assert other is not None
+    assert other.bot_name == "Other"
+
+    listed = await dao.get_all_bots(limit=3, offset=0)
+    assert [bot.bot_id for bot in listed] == ["b4", "b1", "b3"]
+    listed = await dao.get_all_bots(limit=3, offset=3)
+    assert [bot.bot_id for bot in listed] == ["b2"]
+    assert [bot.bot_id for bot in await dao.filter(bot_name="Amy")] == ["b1", "b3"]
+    assert [bot.bot_id for bot in await dao.filter(bot_id="b2")] == ["b2"]
+    found, total = await dao.search(name_prefix="Am", limit=1)
+    assert [bot.bot_id for bot in found] == ["b4"]
+    assert total == 3
+
+    with pytest.raises(SnapshotUnsupportedError):
+        await dao.update_bot_by_id("b1", {"bot_name": "New"})
+    with pytest.raises(SnapshotUnsupportedError):
+        await dao.search(text="hello")
+
+    # A new snapshot moved over the old one replaces it.
+    await write_snapshot(_iter([_bot("default", "b5", "New")]), path)
+    assert await dao.get_bot_by_id("b1") is None
+    assert await dao.get_bots_count() == 1
+    # A broken file doesn't take the served snapshot down.
+    broken = tmp_path / "broken.snapshot"
+    broken.write_bytes(b"broken")
+    broken.replace(path)
+    new_bot = await dao.get_bot_by_id("b5")
+    assert new_bot is not None
+    assert new_bot.bot_name == "New"